@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+# union: every date any symbol traded, with a zero return where a symbol has no data
+# intersection: only the dates every symbol traded
+# compound: the dates every symbol traded, with returns on the other dates compounded
+#           into each symbol's next common date so no return is lost
+ALIGNMENT_POLICIES = ("union", "intersection", "compound")
+
+# float32 halves the memory and bandwidth of large panels, e.g. 1000 symbol daily screens.
+# Returns are rounded to about 7 significant digits when stored, but sums are accumulated
+# in float64, so means and geometric means stay within 1e-6 relative error of float64
+# (or 1e-6 percentage points when close to zero).
+# Covariances use float32 matrix products and stay within 1e-5 of the largest variance
+# for histories of up to 10,000 dates. The optimiser always uses float64.
+RETURN_DTYPES = ("float64", "float32")
+
+
+class AlignedReturns:
+    """
+    Returns of several symbols on one common calendar, as a dense (dates x symbols)
+    array of percentage returns with a mask of which entries were observed.
+    Unobserved entries hold a zero return.
+    """
+
+    def __init__(self, dates, symbols, values, mask):
+        self.dates = dates
+        self.symbols = symbols
+        self.values = np.ascontiguousarray(values)
+        self.mask = np.ascontiguousarray(mask)
+        self._log_returns = None
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def log_returns(self):
+        """Decimal log returns, log(1 + r / 100), computed once. Zero where unobserved."""
+        if self._log_returns is None:
+            self._log_returns = np.log1p(self.values / self.dtype.type(100))
+        return self._log_returns
+
+    def __len__(self):
+        return len(self.dates)
+
+    def to_frame(self):
+        """Pivoted returns with NaN where a symbol has no observation."""
+        return pd.DataFrame(
+            np.where(self.mask, self.values, np.nan), index=self.dates, columns=self.symbols
+        )
+
+    def mean(self):
+        """Mean return of each symbol over its observed dates."""
+        counts = self.mask.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.Series(self.values.sum(axis=0, dtype=np.float64) / counts, index=self.symbols)
+
+    def geometric_mean(self):
+        """
+        Geometric mean return of each symbol over all dates, with unobserved dates flat.
+        Computed from the sum of log returns, which cannot underflow on long histories.
+        """
+        log_growth = self.log_returns.sum(axis=0, dtype=np.float64)
+        return pd.Series(np.expm1(log_growth / len(self)) * 100, index=self.symbols)
+
+    def covariance(self):
+        """
+        Pairwise complete covariance matrix, matching DataFrame.cov on the observed
+        returns, with NaN for pairs observed together fewer than twice.
+        """
+        observed = self.mask.astype(self.dtype)
+        counts = (observed.T @ observed).astype(np.float64)
+        # sums[i, j]: sum of i over the dates j is observed
+        sums = (self.values.T @ observed).astype(np.float64)
+        cross = (self.values.T @ self.values).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = (cross - sums * sums.T / counts) / (counts - 1)
+        cov[counts < 2] = np.nan
+        cov = 0.5 * (cov + cov.T)
+        return pd.DataFrame(cov, index=self.symbols, columns=self.symbols)
+
+    def portfolio_returns(self, weights):
+        """
+        Percentage returns of the portfolio on each date.
+        :param weights: Weights in the order of symbols, or a (symbols x portfolios) array.
+        """
+        return self.values @ np.asarray(weights)
+
+    def portfolio_growth(self, weights):
+        """Growth factor of the portfolio on each date, treating unobserved returns as flat."""
+        return (1 + self.values / 100) @ np.asarray(weights)
+
+
+def align_returns(pivot, policy="union", dtype="float64"):
+    """
+    Align pivoted returns onto a common calendar.
+    :param pivot: DataFrame of percentage returns indexed by date with a column per symbol.
+    :param policy: One of ALIGNMENT_POLICIES.
+    :param dtype: One of RETURN_DTYPES, see the accuracy bounds of float32 above.
+    :return: AlignedReturns.
+    """
+    if policy not in ALIGNMENT_POLICIES:
+        raise ValueError(f"Unknown alignment policy: {policy}")
+    if dtype not in RETURN_DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+
+    pivot = pivot.sort_index()
+    raw = pivot.to_numpy(dtype=dtype)
+    mask = ~np.isnan(raw)
+    values = np.where(mask, raw, raw.dtype.type(0))
+    if policy == "union":
+        return AlignedReturns(pivot.index, pivot.columns, values, mask)
+
+    common = mask.all(axis=1)
+    rows = np.flatnonzero(common)
+    if policy == "intersection" or len(rows) == 0:
+        return AlignedReturns(
+            pivot.index[rows], pivot.columns, values[rows], np.ones((len(rows), raw.shape[1]), dtype=bool)
+        )
+
+    # Sum the log growth between consecutive common dates, ignoring anything before
+    # the first common date and after the last
+    log_growth = np.cumsum(np.log1p(values / 100), axis=0, dtype=np.float64)[rows]
+    log_growth[1:] = np.diff(log_growth, axis=0)
+    log_growth[0] = np.log1p(values[rows[0]] / 100)
+    return AlignedReturns(
+        pivot.index[rows],
+        pivot.columns,
+        (np.expm1(log_growth) * 100).astype(dtype),
+        np.ones((len(rows), raw.shape[1]), dtype=bool),
+    )
@@ -1,4 +1,7 @@
 import numpy as np
+import pandas as pd
+
+from alignment import align_returns
 
 
 def get_correlation_matrix(df):
@@ -29,34 +32,60 @@ def get_geometric_mean(df, input_period=None, output_period=None):
     :param df: DataFrame containing historical data with columns 'trade_date', 'symbol', and 'change_percent'.
     :return: Series with geometric average returns for each symbol in percentage values e.g. (5.7%).
     """
-    data = df.pivot(
-        index="trade_date", columns="symbol", values="change_percent"
-    ).apply(lambda x: 1 + (x / 100))  # Convert to decimal
-    time_periods = len(data.index)
-    geo_mean = ((data.prod() ** (1 / time_periods) - 1) * 100)  # Convert back to percentage
-    return adjust_averages_for_period(geo_mean, input_period, output_period)
+    aligned = align_returns(df.pivot(index="trade_date", columns="symbol", values="change_percent"))
+    return adjust_averages_for_period(aligned.geometric_mean(), input_period, output_period)
 
 def get_standard_deviation(df, input_period=None, output_period=None):
     std = df.pivot(index="trade_date", columns="symbol", values="change_percent").std()
     return adjust_std_dev_for_period(std, input_period, output_period)
 
 
-def get_porfolio_geometric_mean(df, weights, input_period=None, output_period=None):
+def get_covariance_standard_deviation(cov, input_period=None, output_period=None):
+    """
+    Standard deviation of each symbol from its covariance matrix, e.g. of AlignedReturns.
+    :param cov: DataFrame covariance matrix of the returns.
+    :return: Series with standard deviations for each symbol in percentage values.
+    """
+    std = pd.Series(np.sqrt(np.diag(cov)), index=cov.index)
+    return adjust_std_dev_for_period(std, input_period, output_period)
+
+
+def get_covariance_correlation_matrix(cov):
+    """
+    Correlation matrix from a covariance matrix, e.g. of AlignedReturns.
+    :param cov: DataFrame covariance matrix of the returns.
+    :return: DataFrame correlation matrix, NaN for symbols without a variance.
+    """
+    std = np.sqrt(np.diag(cov))
+    return cov / np.outer(std, std)
+
+
+def get_porfolio_geometric_mean(df, weights, input_period=None, output_period=None, alignment="union"):
     """
     Calculate the geometric average returns for each symbol.
     :param df: DataFrame containing historical data with columns 'trade_date', 'symbol', and 'change_percent'.
     :param weights: Series with weights for each symbol.
+    :param alignment: Calendar alignment policy for symbols trading on different dates, see alignment.py.
     :return: Series with geometric average returns for each symbol in percentage values e.g. (5.7%).
     """
-    data = df.pivot(
-        index="trade_date", columns="symbol", values="change_percent"
-    ).apply(
-        lambda x: 1 + (x / 100)
-    )  # Convert to decimal
-    data.fillna(1.0, inplace=True) # Fix for when symbols on different exchanges have no data for a date e.g. exchange holiday
-    portfolio_change_percent = (data * weights).sum(axis=1)
-    time_periods = len(data.index)
-    geo_mean = (portfolio_change_percent.prod() ** (1 / time_periods) - 1) * 100 # Convert back to percentage
+    aligned = align_returns(
+        df.pivot(index="trade_date", columns="symbol", values="change_percent"), alignment
+    )
+    return get_aligned_portfolio_geometric_mean(
+        aligned, weights.reindex(aligned.symbols).to_numpy(), input_period, output_period
+    )
+
+
+def get_aligned_portfolio_geometric_mean(aligned, weights, input_period=None, output_period=None):
+    """
+    Geometric average return of a portfolio of aligned returns.
+    :param aligned: AlignedReturns of the symbols.
+    :param weights: Array of weights in the order of aligned.symbols, or a (symbols x portfolios) array.
+    :return: Geometric average return in percentage values e.g. (5.7%), per portfolio for 2D weights.
+    """
+    # Sum of log growth rather than the product, which can underflow on long histories
+    log_growth = np.log(aligned.portfolio_growth(weights)).sum(axis=0, dtype=np.float64)
+    geo_mean = np.expm1(log_growth / len(aligned)) * 100  # Convert back to percentage
     return adjust_averages_for_period(geo_mean, input_period, output_period)
 
 
@@ -114,10 +143,31 @@ def adjust_averages_for_period(avg, input_period, output_period):
 
 def get_semivariances(df):
     # https://www.investopedia.com/terms/s/semivariance.asp
-    semivariances = df.groupby("symbol")["change_percent"].apply(
-        lambda x: np.nanmean((x[x < x.mean()] - x.mean()) ** 2) / x.size
+    pivot_data = df.pivot(index="trade_date", columns="symbol", values="change_percent")
+    sizes = df.groupby("symbol").size().reindex(pivot_data.columns)
+    return pd.Series(
+        calculate_semivariances(pivot_data.to_numpy(dtype=float), sizes.to_numpy()),
+        index=pivot_data.columns,
+        name="change_percent",
     )
-    return semivariances
+
+
+def calculate_semivariances(returns, sizes=None):
+    """
+    Semivariances of several return series at once, as the mean squared deviation of the
+    returns below the mean divided by the number of returns.
+    :param returns: (dates x series) array of percentage returns, with NaN where a series has no value.
+    :param sizes: Optional number of returns of each series, the count of non-NaN values if not given.
+    :return: Array of the semivariance of each series.
+    """
+    observed = ~np.isnan(returns)
+    counts = observed.sum(axis=0)
+    sizes = counts if sizes is None else sizes
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(observed, returns, 0).sum(axis=0, dtype=np.float64) / counts
+        below = observed & (returns < mean)
+        squares = np.where(below, (returns - mean) ** 2, 0).sum(axis=0, dtype=np.float64)
+        return squares / below.sum(axis=0) / sizes
 
 
 def get_sharpe_ratio(port_return, port_std_dev, risk_free_rate=4.29):
@@ -173,58 +223,82 @@ def get_portfolio_standard_deviation(portfolio, std_dev, corr_matrix):
     return np.sqrt(port_std_dev)
 
 
-def calculate_drawdown_statistics(returns):
+def calculate_drawdown_matrix(returns):
     """
-    Helper function to calculate drawdown details from cumulative returns.
-    :param returns: Series of stock/portfolio returns.
-    :return: Dictionary containing drawdown details.
+    Drawdowns of several return series over the same dates at once.
+    :param returns: (dates x series) array of percentage returns. NaN returns are treated as
+        no change, and the drawdown of a series is NaN before its first return.
+    :return: Dictionary with the (dates x series) 'drawdown' fractions, and per series the
+        'max_drawdown' percentage and the row indices of the 'peak', 'bottom' and 'recovery',
+        with -1 for series which have not recovered.
     """
-    cumulative_returns = (1 + returns / 100).cumprod()
-    # Calculate running maximum
-    running_max = cumulative_returns.expanding().max()
-    # Calculate drawdown
+    started = np.logical_or.accumulate(~np.isnan(returns), axis=0)
+    cumulative_returns = np.where(started, np.cumprod(1 + np.nan_to_num(returns) / 100, axis=0), np.nan)
+    running_max = np.fmax.accumulate(cumulative_returns, axis=0)
     drawdown = (cumulative_returns - running_max) / running_max
 
-    # Find maximum drawdown
-    max_drawdown = drawdown.min() * 100
-    max_drawdown_date = drawdown.idxmin()
-
-    # Find the start of the drawdown period (peak before the drawdown)
-    peak_before_drawdown = running_max.loc[:max_drawdown_date].idxmax()
+    rows = np.arange(len(returns))[:, None]
+    columns = np.arange(returns.shape[1])
+    bottom = np.where(started, drawdown, np.inf).argmin(axis=0)
+    # The peak is the first highest value up to the bottom
+    peak = np.where((rows <= bottom) & started, cumulative_returns, -np.inf).argmax(axis=0)
+    # The recovery is the first date from the bottom back at the peak value
+    recovered = (rows >= bottom) & (cumulative_returns >= running_max[bottom, columns])
+    recovery = np.where(recovered.any(axis=0), recovered.argmax(axis=0), -1)
 
-    # Find the end of the drawdown period (recovery to new high)
-    recovery_date = None
-    peak_value = running_max.loc[peak_before_drawdown]
+    return {
+        "drawdown": drawdown,
+        "max_drawdown": drawdown[bottom, columns] * 100,
+        "peak": peak,
+        "bottom": bottom,
+        "recovery": recovery,
+    }
 
-    # Look for recovery after the drawdown bottom
-    for date in cumulative_returns.loc[max_drawdown_date:].index:
-        if cumulative_returns.loc[date] >= peak_value:
-            recovery_date = date
-            break
 
+def calculate_drawdown_statistics(returns):
+    """
+    Helper function to calculate drawdown details from cumulative returns.
+    :param returns: Series of stock/portfolio returns.
+    :return: Dictionary containing drawdown details.
+    """
+    stats = calculate_drawdown_matrix(returns.to_numpy(dtype=float).reshape(-1, 1))
+    dates = returns.index
+    recovery = stats["recovery"][0]
     return {
-        "drawdown": drawdown,
+        "drawdown": pd.Series(stats["drawdown"][:, 0], index=dates),
         "max_drawdown": {
-            "percent": max_drawdown,
-            "start_date": peak_before_drawdown,
-            "end_date": recovery_date,
-            "bottom_date": max_drawdown_date,
+            "percent": stats["max_drawdown"][0],
+            "start_date": dates[stats["peak"][0]],
+            "end_date": dates[recovery] if recovery >= 0 else None,
+            "bottom_date": dates[stats["bottom"][0]],
         },
     }
 
 
-def get_portfolio_drawdown_percentage(df, weights):
+def get_portfolio_drawdown_percentage(df, weights, alignment="union"):
     """
     Calculate the maximum drawdown percentage for a portfolio with given weights.
     :param df: DataFrame containing historical data with columns 'trade_date', 'symbol', and 'change_percent'.
     :param weights: Series with weights for each symbol.
+    :param alignment: Calendar alignment policy for symbols trading on different dates, see alignment.py.
     :return: Dictionary containing maximum drawdown percentage, start date, and end date.
     """
-    pivot_data = df.pivot(index="trade_date", columns="symbol", values="change_percent")
+    aligned = align_returns(
+        df.pivot(index="trade_date", columns="symbol", values="change_percent"), alignment
+    )
+    return get_aligned_portfolio_drawdown_percentage(
+        aligned, weights.reindex(aligned.symbols).to_numpy()
+    )
 
-    # Calculate portfolio returns
-    portfolio_returns = (pivot_data * weights).sum(axis=1)
 
+def get_aligned_portfolio_drawdown_percentage(aligned, weights):
+    """
+    Calculate the maximum drawdown percentage for a portfolio of aligned returns.
+    :param aligned: AlignedReturns of the symbols.
+    :param weights: Array of weights in the order of aligned.symbols.
+    :return: Dictionary containing maximum drawdown percentage, start date, and end date.
+    """
+    portfolio_returns = pd.Series(aligned.portfolio_returns(weights), index=aligned.dates)
     return calculate_drawdown_statistics(portfolio_returns)
 
 
@@ -235,10 +309,22 @@ def get_symbols_drawdown_percentage(df):
     :return: Dictionary with symbol names as keys and dictionaries containing drawdown info as values.
     """
     pivot_data = df.pivot(index="trade_date", columns="symbol", values="change_percent")
+    returns = pivot_data.to_numpy(dtype=float)
+    stats = calculate_drawdown_matrix(returns)
+    observed = ~np.isnan(returns)
+    dates = pivot_data.index
 
     symbol_drawdowns = {}
-    for symbol in pivot_data.columns:
-        returns = pivot_data[symbol].dropna()
-        symbol_drawdowns[symbol] = calculate_drawdown_statistics(returns)
+    for j, symbol in enumerate(pivot_data.columns):
+        recovery = stats["recovery"][j]
+        symbol_drawdowns[symbol] = {
+            "drawdown": pd.Series(stats["drawdown"][observed[:, j], j], index=dates[observed[:, j]]),
+            "max_drawdown": {
+                "percent": stats["max_drawdown"][j],
+                "start_date": dates[stats["peak"][j]],
+                "end_date": dates[recovery] if recovery >= 0 else None,
+                "bottom_date": dates[stats["bottom"][j]],
+            },
+        }
 
     return symbol_drawdowns
@@ -0,0 +1,23 @@
+#!/bin/bash
+# Runs the benchmark suite and compares it with the latest JSON baseline saved on
+# this machine in benchmarks/baselines, failing when any benchmark's median time is
+# more than BENCHMARK_THRESHOLD slower. The median is compared as it is
+# less sensitive to scheduling noise than the mean on sub-millisecond benchmarks.
+# Baselines only hold for the hardware they were recorded on, so they are not
+# committed. Save one from a clean tree with: ./benchmark.sh --benchmark-save=baseline
+
+cd "$(dirname "$0")"
+# Baselines are only comparable on the platform and interpreter they were recorded with
+MACHINE_ID=$(python -c "from pytest_benchmark.utils import get_machine_id; print(get_machine_id())")
+COMPARE=()
+if ls "benchmarks/baselines/$MACHINE_ID"/*.json > /dev/null 2>&1; then
+    COMPARE=(--benchmark-compare --benchmark-compare-fail="median:${BENCHMARK_THRESHOLD:-25%}")
+else
+    echo "No baseline recorded for $MACHINE_ID, skipping the comparison"
+fi
+python -m pytest benchmarks -o python_files="*_benchmark.py" \
+    --benchmark-storage=benchmarks/baselines \
+    --benchmark-max-time=0.5 \
+    --benchmark-warmup=on \
+    "${COMPARE[@]}" \
+    "$@"
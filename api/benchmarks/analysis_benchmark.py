@@ -0,0 +1,82 @@
+import pytest
+import pandas as pd
+
+from analysis import (
+    calculate_drawdown_statistics,
+    get_averages,
+    get_correlation_matrix,
+    get_covariance_matrix,
+    get_geometric_mean,
+    get_porfolio_geometric_mean,
+    get_porfolio_return,
+    get_portfolio_drawdown_percentage,
+    get_portfolio_standard_deviation,
+    get_semivariances,
+    get_standard_deviation,
+    get_symbols_drawdown_percentage,
+)
+from screening import get_block_statistics
+
+from .conftest import equal_weights
+
+
+class TestAnalysisBenchmarks:
+    @pytest.mark.parametrize(
+        "func",
+        [
+            get_correlation_matrix,
+            get_covariance_matrix,
+            get_semivariances,
+            get_symbols_drawdown_percentage,
+        ],
+        ids=lambda func: func.__name__,
+    )
+    def test_symbol_statistics(self, benchmark, returns_panel, func):
+        data, _ = returns_panel
+        benchmark(func, data)
+
+    @pytest.mark.parametrize(
+        "func",
+        [get_averages, get_geometric_mean, get_standard_deviation],
+        ids=lambda func: func.__name__,
+    )
+    def test_annualised_statistics(self, benchmark, returns_panel, func):
+        data, time_period = returns_panel
+        benchmark(func, data, time_period, "yearly")
+
+    def test_porfolio_geometric_mean(self, benchmark, returns_panel):
+        data, time_period = returns_panel
+        benchmark(get_porfolio_geometric_mean, data, equal_weights(data), time_period, "yearly")
+
+    def test_portfolio_drawdown_percentage(self, benchmark, returns_panel):
+        data, _ = returns_panel
+        benchmark(get_portfolio_drawdown_percentage, data, equal_weights(data))
+
+    def test_block_statistics(self, benchmark, returns_panel):
+        data, time_period = returns_panel
+        returns = data.pivot(index="trade_date", columns="symbol", values="change_percent")
+        benchmark(get_block_statistics, returns, time_period)
+
+    def test_calculate_drawdown_statistics(self, benchmark, returns_panel):
+        data, _ = returns_panel
+        returns = data.pivot(index="trade_date", columns="symbol", values="change_percent").mean(axis=1)
+        benchmark(calculate_drawdown_statistics, returns)
+
+    def test_porfolio_return(self, benchmark, returns_panel):
+        data, _ = returns_panel
+        weights = equal_weights(data)
+        portfolio = pd.DataFrame({"symbol": weights.index, "value_proportion": weights.values})
+        benchmark(get_porfolio_return, portfolio, get_averages(data))
+
+    def test_portfolio_standard_deviation(self, benchmark, returns_panel):
+        data, _ = returns_panel
+        weights = equal_weights(data)
+        if len(weights) > 50:
+            pytest.skip("Quadratic iloc loop is too slow to benchmark at this scale")
+        portfolio = pd.DataFrame({"symbol": weights.index, "value_proportion": weights.values})
+        benchmark(
+            get_portfolio_standard_deviation,
+            portfolio,
+            get_standard_deviation(data),
+            get_correlation_matrix(data),
+        )
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+import pandas as pd
+
+# (symbols, periods, time period) of the synthetic return panels
+SCALES = [
+    (5, 120, "monthly"),
+    (20, 240, "monthly"),
+    (50, 1260, "daily"),
+    (200, 5040, "daily"),
+]
+# The frontier runs 200 solves, so it is benchmarked on the smaller panels
+OPTIMISATION_SCALES = SCALES[:3]
+
+
+def scale_id(scale):
+    n, periods, time_period = scale
+    return f"{n}x{periods}-{time_period}"
+
+
+def make_returns_panel(n, periods, time_period, seed=0):
+    """
+    Generate a long-format panel of correlated percentage returns with the columns
+    read from the historical tick data tables.
+    """
+    rng = np.random.default_rng(seed)
+    if time_period == "monthly":
+        dates = pd.date_range("2000-01-01", periods=periods, freq="MS")
+        mean, std = 0.8, 5.0
+    else:
+        dates = pd.bdate_range("2000-01-03", periods=periods)
+        mean, std = 0.04, 1.5
+    market = rng.normal(mean, std, size=(periods, 1))
+    returns = 0.6 * market + 0.8 * rng.normal(mean, std, size=(periods, n))
+    symbols = [f"SYM{i:04d}" for i in range(n)]
+    close = 100 * np.cumprod(1 + returns / 100, axis=0)
+
+    return pd.DataFrame(
+        {
+            "symbol": np.tile(symbols, periods),
+            "trade_date": np.repeat(dates, n),
+            "close_price": close.ravel(),
+            "change_percent": returns.ravel(),
+        }
+    )
+
+
+def equal_weights(data):
+    symbols = sorted(data["symbol"].unique())
+    return pd.Series(1 / len(symbols), index=symbols)
+
+
+@pytest.fixture(params=SCALES, ids=scale_id, scope="session")
+def returns_panel(request):
+    n, periods, time_period = request.param
+    return make_returns_panel(n, periods, time_period), time_period
+
+
+@pytest.fixture(params=OPTIMISATION_SCALES, ids=scale_id, scope="session")
+def optimisation_panel(request):
+    n, periods, time_period = request.param
+    return make_returns_panel(n, periods, time_period), time_period
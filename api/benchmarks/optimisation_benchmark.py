@@ -0,0 +1,8 @@
+from optimisation import optimise_portfolio
+
+
+class TestOptimisationBenchmarks:
+    def test_optimise_portfolio(self, benchmark, optimisation_panel):
+        data, time_period = optimisation_panel
+        # Each round runs the full 200 solve frontier, so keep the number of rounds low
+        benchmark.pedantic(optimise_portfolio, args=(data, time_period), rounds=3, iterations=1)
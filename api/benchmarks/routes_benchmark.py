@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+import pandas as pd
+
+from .conftest import make_returns_panel
+
+TOOLKIT_FIELDS = [
+    "Open",
+    "High",
+    "Low",
+    "Close",
+    "Adj Close",
+    "Volume",
+    "Dividends",
+    "Return",
+    "Volatility",
+    "Excess Return",
+    "Excess Volatility",
+    "Cumulative Return",
+]
+
+
+class FakeToolkit:
+    """Stands in for financetoolkit.Toolkit, serving historical data from a synthetic panel"""
+
+    panel = None
+
+    def __init__(self, symbols, start_date=None, end_date=None, api_key=None):
+        self.symbols = symbols
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def get_historical_data(self, period="monthly"):
+        data = self.panel[self.panel["symbol"].isin(self.symbols)]
+        data = data[data["trade_date"].between(self.start_date, self.end_date)]
+        close = data.pivot(index="trade_date", columns="symbol", values="close_price")
+        returns = data.pivot(index="trade_date", columns="symbol", values="change_percent") / 100
+        fields = {field: close for field in TOOLKIT_FIELDS}
+        fields["Return"] = returns
+        fields["Volume"] = close * 0 + 1e6
+        historical = pd.concat(fields, axis=1)
+        historical.index.name = "date"
+        return historical
+
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    """
+    TestClient against a throwaway schema of a local Postgres (configured with the usual
+    DB_* variables) seeded with a synthetic panel, with the FMP upstream stubbed out.
+    The schema is dropped at the end of the session.
+    """
+    from fastapi.testclient import TestClient
+    import financetoolkit
+
+    import main
+    import utils
+    from tests.database import scratch_database
+
+    panel = make_returns_panel(20, 240, "monthly", seed=1)
+    panel["symbol"] = "BENCH" + panel["symbol"].str[-3:]
+    FakeToolkit.panel = panel
+
+    with scratch_database() as engine, pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(utils, "_engine", engine)
+        monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+        monkeypatch.setattr(financetoolkit, "Toolkit", FakeToolkit)
+
+        seed = panel.assign(trade_date=panel["trade_date"].dt.strftime("%Y-%m-%d"))
+        main.insert_data_into_db(
+            seed,
+            "monthly",
+            list(panel["symbol"].unique()),
+            "2000-01-01",
+            "2019-12-31",
+        )
+        yield TestClient(main.app), panel
+
+
+class TestRouteBenchmarks:
+    @pytest.mark.parametrize("n", [3, 10, 20])
+    def test_optimise_route(self, benchmark, client, n):
+        test_client, panel = client
+        symbols = sorted(panel["symbol"].unique())[:n]
+        body = {
+            "portfolio": [{"symbol": symbol, "exchange": "NYQ"} for symbol in symbols],
+            "timePeriod": "monthly",
+            "startTime": "2000-01-01",
+            "endTime": "2019-12-31",
+        }
+
+        def optimise():
+            response = test_client.post("/portfolio/optimise", json=body)
+            assert response.status_code == 200
+            return response
+
+        benchmark.pedantic(optimise, rounds=3, iterations=1, warmup_rounds=1)
+
+    def test_health_route(self, benchmark, client):
+        test_client, _ = client
+        benchmark(test_client.get, "/health")
+
+
+def test_fake_toolkit_matches_upstream_shape():
+    FakeToolkit.panel = make_returns_panel(2, 12, "monthly")
+    symbols = list(FakeToolkit.panel["symbol"].unique())
+    data = FakeToolkit(symbols, "2000-01-01", "2000-12-31").get_historical_data()
+    assert data.columns.nlevels == 2
+    assert np.allclose(data["Return"].to_numpy() * 100, FakeToolkit.panel.pivot(
+        index="trade_date", columns="symbol", values="change_percent").to_numpy())
@@ -0,0 +1,37 @@
+import pytest
+
+from instrument_catalogue import InstrumentCatalogue, write_catalogue
+from main import SearchOptions, search_instruments_helper
+from utils import INSTRUMENT_NAME_MAPPING, initialize_financial_data
+
+
+@pytest.fixture(scope="session")
+def catalogue(tmp_path_factory):
+    """Catalogue built from the real financedatabase datasets, which are downloaded once"""
+    datasets = initialize_financial_data()
+    if any(x is None for x in datasets):
+        pytest.skip("financedatabase datasets could not be downloaded")
+    path = str(tmp_path_factory.mktemp("catalogue") / "instruments.catalogue")
+    write_catalogue(path, datasets, INSTRUMENT_NAME_MAPPING)
+    return InstrumentCatalogue(path)
+
+
+class TestSearchBenchmarks:
+    @pytest.mark.parametrize(
+        "search",
+        [
+            {},
+            {"symbol": "AAPL"},
+            {"symbol": "MS"},
+            {"name": "technologies"},
+            {"instrumentType": "Equities", "sector": "Information Technology", "country": "United States"},
+            {"instrumentType": "ETFs", "name": "world", "currency": "USD"},
+        ],
+        ids=lambda search: "-".join(f"{k}={v}" for k, v in search.items()) or "all",
+    )
+    def test_search_instruments_helper(self, benchmark, catalogue, search):
+        search_values = SearchOptions(**search)
+        instrument_type = search_values.instrument_type
+        search_values.instrument_type = None
+        table_names = [instrument_type] if instrument_type else list(INSTRUMENT_NAME_MAPPING)
+        benchmark(search_instruments_helper, search_values, catalogue, table_names)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from logging import getLogger
+
+from utils import COVARIANCE_CACHE_ENTRY_MAX_BYTES, COVARIANCE_CACHE_MAX_BYTES
+
+log = getLogger(__name__)
+
+
+class CrossProductCache:
+    """
+    Cumulative cross-product sums of a return panel, allowing the covariance
+    matrix of any [start, end] window to be computed in O(n^2) as the difference
+    of two prefix slices, independent of the history length.
+
+    The prefix array has shape (3, T + 1, n, n) where for prefix row t:
+        prefix[0, t, i, j] = number of dates before t where both i and j have a return
+        prefix[1, t, i, j] = sum of returns of i over those dates
+        prefix[2, t, i, j] = sum of the products of the returns of i and j over those dates
+    Tracking the sums per pair gives pairwise-complete results matching pandas .cov().
+    """
+
+    def __init__(self, dates, symbols, prefix):
+        self.dates = dates
+        self.symbols = list(symbols)
+        self.prefix = prefix
+
+    @classmethod
+    def from_returns(cls, returns):
+        """
+        Build the cache from pivoted returns.
+        :param returns: DataFrame indexed by trade_date with a column of returns per symbol.
+        :return: CrossProductCache covering every date in returns.
+        """
+        returns = returns.sort_index()
+        values = returns.to_numpy(dtype=float)
+        mask = ~np.isnan(values)
+        values = np.where(mask, values, 0.0)
+        masks = mask.astype(float)
+
+        prefix = np.zeros((3, len(returns) + 1, values.shape[1], values.shape[1]))
+        np.cumsum(masks[:, :, None] * masks[:, None, :], axis=0, out=prefix[0, 1:])
+        np.cumsum(values[:, :, None] * masks[:, None, :], axis=0, out=prefix[1, 1:])
+        np.cumsum(values[:, :, None] * values[:, None, :], axis=0, out=prefix[2, 1:])
+        return cls(_to_utc_nanoseconds(returns.index), returns.columns, prefix)
+
+    @classmethod
+    def load(cls, path):
+        """Load a cache saved with save, memory-mapping the prefix array read-only."""
+        with open(os.path.join(path, "symbols.json")) as f:
+            symbols = json.load(f)
+        dates = np.load(os.path.join(path, "dates.npy"))
+        prefix = np.load(os.path.join(path, "prefix.npy"), mmap_mode="r")
+        return cls(dates, symbols, prefix)
+
+    def save(self, path):
+        """Write the cache to a directory, replacing it atomically so readers never see a partial cache."""
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=parent)
+        with open(os.path.join(tmp_path, "symbols.json"), "w") as f:
+            json.dump(self.symbols, f)
+        np.save(os.path.join(tmp_path, "dates.npy"), self.dates)
+        np.save(os.path.join(tmp_path, "prefix.npy"), np.ascontiguousarray(self.prefix))
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another worker saved the same cache first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def covariance(self, start_time, end_time):
+        """
+        Calculate the covariance matrix of returns between start_time and end_time inclusive.
+        :return: DataFrame covariance matrix indexed by symbol in both dimensions.
+        """
+        start_ns, end_ns = _to_utc_nanoseconds([start_time, end_time])
+        start = np.searchsorted(self.dates, start_ns, side="left")
+        end = np.searchsorted(self.dates, end_ns, side="right")
+        counts, sums, cross_products = self.prefix[:, end] - self.prefix[:, start]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = (cross_products - sums * sums.T / counts) / (counts - 1)
+        cov[counts < 2] = np.nan
+        cov = 0.5 * (cov + cov.T)
+        return pd.DataFrame(cov, index=self.symbols, columns=self.symbols)
+
+
+def _to_utc_nanoseconds(dates):
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    if dates.tz is None:
+        dates = dates.tz_localize("UTC")
+    return dates.tz_convert("UTC").asi8
+
+
+def cache_path(cache_dir, symbols, time_period):
+    """Directory of the cache for a symbol set and period."""
+    key = hashlib.sha1(",".join(sorted(symbols)).encode()).hexdigest()
+    return os.path.join(cache_dir, "covariance", time_period, key)
+
+
+def prefix_nbytes(n, periods):
+    """Size in bytes of the prefix array of n symbols over periods dates."""
+    return 3 * (periods + 1) * n * n * np.dtype(float).itemsize
+
+
+def get_cross_product_cache(
+    cache_dir,
+    symbols,
+    time_period,
+    load_returns,
+    max_entry_bytes=COVARIANCE_CACHE_ENTRY_MAX_BYTES,
+    max_total_bytes=COVARIANCE_CACHE_MAX_BYTES,
+):
+    """
+    Return the cache for a symbol set and period, building it on a miss.
+    :param cache_dir: Root directory of the cache files.
+    :param symbols: List of symbols in the portfolio.
+    :param time_period: Period of the returns e.g. 'monthly'.
+    :param load_returns: Callable returning the full pivoted return history of the symbols.
+    :param max_entry_bytes: Largest prefix array to cache, larger symbol sets are not cached.
+    :param max_total_bytes: Total size of the caches above which the least recently used are removed.
+    :return: CrossProductCache, or None if the symbol set is too large to cache.
+    """
+    path = cache_path(cache_dir, symbols, time_period)
+    if os.path.isdir(path):
+        try:
+            cache = CrossProductCache.load(path)
+            # The modification time of the directory orders the caches for eviction
+            os.utime(path)
+            return cache
+        except (OSError, ValueError) as e:
+            log.warning(f"Failed to load covariance cache {path}: {e}")
+    # Check the size before loading the history, as it is at least one date long
+    if prefix_nbytes(len(symbols), 1) > max_entry_bytes:
+        return None
+    returns = load_returns()
+    if prefix_nbytes(returns.shape[1], len(returns)) > max_entry_bytes:
+        return None
+    cache = CrossProductCache.from_returns(returns)
+    cache.save(path)
+    evict_cross_product_caches(cache_dir, max_total_bytes)
+    return cache
+
+
+def evict_cross_product_caches(cache_dir, max_bytes):
+    """Remove the least recently used caches of every period until their total size is within max_bytes."""
+    root = os.path.join(cache_dir, "covariance")
+    entries = []
+    for time_period in os.listdir(root) if os.path.isdir(root) else []:
+        period_dir = os.path.join(root, time_period)
+        for key in os.listdir(period_dir):
+            path = os.path.join(period_dir, key)
+            try:
+                size = os.path.getsize(os.path.join(path, "prefix.npy"))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+    total = 0
+    for _, size, path in sorted(entries, reverse=True):
+        total += size
+        if total > max_bytes:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def invalidate_cross_product_caches(cache_dir, symbols, time_period):
+    """Remove every cached symbol set for the period containing any of symbols."""
+    period_dir = os.path.join(cache_dir, "covariance", time_period)
+    if not os.path.isdir(period_dir):
+        return
+    symbols = set(symbols)
+    for key in os.listdir(period_dir):
+        path = os.path.join(period_dir, key)
+        try:
+            with open(os.path.join(path, "symbols.json")) as f:
+                cached_symbols = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if symbols.intersection(cached_symbols):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,72 @@
+import pandas as pd
+
+from prefetch import last_period_close
+
+
+def covered_window(time_period, start_time, end_time, now):
+    """
+    Dates of a window of tick data which can be complete, ending at the last period close
+    as later bars may still change or be missing upstream.
+    :param time_period: "daily" or "monthly".
+    :param start_time: Start of the window.
+    :param end_time: End of the window.
+    :param now: Current time as a pandas Timestamp.
+    :return: Tuple of the first and last dates, or None if the window is empty.
+    """
+    start = pd.Timestamp(start_time).tz_localize(None).normalize()
+    end = min(pd.Timestamp(end_time).tz_localize(None).normalize(), last_period_close(time_period, now))
+    if start > end:
+        return None
+    return start.date(), end.date()
+
+
+def to_multirange(ranges):
+    """
+    Postgres multirange literal of inclusive date ranges, e.g. '{[2020-01-01,2020-12-31]}'.
+    :param ranges: Iterable of (first, last) date pairs, None entries are skipped.
+    """
+    ranges = [f"[{first.isoformat()},{last.isoformat()}]" for first, last in filter(None, ranges)]
+    return "{" + ",".join(ranges) + "}"
+
+
+def get_coverage_updates(data, symbols=None, window=None):
+    """
+    Coverage metadata rows for an insert of tick data. The dates between a symbol's
+    first and last inserted bar are covered, as is the whole window the symbols were
+    fetched over, even for symbols without any bars in it.
+    :param data: DataFrame of the inserted rows with columns 'symbol' and 'trade_date'.
+    :param symbols: Optional list of the symbols fetched, covered over window.
+    :param window: Optional (first, last) dates the symbols were fetched over, from covered_window.
+    :return: List of dicts with 'symbol', 'first_trade_date', 'last_trade_date' and 'covered'.
+    """
+    trade_dates = pd.to_datetime(data["trade_date"], utc=True).groupby(data["symbol"])
+    first, last = trade_dates.min(), trade_dates.max()
+    updates = []
+    for symbol in dict.fromkeys(list(symbols or []) + list(first.index)):
+        span = None
+        if symbol in first.index:
+            span = (first[symbol].date(), last[symbol].date())
+        fetched = window if symbols is not None and symbol in symbols else None
+        if span is None and fetched is None:
+            continue
+        updates.append(
+            {
+                "symbol": symbol,
+                "first_trade_date": first.get(symbol),
+                "last_trade_date": last.get(symbol),
+                "covered": to_multirange([fetched, span]),
+            }
+        )
+    return updates
+
+
+def group_uncovered(uncovered):
+    """
+    Group symbols by their uncovered window, so each window is fetched in one call.
+    :param uncovered: Dict of symbol to its first and last uncovered dates.
+    :return: Dict of (first, last) dates to the list of symbols.
+    """
+    groups = {}
+    for symbol, window in uncovered.items():
+        groups.setdefault(tuple(window), []).append(symbol)
+    return groups
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+
+def select_min_max(values, max_points, keep=None):
+    """
+    Choose which points of each series to plot, as the minimum and maximum of each of a
+    number of equal buckets of dates, plus the first and last points and any points in keep.
+    Vectorised over all the series, which share the same dates.
+    :param values: (dates x series) array, with NaN where a series has no value.
+    :param max_points: Most points to keep per series.
+    :param keep: Optional (points x series) integer array of dates to keep for each series, -1 for none.
+    :return: (dates x series) boolean mask of the points kept.
+    """
+    observed = ~np.isnan(values)
+    n_dates, n_series = values.shape
+    if n_dates <= max_points:
+        return observed
+
+    n_keep = 0 if keep is None else len(keep)
+    n_buckets = max((max_points - 2 - n_keep) // 2, 1)
+    bucket_size = -(-n_dates // n_buckets)
+    padded = np.full((n_buckets * bucket_size, n_series), np.nan)
+    padded[:n_dates] = values
+    buckets = padded.reshape(n_buckets, bucket_size, n_series)
+    offsets = (np.arange(n_buckets) * bucket_size)[:, None]
+    lowest = np.where(np.isnan(buckets), np.inf, buckets).argmin(axis=1) + offsets
+    highest = np.where(np.isnan(buckets), -np.inf, buckets).argmax(axis=1) + offsets
+
+    columns = np.arange(n_series)
+    first = observed.argmax(axis=0)
+    last = n_dates - 1 - observed[::-1].argmax(axis=0)
+    rows = [lowest, highest, first[None], last[None]]
+    if keep is not None:
+        rows.append(keep)
+    rows = np.concatenate(rows)
+    rows = np.where(rows < 0, first, np.minimum(rows, n_dates - 1))
+
+    mask = np.zeros_like(observed)
+    mask[rows, np.broadcast_to(columns, rows.shape)] = True
+    return mask & observed
+
+
+def downsample_history(data, max_points):
+    """
+    Downsample the tick data of each symbol to at most max_points bars, chosen by close price.
+    The change_percent of each kept bar is compounded over the bars dropped before it,
+    so cumulative returns are unchanged at the kept bars.
+    :param data: DataFrame containing historical data with columns 'trade_date', 'symbol',
+        'close_price' and 'change_percent'.
+    :param max_points: Most bars to keep per symbol.
+    :return: DataFrame of the kept bars.
+    """
+    prices = data.pivot(index="trade_date", columns="symbol", values="close_price")
+    returns = data.pivot(index="trade_date", columns="symbol", values="change_percent")
+    returns = returns.reindex(index=prices.index, columns=prices.columns)
+    kept = select_min_max(prices.to_numpy(dtype=float), max_points)
+
+    # Log growth up to each kept bar since the previous kept bar of the symbol
+    log_growth = np.cumsum(np.log1p(returns.fillna(0.0).to_numpy() / 100), axis=0)
+    previous = np.where(kept, log_growth, np.nan)
+    previous = pd.DataFrame(previous).ffill().shift(1).fillna(0.0).to_numpy()
+    compounded = np.expm1(log_growth - previous) * 100
+    compounded = np.where(returns.isna().to_numpy(), np.nan, compounded)
+
+    kept = pd.DataFrame(kept, index=prices.index, columns=prices.columns).stack(future_stack=True)
+    kept = kept[kept].index
+    compounded = pd.DataFrame(compounded, index=prices.index, columns=prices.columns).stack(
+        future_stack=True
+    )
+
+    columns = data.columns
+    data = data.set_index(["trade_date", "symbol"])
+    data = data[data.index.isin(kept)].copy()
+    data["change_percent"] = compounded.reindex(data.index)
+    return data.reset_index()[columns]
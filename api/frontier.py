@@ -0,0 +1,338 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from logging import getLogger
+
+log = getLogger(__name__)
+
+PERIODS_PER_YEAR = {"daily": 252, "weekly": 52, "monthly": 12, "yearly": 1}
+
+# Weights within this of a bound count as on it
+TOLERANCE = 1e-10
+
+
+def critical_line(mean, cov, lower=None, upper=None):
+    """
+    Corner portfolios of the long-only efficient frontier with the weights summing to 1,
+    using Markowitz's critical line algorithm. Between adjacent corners the optimal
+    weights, and so the portfolio return, are linear in the risk aversion, so every
+    frontier portfolio is a linear interpolation of two corners.
+    https://papers.ssrn.com/sol3/papers.cfm?abstract_id=2197616
+    :param mean: Array of the expected returns of each symbol.
+    :param cov: (symbols x symbols) covariance matrix of the returns.
+    :param lower: Optional array of the lowest weight of each symbol, 0 if not given.
+    :param upper: Optional array of the highest weight of each symbol, 1 if not given.
+    :return: (corners x symbols) array of weights, from the highest return corner
+        down to the minimum variance portfolio.
+    :raises ValueError: If the covariance matrix is undefined or singular.
+    """
+    mean = np.asarray(mean, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+    n = len(mean)
+    lower = np.zeros(n) if lower is None else np.asarray(lower, dtype=float)
+    upper = np.ones(n) if upper is None else np.asarray(upper, dtype=float)
+    if not np.isfinite(cov).all():
+        raise ValueError("Covariance matrix is undefined, as some symbols have no dates in common")
+    if np.linalg.matrix_rank(cov) < n:
+        # The free weights would not be unique
+        raise ValueError(
+            "Covariance matrix is singular, as symbols have duplicate returns or there are fewer dates than symbols"
+        )
+
+    if n > 1 and np.ptp(mean) < TOLERANCE:
+        # No symbol can enter on return, so the frontier is the minimum variance portfolio
+        # alone, which is the last corner of the frontier for any other means
+        return critical_line(np.arange(n, dtype=float), cov, lower, upper)[-1:]
+
+    # Start from the highest return portfolio, filling symbols from the highest mean
+    weights = lower.copy()
+    free = []
+    for i in np.argsort(-mean, kind="stable"):
+        weights[i] = upper[i]
+        if weights.sum() >= 1:
+            weights[i] += 1 - weights.sum()
+            free = [i]
+            break
+    corners = [weights.copy()]
+    lambdas = [np.inf]
+
+    while True:
+        # A free weight reaching a bound as the risk aversion falls
+        lambda_in, i_in, bound_in = -np.inf, None, None
+        if len(free) > 1:
+            for j, i in enumerate(free):
+                lam, bound = _critical_lambda(mean, cov, free, weights, j, (lower[i], upper[i]))
+                if lam is not None and lam > lambda_in:
+                    lambda_in, i_in, bound_in = lam, i, bound
+
+        # A bounded weight becoming free
+        lambda_out, i_out = -np.inf, None
+        if len(free) < n:
+            for i in np.setdiff1d(np.arange(n), free):
+                lam, _ = _critical_lambda(mean, cov, free + [i], weights, len(free), weights[i])
+                if lam is not None and lam < lambdas[-1] - TOLERANCE and lam > lambda_out:
+                    lambda_out, i_out = lam, i
+
+        if lambda_in < 0 and lambda_out < 0:
+            # No more corners before the minimum variance portfolio
+            lambdas.append(0.0)
+            free_weights = _free_weights(np.zeros(n), cov, free, weights, 0.0)
+        else:
+            if lambda_in > lambda_out:
+                lambdas.append(lambda_in)
+                free.remove(i_in)
+                weights[i_in] = bound_in
+            else:
+                lambdas.append(lambda_out)
+                free.append(i_out)
+            free_weights = _free_weights(mean, cov, free, weights, lambdas[-1])
+        weights[free] = free_weights
+        corners.append(weights.copy())
+        if lambdas[-1] == 0:
+            break
+
+    return _purge_corners(np.array(corners), mean, lower, upper)
+
+
+def _split(mean, cov, free, weights):
+    bounded = np.setdiff1d(np.arange(len(mean)), free)
+    cov_free_inv = np.linalg.inv(cov[np.ix_(free, free)])
+    return bounded, cov_free_inv, cov[np.ix_(free, bounded)], mean[free], weights[bounded]
+
+
+def _critical_lambda(mean, cov, free, weights, j, bound):
+    """
+    Risk aversion at which the j-th free weight reaches bound, choosing the upper or
+    lower bound by the direction it moves in when bound is a pair.
+    """
+    bounded, cov_free_inv, cov_free_bounded, mean_free, weights_bounded = _split(
+        mean, cov, free, weights
+    )
+    ones = np.ones(len(free))
+    c1 = ones @ cov_free_inv @ ones
+    c2 = cov_free_inv @ mean_free
+    c3 = ones @ cov_free_inv @ mean_free
+    c4 = cov_free_inv @ ones
+    c = -c1 * c2[j] + c3 * c4[j]
+    if abs(c) < TOLERANCE:
+        return None, None
+    if isinstance(bound, tuple):
+        bound = bound[1] if c > 0 else bound[0]
+    l3 = cov_free_inv @ cov_free_bounded @ weights_bounded
+    l2 = ones @ l3
+    l1 = weights_bounded.sum()
+    return ((1 - l1 + l2) * c4[j] - c1 * (bound + l3[j])) / c, bound
+
+
+def _free_weights(mean, cov, free, weights, lam):
+    """Optimal weights of the free symbols at risk aversion lam, with the other weights fixed."""
+    bounded, cov_free_inv, cov_free_bounded, mean_free, weights_bounded = _split(
+        mean, cov, free, weights
+    )
+    ones = np.ones(len(free))
+    g1 = ones @ cov_free_inv @ mean_free
+    g2 = ones @ cov_free_inv @ ones
+    w1 = cov_free_inv @ cov_free_bounded @ weights_bounded
+    g = (-lam * g1 + 1 - weights_bounded.sum() + ones @ w1) / g2
+    return -w1 + g * (cov_free_inv @ ones) + lam * (cov_free_inv @ mean_free)
+
+
+def _purge_corners(corners, mean, lower, upper):
+    """Drop corners breaking the constraints through numerical error, or repeating a return."""
+    valid = (
+        (np.abs(corners.sum(axis=1) - 1) < 1e-8)
+        & (corners >= lower - 1e-8).all(axis=1)
+        & (corners <= upper + 1e-8).all(axis=1)
+    )
+    corners = corners[valid]
+    returns = corners @ mean
+    # Returns fall along the frontier, later corners repeating a return are redundant
+    keep = np.concatenate([[True], np.diff(returns) < -TOLERANCE])
+    keep[-1] = True
+    if len(corners) > 1 and abs(returns[-1] - returns[-2]) <= TOLERANCE and keep[-2]:
+        keep[-2] = False
+    return np.clip(corners[keep], lower, upper)
+
+
+class CornerPortfolios:
+    """
+    Corner portfolios of an efficient frontier, from which the optimal weights for any
+    target return or risk on the frontier are found by interpolating adjacent corners.
+
+    Keeps the corner weights W (corners x symbols) with their period returns W @ mean
+    and Gram matrix W @ cov @ W.T, so queries only work on arrays of the corners.
+    """
+
+    def __init__(self, symbols, time_period, weights, mean, cov):
+        self.symbols = list(symbols)
+        self.time_period = time_period
+        self.weights = np.asarray(weights)
+        self.mean = np.asarray(mean)
+        self.cov = np.asarray(cov)
+        self.returns = self.weights @ self.mean
+        self.gram = self.weights @ self.cov @ self.weights.T
+
+    @classmethod
+    def from_returns(cls, mean, cov, time_period, lower=None, upper=None):
+        """
+        Compute the corner portfolios of mean and covariance of period returns.
+        :param mean: Series of the mean return of each symbol, in percent.
+        :param cov: DataFrame covariance matrix of the returns, indexed like mean.
+        :param time_period: Period of the returns e.g. 'monthly'.
+        :param lower: Optional Series of the lowest weight of each symbol, 0 if missing.
+        :param upper: Optional Series of the highest weight of each symbol, 1 if missing.
+        :return: CornerPortfolios
+        """
+        symbols = mean.index
+        cov = cov.loc[symbols, symbols].to_numpy()
+        lower = None if lower is None else lower.reindex(symbols).fillna(0.0).to_numpy()
+        upper = None if upper is None else upper.reindex(symbols).fillna(1.0).to_numpy()
+        weights = critical_line(mean.to_numpy(), cov, lower, upper)
+        return cls(symbols, time_period, weights, mean.to_numpy(), cov)
+
+    def portfolio_stats(self, weights):
+        """
+        Period arithmetic mean return and standard deviation of a portfolio of the symbols.
+        :param weights: Array of weights in the order of symbols.
+        :return: Tuple of the mean return and standard deviation in percent.
+        """
+        return float(weights @ self.mean), float(np.sqrt(max(weights @ self.cov @ weights, 0.0)))
+
+    @property
+    def std_devs(self):
+        """Period standard deviation of each corner."""
+        return np.sqrt(np.maximum(np.diag(self.gram), 0.0))
+
+    def at_return(self, target_return):
+        """
+        Frontier weights with the target annualised arithmetic mean return.
+        The weights and return are linear between adjacent corners, so this is exact.
+        :param target_return: Annualised return in percent e.g. 12.5.
+        :return: Array of weights in the order of symbols.
+        """
+        periods = PERIODS_PER_YEAR[self.time_period]
+        target = ((1 + target_return / 100) ** (1 / periods) - 1) * 100
+        # Returns fall from the first corner to the minimum variance corner
+        if not self.returns[-1] - TOLERANCE <= target <= self.returns[0] + TOLERANCE:
+            raise ValueError("Target return is outside the efficient frontier")
+        k = self._segment(-self.returns, -target)
+        span = self.returns[k + 1] - self.returns[k]
+        t = 0.0 if span == 0 else (target - self.returns[k]) / span
+        return self._interpolate(k, t)
+
+    def at_risk(self, target_std_dev):
+        """
+        Frontier weights with the target annualised standard deviation. The variance is
+        quadratic in the interpolation between adjacent corners, so this is also exact.
+        :param target_std_dev: Annualised standard deviation in percent.
+        :return: Array of weights in the order of symbols.
+        """
+        target = target_std_dev / np.sqrt(PERIODS_PER_YEAR[self.time_period])
+        std_devs = self.std_devs
+        if not std_devs[-1] - TOLERANCE <= target <= std_devs[0] + TOLERANCE:
+            raise ValueError("Target risk is outside the efficient frontier")
+        k = self._segment(-std_devs, -target)
+        # Variance of (1 - t) w_k + t w_k+1 is a t^2 + b t + c
+        v00, v01, v11 = self.gram[k, k], self.gram[k, k + 1], self.gram[k + 1, k + 1]
+        a = v00 - 2 * v01 + v11
+        b = 2 * (v01 - v00)
+        c = v00 - target**2
+        if abs(a) < TOLERANCE:
+            t = 0.0 if b == 0 else -c / b
+        else:
+            roots = (-b + np.array([-1, 1]) * np.sqrt(max(b**2 - 4 * a * c, 0.0))) / (2 * a)
+            t = roots[np.argmin(np.abs(roots - np.clip(roots, 0, 1)))]
+        return self._interpolate(k, t)
+
+    def _segment(self, ascending, target):
+        """Index k of the corners k and k + 1 either side of target."""
+        if len(ascending) == 1:
+            return 0
+        return int(np.clip(np.searchsorted(ascending, target) - 1, 0, len(ascending) - 2))
+
+    def _interpolate(self, k, t):
+        if len(self.weights) == 1:
+            return self.weights[0]
+        t = min(max(t, 0.0), 1.0)
+        return (1 - t) * self.weights[k] + t * self.weights[k + 1]
+
+    @classmethod
+    def load(cls, path):
+        """Load corner portfolios saved with save."""
+        with open(os.path.join(path, "metadata.json")) as f:
+            metadata = json.load(f)
+        arrays = np.load(os.path.join(path, "corners.npz"))
+        return cls(metadata["symbols"], metadata["time_period"], arrays["weights"], arrays["mean"], arrays["cov"])
+
+    def save(self, path, requested_symbols=None):
+        """
+        Write the corners to a directory, replacing it atomically so readers never see a partial write.
+        :param requested_symbols: Optional symbols the frontier was requested for, including any
+            without data, recorded so that inserting their data invalidates it. Defaults to symbols.
+        """
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=parent)
+        metadata = {
+            "symbols": self.symbols,
+            "requested_symbols": list(requested_symbols or self.symbols),
+            "time_period": self.time_period,
+        }
+        with open(os.path.join(tmp_path, "metadata.json"), "w") as f:
+            json.dump(metadata, f)
+        np.savez(os.path.join(tmp_path, "corners.npz"), weights=self.weights, mean=self.mean, cov=self.cov)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another worker saved the same corners first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def corners_path(cache_dir, symbols, time_period, start_time, end_time, options=None):
+    """Directory of the corner portfolios for a symbol set, period, window and optimisation options."""
+    key = json.dumps([sorted(symbols), start_time, end_time, options], sort_keys=True, default=str)
+    return os.path.join(cache_dir, "frontier", time_period, hashlib.sha1(key.encode()).hexdigest())
+
+
+def read_corner_portfolios(cache_dir, symbols, time_period, start_time, end_time, options=None):
+    """
+    Read the cached corner portfolios for a symbol set, period and window.
+    :param options: Optional JSON serialisable options changing the frontier, such as weight bounds.
+    :return: CornerPortfolios, or None if they are not cached.
+    """
+    path = corners_path(cache_dir, symbols, time_period, start_time, end_time, options)
+    if not os.path.isdir(path):
+        return None
+    try:
+        return CornerPortfolios.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        log.warning(f"Failed to load corner portfolios {path}: {e}")
+        return None
+
+
+def write_corner_portfolios(cache_dir, symbols, time_period, start_time, end_time, corners, options=None):
+    """Cache the corner portfolios for a symbol set, period and window."""
+    corners.save(corners_path(cache_dir, symbols, time_period, start_time, end_time, options), symbols)
+
+
+def invalidate_corner_portfolios(cache_dir, symbols, time_period):
+    """Remove every cached frontier for the period requested for or holding any of symbols."""
+    period_dir = os.path.join(cache_dir, "frontier", time_period)
+    if not os.path.isdir(period_dir):
+        return
+    symbols = set(symbols)
+    for key in os.listdir(period_dir):
+        path = os.path.join(period_dir, key)
+        try:
+            with open(os.path.join(path, "metadata.json")) as f:
+                metadata = json.load(f)
+            cached_symbols = metadata["symbols"] + metadata.get("requested_symbols", [])
+        except (OSError, ValueError, KeyError):
+            continue
+        if symbols.intersection(cached_symbols):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,354 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"PACAT001"
+ALIGNMENT = 64
+# Non-facet columns with more distinct values than this are stored as text rather than codes
+MAX_CATEGORIES = 2**15 - 1
+
+
+class InstrumentCatalogue:
+    """
+    Compact read-only catalogue of the financedatabase instruments, stored in a
+    single file that every worker memory-maps. Facet columns (sector, industry,
+    country, ...) are dictionary-encoded as small-int codes and the remaining
+    strings live in UTF-8 blobs with offsets, so the datasets are shared through
+    the OS page cache instead of being held as pandas frames in every worker.
+
+    Each table's rows are sorted by symbol so symbol matches are binary searches.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an instrument catalogue")
+        (header_length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[header_start : header_start + header_length])
+        data_start = _aligned(header_start + header_length)
+        self.tables = {
+            table["name"]: CatalogueTable(self._mmap, data_start, table)
+            for table in header["tables"]
+        }
+
+    def search(self, table_names, symbol="", name="", filters=None, page=None, page_size=None, symbols=None):
+        """
+        Search the given tables the same way as selecting from the financedatabase
+        datasets: exact symbol matches first, then symbols starting with symbol,
+        then names containing name, each group sorted by symbol.
+        :param table_names: Names of the tables to search e.g. ['Equities', 'ETFs'].
+        :param filters: Dictionary of facet column to value or list of values.
+        :param symbols: Optional collection of symbols to restrict the matches to.
+        :return: Tuple of (records for the page, total number of matches, options).
+        """
+        filters = filters or {}
+        tables = [self.tables[table_name] for table_name in table_names]
+        groups = [([], [], []) for _ in range(3)]
+        options = {}
+        for table_index, table in enumerate(tables):
+            for k, v in table.options.items():
+                options[k] = options.get(k, []) + v
+            table_filters = {k: v for k, v in filters.items() if k in table.options}
+            for (ranks, table_indices, rows), matched in zip(
+                groups, table.match(symbol, name, table_filters, symbols)
+            ):
+                ranks.append(table.symbol_ranks[matched])
+                table_indices.append(np.full(len(matched), table_index))
+                rows.append(matched)
+
+        # Each group is ordered by symbol using the ranks of the symbols across all tables
+        matches = []
+        for ranks, table_indices, rows in groups:
+            ranks, table_indices, rows = (np.concatenate(x) for x in (ranks, table_indices, rows))
+            order = np.lexsort((table_indices, ranks))
+            matches.extend(zip(table_indices[order].tolist(), rows[order].tolist()))
+        total = len(matches)
+        if page is not None and page_size is not None:
+            matches = matches[(page - 1) * page_size : page * page_size]
+
+        columns = _union_columns(tables)
+        records = [tables[table_index].record(row, columns) for table_index, row in matches]
+        return records, total, options
+
+
+class CatalogueTable:
+    def __init__(self, buffer, data_start, header):
+        self.name = header["name"]
+        self.instrument_type = header["instrument_type"]
+        self.rows = header["rows"]
+        self.columns = header["columns"]
+        self.options = header["options"]
+        self._columns = {
+            column["name"]: _COLUMN_KINDS[column["kind"]](buffer, data_start, column)
+            for column in header["encoded"]
+        }
+        self._symbols = self._columns["symbol"]
+        self._names_lower = self._columns["name_lower"]
+        self.symbol_ranks = self._columns["symbol_rank"].values
+
+    def record(self, row, columns):
+        record = {}
+        for column in columns:
+            if column == "instrumentType":
+                record[column] = self.instrument_type
+            elif column in self._columns:
+                record[column] = self._columns[column].value(row)
+            else:
+                record[column] = None
+        return record
+
+    def match(self, symbol, name, filters, symbols=None):
+        """
+        Split the rows passing the filters into exact symbol matches, symbols starting
+        with symbol and names containing name, in that priority.
+        :param symbols: Optional collection of symbols to restrict the rows to.
+        :return: Tuple of three row index arrays.
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        for column, values in filters.items():
+            if values:
+                mask &= self._columns[column].isin(values)
+        if symbols is not None:
+            mask &= self.symbol_rows(symbols)
+
+        exact_start = bisect.bisect_left(self._symbols, symbol)
+        exact_end = bisect.bisect_right(self._symbols, symbol, lo=exact_start)
+        prefix_end = bisect.bisect_left(self._symbols, symbol + "\U0010ffff", lo=exact_end)
+
+        in_exact = np.zeros(self.rows, dtype=bool)
+        in_exact[exact_start:exact_end] = True
+        in_prefix = np.zeros(self.rows, dtype=bool)
+        in_prefix[exact_end:prefix_end] = True
+        in_name = self._names_lower.contains(name.lower()) & ~(in_exact | in_prefix)
+
+        return (
+            np.flatnonzero(mask & in_exact),
+            np.flatnonzero(mask & in_prefix),
+            np.flatnonzero(mask & in_name),
+        )
+
+    def symbol_rows(self, symbols):
+        """Rows of any of symbols, found by binary search of the sorted symbol column."""
+        found = np.zeros(self.rows, dtype=bool)
+        for symbol in symbols:
+            start = bisect.bisect_left(self._symbols, symbol)
+            found[start : bisect.bisect_right(self._symbols, symbol, lo=start)] = True
+        return found
+
+
+class _TextColumn:
+    def __init__(self, buffer, data_start, header):
+        arrays = _arrays(buffer, data_start, header)
+        self.buffer = buffer
+        self.offsets = arrays["offsets"]
+        self.nulls = arrays.get("nulls")
+        self.blob_start = data_start + header["arrays"]["blob"]["offset"]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start = self.blob_start + int(self.offsets[row])
+        end = self.blob_start + int(self.offsets[row + 1])
+        return self.buffer[start:end].decode()
+
+    def value(self, row):
+        if self.nulls is not None and self.nulls[row]:
+            return None
+        return self[row]
+
+    def contains(self, needle):
+        """
+        Rows whose text contains needle. Candidate start positions in the mapped blob
+        are narrowed one needle byte at a time, so the scan is vectorised and copy-free.
+        """
+        found = np.zeros(len(self), dtype=bool)
+        if not needle:
+            found[:] = True
+            return found
+        needle = np.frombuffer(needle.encode(), dtype=np.uint8)
+        blob = np.frombuffer(
+            self.buffer, dtype=np.uint8, count=int(self.offsets[-1]), offset=self.blob_start
+        )
+        positions = np.flatnonzero(blob[: len(blob) - len(needle) + 1] == needle[0])
+        for i in range(1, len(needle)):
+            positions = positions[blob[positions + i] == needle[i]]
+        rows = np.searchsorted(self.offsets, positions, side="right") - 1
+        # Ignore matches spanning a row boundary
+        rows = rows[positions + len(needle) <= self.offsets[rows + 1]]
+        found[rows] = True
+        return found
+
+
+class _CategoryColumn:
+    def __init__(self, buffer, data_start, header):
+        self.name = header["name"]
+        self.codes = _arrays(buffer, data_start, header)["codes"]
+        self.vocabulary = header["vocabulary"]
+        self._lower = [value.lower() for value in self.vocabulary]
+
+    def value(self, row):
+        code = self.codes[row]
+        return None if code < 0 else self.vocabulary[code]
+
+    def isin(self, values):
+        """Case-insensitive match against values, raising like financedatabase for unknown options."""
+        values = [values] if isinstance(values, str) else values
+        for value in values:
+            if value.lower() not in self._lower:
+                raise ValueError(
+                    f"The {self.name} '{value}' is not available in the database. "
+                    "Please check the available options using the 'show_options' method."
+                )
+        wanted = {value.lower() for value in values}
+        codes = [code for code, value in enumerate(self._lower) if value in wanted]
+        return np.isin(self.codes, codes)
+
+
+class _NumberColumn:
+    def __init__(self, buffer, data_start, header):
+        self.values = _arrays(buffer, data_start, header)["values"]
+
+    def value(self, row):
+        value = self.values[row]
+        if np.issubdtype(self.values.dtype, np.floating) and np.isnan(value):
+            return None
+        return value.item()
+
+
+_COLUMN_KINDS = {"text": _TextColumn, "category": _CategoryColumn, "number": _NumberColumn}
+
+
+def write_catalogue(path, datasets, instrument_types):
+    """
+    Encode the financedatabase datasets into a single catalogue file, replaced atomically.
+    :param path: Path of the catalogue file.
+    :param datasets: financedatabase objects e.g. fd.Equities(), named by their class.
+    :param instrument_types: Dictionary of dataset class name to instrument type e.g. {'Equities': 'Equity'}.
+    """
+    tables = []
+    arrays = []
+    data_length = 0
+
+    def add_array(array):
+        nonlocal data_length
+        offset = _aligned(data_length)
+        arrays.append((offset, np.ascontiguousarray(array)))
+        data_length = offset + array.nbytes
+        return {"dtype": array.dtype.str, "count": len(array), "offset": offset}
+
+    # Dense rank of every symbol across all datasets, so merged results sort without decoding symbols
+    symbols = [dataset.data.index.astype(str).sort_values() for dataset in datasets]
+    _, ranks = np.unique(np.concatenate([s.to_numpy(dtype=str) for s in symbols]), return_inverse=True)
+    table_ranks = np.split(ranks.astype(np.int32), np.cumsum([len(s) for s in symbols])[:-1])
+
+    for dataset, symbol_ranks in zip(datasets, table_ranks):
+        name = dataset.__class__.__name__
+        options = {k: v.astype(str).tolist() for k, v in dataset.show_options().items()}
+        data = dataset.data.copy()
+        data.index = data.index.astype(str)
+        data = data.sort_index(kind="stable")
+
+        names = data["name"].astype(str)
+        encoded = [
+            _encode_text("symbol", data.index.to_series(), add_array),
+            _encode_text("name", names, add_array),
+            _encode_text("name_lower", names.str.lower(), add_array),
+            {"name": "symbol_rank", "kind": "number", "arrays": {"values": add_array(symbol_ranks)}},
+        ]
+        for column in data.columns:
+            if column == "name":
+                continue
+            values = data[column]
+            if pd.api.types.is_numeric_dtype(values):
+                encoded.append(
+                    {"name": column, "kind": "number", "arrays": {"values": add_array(values.to_numpy())}}
+                )
+            elif column in options or values.nunique() <= min(MAX_CATEGORIES, len(values) // 2):
+                encoded.append(_encode_category(column, values, add_array))
+            else:
+                encoded.append(_encode_text(column, values, add_array))
+
+        tables.append(
+            {
+                "name": name,
+                "instrument_type": instrument_types[name],
+                "rows": len(data),
+                "columns": list(data.columns),
+                "options": options,
+                "encoded": encoded,
+            }
+        )
+
+    header = json.dumps({"tables": tables}).encode()
+    header_start = len(MAGIC) + 8
+    data_start = _aligned(header_start + len(header))
+
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    handle, tmp_path = tempfile.mkstemp(dir=parent)
+    with os.fdopen(handle, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for offset, array in arrays:
+            f.seek(data_start + offset)
+            f.write(array.tobytes())
+        f.truncate(data_start + data_length)
+    os.replace(tmp_path, path)
+
+
+def _encode_text(name, values, add_array):
+    nulls = values.isna().to_numpy()
+    encoded_values = [b"" if null else str(value).encode() for value, null in zip(values, nulls)]
+    offsets = np.zeros(len(encoded_values) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded_values], out=offsets[1:])
+    column_arrays = {
+        "offsets": add_array(offsets),
+        "blob": add_array(np.frombuffer(b"".join(encoded_values), dtype=np.uint8)),
+    }
+    if nulls.any():
+        column_arrays["nulls"] = add_array(nulls)
+    return {"name": name, "kind": "text", "arrays": column_arrays}
+
+
+def _encode_category(name, values, add_array):
+    strings = values.dropna().astype(str)
+    vocabulary = sorted(strings.unique())
+    dtype = np.int16 if len(vocabulary) <= MAX_CATEGORIES else np.int32
+    codes = np.full(len(values), -1, dtype=dtype)
+    codes[values.notna().to_numpy()] = pd.Categorical(strings, categories=vocabulary).codes
+    return {
+        "name": name,
+        "kind": "category",
+        "vocabulary": vocabulary,
+        "arrays": {"codes": add_array(codes)},
+    }
+
+
+def _arrays(buffer, data_start, header):
+    return {
+        key: np.frombuffer(buffer, dtype=spec["dtype"], count=spec["count"], offset=data_start + spec["offset"])
+        for key, spec in header["arrays"].items()
+    }
+
+
+def _aligned(position):
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def _union_columns(tables):
+    columns = ["symbol"]
+    for table in tables:
+        for column in table.columns + ["instrumentType"]:
+            if column not in columns:
+                columns.append(column)
+    return columns
@@ -1,33 +1,81 @@
 import os
-from time import sleep
 import asyncio
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI
-from fastapi.responses import ORJSONResponse
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import json
 import pandas as pd
 import math
+import orjson
 
-from financetoolkit import Toolkit
-import yfinance as yf
-
-from pydantic import BaseModel, ConfigDict
+from functools import partial
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from pydantic.alias_generators import to_camel
-from humps import camelize
-from typing import Any, Dict, Union, List, Optional
+from humps import camelize, decamelize
+from typing import Any, Dict, Literal, Union, List, Optional
 
 from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import insert
 
+from alignment import align_returns
 from analysis import (
+    adjust_averages_for_period,
+    adjust_std_dev_for_period,
     get_averages,
-    get_geometric_mean,
     get_correlation_matrix,
+    get_covariance_correlation_matrix,
+    get_covariance_standard_deviation,
     get_standard_deviation,
 )
-from utils import initialize_engine, initialize_financial_data
+from return_statistics import (
+    covers_returns,
+    get_window_averages,
+    get_window_geometric_mean,
+    get_window_statistics,
+    get_window_standard_deviation,
+)
+from prefetch import PrefetchScheduler
+from upstream import UpstreamCoordinator
+from coverage import covered_window, get_coverage_updates, group_uncovered
+from downsampling import downsample_history
+from frontier import (
+    CornerPortfolios,
+    invalidate_corner_portfolios,
+    read_corner_portfolios,
+    write_corner_portfolios,
+)
+from covariance_cache import get_cross_product_cache, invalidate_cross_product_caches
+from tick_cache import invalidate_tick_data, read_tick_data
+from tracing import (
+    detach_trace,
+    finish_after,
+    profiled,
+    record_trace,
+    render_metrics,
+    span,
+    start_trace,
+    traced,
+)
+from utils import (
+    CACHE_DIR,
+    INSTRUMENT_NAME_MAPPING,
+    PREFETCH_IN_APP,
+    PREFETCH_WATCH_DAYS,
+    PROFILING_ENABLED,
+    SCREEN_MAX_LIMIT,
+    SCREEN_MAX_UNIVERSE,
+    FinancialData,
+    engine_ready,
+    get_engine,
+    get_optimisation_executor,
+    shutdown_optimisation_executor,
+)
 from optimisation import optimise_portfolio
+from rebalance import add_trades, get_holdings
+from screening import screen, screen_chunks
 
 from logging import basicConfig, INFO, getLogger
 
@@ -35,24 +83,14 @@ from logging import basicConfig, INFO, getLogger
 basicConfig(level=INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 log = getLogger(__name__)
 
-engine = initialize_engine()
-
 API_KEY = os.getenv("FMP_API_KEY")
 
-EQUITIES, ETFS, CRYPTO, FUNDS = None, None, None, None
-while any(x is None for x in (EQUITIES, ETFS, CRYPTO, FUNDS)):
-    EQUITIES, ETFS, CRYPTO, FUNDS = initialize_financial_data()
-    if any(x is None for x in (EQUITIES, ETFS, CRYPTO, FUNDS)):
-        sleep(1)
-
-INSTRUMENT_NAME_MAPPING = {
-    "Equities": "Equity",
-    "ETFs": "ETF",
-    "Cryptos": "Crypto",
-    "Funds": "Fund",
-}
+# Loaded in the background at startup, see FinancialData
+financial_data = FinancialData()
 
 StringList = Union[str, List[str]]
+# Named as in the camelized responses
+ScreenMetric = Literal["arithmeticMean", "geometricMean", "stdDev", "semivariance", "maxDrawdown"]
 
 
 class BaseSchema(BaseModel):
@@ -63,11 +101,64 @@ class BaseSchema(BaseModel):
     )
 
 
+class RebalanceSettings(BaseSchema):
+    # Percentage points of period return deducted per unit of turnover, the sum of
+    # absolute weight changes from the current holdings
+    turnover_penalty: float = 0.0
+    max_turnover: Optional[float] = None
+    min_weights: Dict[str, float] = {}
+    max_weights: Dict[str, float] = {}
+    # Shares traded at once per symbol, 1 if missing
+    lot_sizes: Dict[str, float] = {}
+    # Value of one unit of each currency in a common currency, as from /currencies
+    currency_rates: Dict[str, float] = {}
+
+
 class OptimisationSettings(BaseSchema):
     portfolio: List[Dict[str, Any]]
     time_period: str = "monthly"
     start_time: str
     end_time: str
+    # How to align symbols trading on different dates, see alignment.py
+    alignment: Literal["union", "intersection", "compound"] = "union"
+    # Rebalance from the current holdings in the portfolio items rather than from cash
+    rebalance: Optional[RebalanceSettings] = None
+    # Most points per series of the drawdown and historical data, all of them if not set
+    max_points: Optional[int] = Field(None, ge=10)
+
+    @model_validator(mode="after")
+    def check_weight_bounds(self):
+        if self.rebalance is None:
+            return self
+        symbols = [item["symbol"] for item in self.portfolio]
+        for symbol in symbols:
+            if self.rebalance.min_weights.get(symbol, 0.0) > self.rebalance.max_weights.get(symbol, 1.0):
+                raise ValueError(f"Minimum weight of {symbol} is above its maximum weight")
+        lowest = sum(self.rebalance.min_weights.get(symbol, 0.0) for symbol in symbols)
+        highest = sum(self.rebalance.max_weights.get(symbol, 1.0) for symbol in symbols)
+        if lowest > 1 or highest < 1:
+            raise ValueError("Minimum and maximum weights must allow the weights to sum to 1")
+        return self
+
+
+class FrontierQuery(OptimisationSettings):
+    # Annualised percentage arithmetic mean return or standard deviation to find the weights of
+    target_return: Optional[float] = None
+    target_std_dev: Optional[float] = None
+
+    @model_validator(mode="after")
+    def check_frontier_options(self):
+        if self.rebalance is not None and (
+            self.rebalance.turnover_penalty or self.rebalance.max_turnover is not None
+        ):
+            raise ValueError("Turnover is not supported on the interpolated frontier")
+        if (self.target_return is None) == (self.target_std_dev is None):
+            raise ValueError("Set exactly one of target_return and target_std_dev")
+        return self
+
+
+class BatchOptimisationSettings(BaseSchema):
+    portfolios: List[OptimisationSettings]
 
 
 class SearchOptions(BaseSchema):
@@ -97,10 +188,45 @@ class SearchOptions(BaseSchema):
     family: Optional[StringList] = None
 
 
+class MetricRange(BaseSchema):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class ScreenOptions(BaseSchema):
+    # Instruments to screen, selected as by the instrument search
+    universe: SearchOptions
+    time_period: str = "monthly"
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    metric_filters: Dict[ScreenMetric, MetricRange] = {}
+    sort_by: ScreenMetric = "geometricMean"
+    ascending: bool = False
+    limit: int = Field(100, ge=1, le=SCREEN_MAX_LIMIT)
+    # Precision of the returns, float32 halves the memory of each block, see alignment.py
+    dtype: Literal["float64", "float32"] = "float64"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the slow initialisation without blocking startup so /health is served immediately
+    financial_data.start()
+    threading.Thread(target=get_engine, daemon=True).start()
+    # Only suitable with a single worker, otherwise run `python prefetch.py` separately
+    prefetch_task = None
+    if PREFETCH_IN_APP:
+        prefetch_task = asyncio.create_task(create_prefetch_scheduler().run_forever())
+    yield
+    if prefetch_task is not None:
+        prefetch_task.cancel()
+    shutdown_optimisation_executor()
+
+
 app = FastAPI(
     description="Portfolio Analysis API",
     version="1.0.0",
     default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -112,7 +238,56 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Time each request and its named spans, reported as a Server-Timing header,
+    structured log fields and the /metrics histograms. With PROFILING_ENABLED set,
+    ?profile=1 returns a cProfile report of the request instead of its response.
+    The logged and recorded total covers sending the whole body, including the
+    body of streaming responses, but the Server-Timing header is sent before it.
+    """
+    trace, token = start_trace()
+    status = 500
+
+    def finish():
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        record_trace(trace, request.method, route, status)
+        fields = {"method": request.method, "route": route, "status": status, **trace.log_fields()}
+        log.info(" ".join(f"{k}={v}" for k, v in fields.items()), extra={"trace": fields})
+
+    try:
+        if PROFILING_ENABLED and request.query_params.get("profile") == "1":
+            with profiled() as report:
+                response = await call_next(request)
+            status = response.status_code
+            finish()
+            return PlainTextResponse(report(), headers={"Server-Timing": trace.server_timing()})
+        response = await call_next(request)
+    except Exception:
+        finish()
+        raise
+    finally:
+        detach_trace(token)
+    status = response.status_code
+    response.headers["Server-Timing"] = trace.server_timing()
+    # The body is sent after the middleware returns, so the trace is finished once it has been
+    response.body_iterator = finish_after(response.body_iterator, finish)
+    return response
+
+
+@traced("serialize")
+def encode_response(content: Any) -> ORJSONResponse:
+    """
+    Encode a route's content as its response within the request's trace, as content
+    returned from a route is only encoded once the route has returned.
+    """
+    return ORJSONResponse(jsonable_encoder(content))
+
+
 async def get_current_price_and_time(symbol: str):
+    import yfinance as yf
+
     loop = asyncio.get_event_loop()
     ticker = await loop.run_in_executor(None, yf.Ticker, symbol)
 
@@ -138,103 +313,151 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request and span duration histograms in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready", response_model=Dict[str, Any])
+async def readiness_check():
+    """Ready once the database is connected and the instrument datasets are loaded."""
+    if not (financial_data.ready.is_set() and engine_ready()):
+        return ORJSONResponse(status_code=503, content={"status": "loading"})
+    return {"status": "ready", **financial_data.startup_metrics}
+
+
 @app.post("/instruments/search", response_model=Dict[str, Any])
 async def search_instruments(search_values: SearchOptions):
+    loop = asyncio.get_event_loop()
+    catalogue = await loop.run_in_executor(None, financial_data.wait)
     instrument_type = search_values.instrument_type
     search_values.instrument_type = None
-    if instrument_type == "Equities":
-        return search_instruments_helper(search_values, [EQUITIES])
-    elif instrument_type == "ETFs":
-        return search_instruments_helper(search_values, [ETFS])
-    elif instrument_type == "Cryptos":
-        return search_instruments_helper(search_values, [CRYPTO])
-    elif instrument_type == "Funds":
-        return search_instruments_helper(search_values, [FUNDS])
+    if instrument_type in INSTRUMENT_NAME_MAPPING:
+        return encode_response(search_instruments_helper(search_values, catalogue, [instrument_type]))
     else:
-        # Search both and merge results
-        return search_instruments_helper(search_values, [EQUITIES, ETFS, CRYPTO, FUNDS])
+        # Search all and merge results
+        return encode_response(
+            search_instruments_helper(search_values, catalogue, list(INSTRUMENT_NAME_MAPPING.keys()))
+        )
 
 
-def search_instruments_helper(search_values, DBs):
+def search_instruments_helper(search_values, catalogue, table_names, symbols=None):
     req_json = search_values.model_dump(exclude_none=True)
     symbol = req_json.pop("symbol", "")
     name = req_json.pop("name", "").lower()
     page = req_json.pop("page", None)
     page_size = req_json.pop("page_size", None)
 
-    all_options = {}
-    all_exact = pd.DataFrame()
-    all_startswith = pd.DataFrame()
-    all_name_contains = pd.DataFrame()
-
-    for DB in DBs:
-        instrument_type = INSTRUMENT_NAME_MAPPING[DB.__class__.__name__]
-        options = {k: v.astype(str).tolist() for k, v in DB.show_options().items()}
-        for k, v in options.items():
-            all_options[k] = all_options.get(k, []) + v
-        db_options = {k: v for k, v in req_json.items() if k in options.keys()}
-        results = DB.select(**db_options)
-        results.index = results.index.astype(str)
-        results["name"] = results["name"].astype(str)
-        results["instrumentType"] = instrument_type
-
-        exact_match = results[results.index == symbol]
-        startswith_match = results[
-            (results.index.str.startswith(symbol)) & (results.index != symbol)
-        ]
-        already_matched = set(exact_match.index).union(startswith_match.index)
-        name_contains_match = results[
-            (~results.index.isin(already_matched))
-            & (results["name"].str.lower().str.contains(name))
-        ]
+    with span("catalogue_search"):
+        results, total, all_options = catalogue.search(
+            table_names, symbol, name, req_json, page, page_size, symbols
+        )
 
-        all_exact = pd.concat([all_exact, exact_match])
-        all_startswith = pd.concat([all_startswith, startswith_match])
-        all_name_contains = pd.concat([all_name_contains, name_contains_match])
+    if page_size is None or page is None:
+        return {"data": results, "pageCount": 1, "options": all_options}
+    with span("camelize"):
+        return {
+            "data": [camelize(result) for result in results],
+            "pageCount": math.ceil(total / page_size),
+            "options": camelize(all_options),
+        }
 
-    all_exact = all_exact.sort_index()
-    all_startswith = all_startswith.sort_index()
-    all_name_contains = all_name_contains.sort_index()
-    all_results = pd.concat([all_exact, all_startswith, all_name_contains])
 
-    all_results_json = json.loads(all_results.reset_index().to_json(orient="records"))
+@app.post("/instruments/screen", response_class=ORJSONResponse)
+async def screen_instruments(options: ScreenOptions):
+    """
+    Rank a universe of instruments, selected as by the instrument search, by their return
+    statistics over the stored history. Symbols without stored history are skipped, and
+    universes with more than SCREEN_MAX_UNIVERSE stored symbols are rejected.
+    :return: Dictionary with the top limit instruments and their statistics, and the number
+        of symbols screened and passing the metric filters.
+    """
+    loop = asyncio.get_event_loop()
+    catalogue = await loop.run_in_executor(None, financial_data.wait)
+    universe = options.universe.model_copy(update={"page": None, "page_size": None, "instrument_type": None})
+    instrument_type = options.universe.instrument_type
+    table_names = (
+        [instrument_type] if instrument_type in INSTRUMENT_NAME_MAPPING else list(INSTRUMENT_NAME_MAPPING.keys())
+    )
+    with span("stored_symbols"):
+        stored = await loop.run_in_executor(None, read_stored_symbols, options.time_period)
+    records = search_instruments_helper(universe, catalogue, table_names, stored)["data"]
+    if len(records) > SCREEN_MAX_UNIVERSE:
+        return ORJSONResponse(
+            status_code=422,
+            content={
+                "detail": f"The universe has {len(records)} symbols with stored history, "
+                f"narrow it to at most {SCREEN_MAX_UNIVERSE}"
+            },
+        )
+    names = {record["symbol"]: record.get("name") for record in records}
+
+    def run_screen():
+        chunks = screen_chunks(
+            list(names),
+            lambda symbols: read_returns_history_from_db(
+                symbols, options.time_period, options.start_time, options.end_time
+            ),
+            options.time_period,
+            dtype=options.dtype,
+        )
+        metric_filters = {
+            decamelize(metric): (bounds.min, bounds.max)
+            for metric, bounds in options.metric_filters.items()
+        }
+        return screen(
+            chunks, metric_filters, decamelize(options.sort_by), options.ascending, options.limit
+        )
 
-    if page_size is None or page is None:
-        return {"data": all_results_json, "pageCount": 1, "options": all_options}
-    return {
-        "data": [camelize(result) for result in all_results_json[(page - 1) * page_size : page * page_size]],
-        "pageCount": math.ceil(len(all_results_json) / page_size),
-        "options": camelize(all_options),
-    }
+    with span("screen"):
+        top, screened, matched = await loop.run_in_executor(None, run_screen)
+    return camelize({
+        "data": [
+            {"symbol": symbol, "name": names.get(symbol), **stats}
+            for symbol, stats in zip(top.index, top.to_dict(orient="records"))
+        ],
+        "screened": screened,
+        "matched": matched,
+    })
 
 
 async def get_data_from_toolkit(settings: OptimisationSettings):
     symbols = [portfolio_item["symbol"] for portfolio_item in settings.portfolio]
-    tk = Toolkit(
-        symbols,
-        start_date=settings.start_time,
-        end_date=settings.end_time,
-        api_key=API_KEY,
-    )
-    data = tk.get_historical_data(period=settings.time_period).loc[
-        :, (slice(None), symbols)
-    ]
+    # Fetched and inserted once when concurrent requests need the same symbols
+    with span("upstream_fetch"):
+        return await upstream.fetch(
+            symbols, settings.time_period, settings.start_time, settings.end_time
+        )
+
+
+def fetch_historical_data(
+    symbols: List[str], time_period: str, start_time: str, end_time: str
+) -> pd.DataFrame:
+    """
+    Fetch the historical data of the symbols from FMP in a single Toolkit call.
+    :return: Tick data in the layout of the historical tick data tables.
+    """
+    from financetoolkit import Toolkit
+
+    tk = Toolkit(symbols, start_date=start_time, end_date=end_time, api_key=API_KEY)
+    data = tk.get_historical_data(period=time_period).loc[:, (slice(None), symbols)]
     data = process_historical_data(data)
     data["trade_date"] = data["trade_date"].dt.strftime("%Y-%m-%d")
-    for item in settings.portfolio:
-        missing_dates = get_missing_dates(
-            data[data["symbol"] == item["symbol"]],
-            item["exchange"],
-            settings.time_period,
-            settings.start_time,
-            settings.end_time,
-        )
-        if len(missing_dates) > 0:
-            set_exchange_holidays(item["exchange"], missing_dates)
-    insert_data_into_db(data, settings.time_period)
     return data
 
 
+def fetch_and_store_historical_data(
+    symbols: List[str], time_period: str, start_time: str, end_time: str
+) -> pd.DataFrame:
+    data = fetch_historical_data(symbols, time_period, start_time, end_time)
+    insert_data_into_db(data, time_period, symbols, start_time, end_time)
+    return data
+
+
+upstream = UpstreamCoordinator(fetch_and_store_historical_data)
+
+
 @app.post("/instruments/current_price", response_model=Dict[str, Any])
 async def get_equity_instrument_current_price(symbols: List[str]):
     """
@@ -277,81 +500,414 @@ async def analyse_instruments(settings: OptimisationSettings):
     })
 
 
-def find_missing_portfolio_items(
-    data: pd.DataFrame, settings: OptimisationSettings
-) -> List[Dict[str, Any]]:
-    """Return portfolio items missing from the data (by symbol or missing dates)."""
-    existing_symbols = set(data["symbol"].unique())
-    missing_portfolio = [
-        item for item in settings.portfolio if item["symbol"] not in existing_symbols
-    ]
-    for item in settings.portfolio:
-        missing_dates = get_missing_dates(
-            data[data["symbol"] == item["symbol"]],
-            item["exchange"],
-            settings.time_period,
-            settings.start_time,
-            settings.end_time,
-        )
-        if missing_dates and item not in missing_portfolio:
-            missing_portfolio.append(item)
-    return missing_portfolio
+def read_uncovered_windows(settings: OptimisationSettings) -> Dict[str, tuple]:
+    """
+    Dates of the settings' window not yet fetched for each symbol, from the coverage
+    metadata. One indexed row is read per symbol, whatever the length of the window.
+    :return: Dictionary of symbol to its first and last uncovered dates, for symbols with any.
+    """
+    window = covered_window(
+        settings.time_period, settings.start_time, settings.end_time, pd.Timestamp.now(tz="UTC")
+    )
+    if window is None:
+        return {}
+    sql_query = text(
+        f"""
+        SELECT
+            s.symbol,
+            lower(range_merge(g.uncovered)) AS uncovered_from,
+            upper(range_merge(g.uncovered)) - 1 AS uncovered_to
+        FROM unnest(CAST(:symbols AS TEXT[])) AS s(symbol)
+        LEFT JOIN {settings.time_period}_symbol_coverage c ON c.symbol = s.symbol
+        CROSS JOIN LATERAL (
+            SELECT datemultirange(daterange(:window_from, :window_to, '[]'))
+                - COALESCE(c.covered, '{{}}') AS uncovered
+        ) g
+        WHERE NOT isempty(g.uncovered)
+        """
+    )
+    uncovered = pd.read_sql_query(
+        sql_query,
+        con=get_engine(),
+        params={
+            "symbols": [item["symbol"] for item in settings.portfolio],
+            "window_from": window[0],
+            "window_to": window[1],
+        },
+    )
+    return {
+        row.symbol: (row.uncovered_from, row.uncovered_to)
+        for row in uncovered.itertuples(index=False)
+    }
 
 
-def filter_existing_data(
-    data: pd.DataFrame, settings: OptimisationSettings, missing_symbols: List[str]
-) -> pd.DataFrame:
-    """Return data for symbols not in missing_symbols."""
-    keep_symbols = [
-        item["symbol"]
-        for item in settings.portfolio
-        if item["symbol"] not in missing_symbols
-    ]
-    return data[data["symbol"].isin(keep_symbols)]
+async def fetch_uncovered_data(settings: OptimisationSettings, uncovered: Dict[str, tuple]):
+    """Fetch and store only the uncovered window of each symbol, one call per distinct window."""
+    items = {item["symbol"]: item for item in settings.portfolio}
+    await asyncio.gather(*(
+        get_data_from_toolkit(
+            settings.model_copy(
+                update={
+                    "portfolio": [items[symbol] for symbol in symbols],
+                    "start_time": pd.Timestamp(start).strftime("%Y-%m-%d"),
+                    "end_time": pd.Timestamp(end).strftime("%Y-%m-%d"),
+                }
+            )
+        )
+        for (start, end), symbols in group_uncovered(uncovered).items()
+    ))
 
 
 @app.post("/portfolio/optimise", response_class=ORJSONResponse)
 async def optimise_portfolio_route(settings: OptimisationSettings):
     """Optimise a portfolio based on the provided portfolio data."""
-    data = read_data_from_db(settings)
+    data = await load_optimisation_data(settings)
+    stock_stats = get_stock_stats(settings, data)
+    cov_matrix = get_cached_covariance(settings, data)
 
-    # Find missing portfolio items (by symbol or missing dates)
-    missing_portfolio = find_missing_portfolio_items(data, settings)
-    missing_symbols = [item["symbol"] for item in missing_portfolio]
-    data = filter_existing_data(data, settings, missing_symbols)
+    try:
+        optimisation_results = get_optimiser(settings)(data, settings.time_period, cov_matrix)
+    except ValueError as e:
+        return ORJSONResponse(status_code=422, content={"detail": str(e)})
+    if settings.rebalance is not None:
+        with span("trades"):
+            add_trades(optimisation_results, get_portfolio_holdings(settings))
 
-    # Fetch and append missing data if needed
-    if missing_portfolio:
-        settings.portfolio = missing_portfolio
-        missing_data = await get_data_from_toolkit(settings)
-        data = pd.concat([data, pd.DataFrame(missing_data)])
+    with span("camelize"):
+        content = build_optimisation_response(settings, data, optimisation_results, stock_stats)
+    return encode_response(content)
 
-    std = get_standard_deviation(
-        data, input_period=settings.time_period, output_period="yearly"
+
+@app.post("/portfolio/optimise/batch")
+async def optimise_portfolio_batch_route(batch: BatchOptimisationSettings):
+    """
+    Optimise several portfolios at once. Portfolios sharing a time period and window
+    are loaded together and share one covariance matrix, and the optimisations run in
+    parallel worker processes.
+    :return: Newline delimited JSON, one line per portfolio in the order they finish,
+        with its index in the request and either its result or an error.
+    """
+    return StreamingResponse(
+        stream_batch_optimisation(batch.portfolios), media_type="application/x-ndjson"
     )
-    corr_matrix = get_correlation_matrix(data)
-    ret = get_averages(data, input_period=settings.time_period, output_period="yearly")
-    geo_ret = get_geometric_mean(
-        data, input_period=settings.time_period, output_period="yearly"
+
+
+@app.post("/portfolio/frontier/query", response_class=ORJSONResponse)
+async def query_frontier_route(query: FrontierQuery):
+    """
+    Optimal weights for a target return or risk, interpolated between the cached corner
+    portfolios of the efficient frontier, which are computed on the first query.
+    """
+    try:
+        corners = await get_corner_portfolios(query)
+    except ValueError as e:
+        return ORJSONResponse(status_code=422, content={"detail": str(e)})
+    with span("interpolate"):
+        try:
+            if query.target_return is not None:
+                weights = corners.at_return(query.target_return)
+            else:
+                weights = corners.at_risk(query.target_std_dev)
+        except ValueError as e:
+            return ORJSONResponse(status_code=422, content={"detail": str(e)})
+    return camelize({
+        "weights": [
+            {"symbol": symbol, "value_proportion": value}
+            for symbol, value in zip(corners.symbols, weights.tolist())
+        ],
+        **frontier_point_stats(corners, weights),
+    })
+
+
+@app.post("/portfolio/frontier", response_class=ORJSONResponse)
+async def frontier_route(settings: OptimisationSettings):
+    """Corner portfolios of the efficient frontier, between which every optimal portfolio lies."""
+    try:
+        corners = await get_corner_portfolios(settings)
+    except ValueError as e:
+        return ORJSONResponse(status_code=422, content={"detail": str(e)})
+    return camelize({
+        "time_period": settings.time_period,
+        "corner_portfolios": [
+            {
+                "weights": [
+                    {"symbol": symbol, "value_proportion": value}
+                    for symbol, value in zip(corners.symbols, weights.tolist())
+                ],
+                **frontier_point_stats(corners, weights),
+            }
+            for weights in corners.weights
+        ],
+    })
+
+
+async def get_corner_portfolios(settings: OptimisationSettings) -> CornerPortfolios:
+    """Corner portfolios of the settings' efficient frontier, from the cache if computed before."""
+    symbols = [item["symbol"] for item in settings.portfolio]
+    options = {"alignment": settings.alignment}
+    if settings.rebalance is not None:
+        options.update(
+            min_weights=settings.rebalance.min_weights, max_weights=settings.rebalance.max_weights
+        )
+    cache_key = (CACHE_DIR, symbols, settings.time_period, settings.start_time, settings.end_time)
+    with span("frontier_cache"):
+        corners = read_corner_portfolios(*cache_key, options=options)
+    if corners is not None:
+        return corners
+
+    data = await load_optimisation_data(settings)
+    with span("critical_line"):
+        aligned = align_returns(
+            data.pivot(index="trade_date", columns="symbol", values="change_percent"), settings.alignment
+        )
+        mean = aligned.mean()
+        cov = get_cached_covariance(settings, data)
+        cov = aligned.covariance() if cov is None else cov
+        corners = CornerPortfolios.from_returns(
+            mean,
+            cov,
+            settings.time_period,
+            lower=pd.Series(options.get("min_weights", {}), dtype=float),
+            upper=pd.Series(options.get("max_weights", {}), dtype=float),
+        )
+    write_corner_portfolios(*cache_key, corners, options=options)
+    return corners
+
+
+def frontier_point_stats(corners: CornerPortfolios, weights) -> Dict[str, float]:
+    """Annualised arithmetic mean and standard deviation of a portfolio on the frontier."""
+    mean, std = corners.portfolio_stats(weights)
+    return {
+        "std_dev": adjust_std_dev_for_period(std, corners.time_period, "yearly"),
+        "arithmetic_mean": adjust_averages_for_period(mean, corners.time_period, "yearly"),
+    }
+
+
+async def load_optimisation_data(settings: OptimisationSettings) -> pd.DataFrame:
+    """Read the portfolio's tick data, first fetching any dates not yet covered from FMP."""
+    with span("gap_check"):
+        uncovered = read_uncovered_windows(settings)
+    if uncovered:
+        await fetch_uncovered_data(settings, uncovered)
+
+    with span("db_read"):
+        data = read_data_from_db(settings)
+
+    with span("watch"):
+        watch_symbols(settings)
+    return data
+
+
+def get_portfolio_holdings(settings: OptimisationSettings) -> pd.DataFrame:
+    return get_holdings(
+        settings.portfolio,
+        settings.rebalance.currency_rates,
+        settings.rebalance.lot_sizes,
     )
 
-    optimisation_results = optimise_portfolio(data, settings.time_period)
 
+def get_optimiser(settings: OptimisationSettings):
+    """
+    optimise_portfolio with the alignment, rebalancing and downsampling options of the settings,
+    taking the data, time period and covariance matrix.
+    """
+    options = {"alignment": settings.alignment, "max_points": settings.max_points}
+    if settings.rebalance is not None:
+        options.update(
+            current_weights=get_portfolio_holdings(settings)["weight"],
+            turnover_penalty=settings.rebalance.turnover_penalty,
+            max_turnover=settings.rebalance.max_turnover,
+            min_weights=pd.Series(settings.rebalance.min_weights, dtype=float),
+            max_weights=pd.Series(settings.rebalance.max_weights, dtype=float),
+        )
+    return partial(optimise_portfolio, **options)
+
+
+def get_stock_stats(
+    settings: OptimisationSettings,
+    data: pd.DataFrame,
+    window_stats: Optional[pd.DataFrame] = None,
+) -> Dict[str, Any]:
+    """
+    Annualised per-symbol statistics and the correlation matrix of the symbols in data.
+    :param settings: OptimisationSettings of the window.
+    :param data: Historical data of the portfolio, whose dates the geometric mean is taken over.
+    :param window_stats: Window totals already read for a superset of the symbols, if any.
+        Only used under the union alignment.
+    :return: Dict with std_dev, arithmetic_mean, geometric_mean and corr_matrix.
+    """
+    # The stats are of the returns aligned as the frontier aligns them. Under the union
+    # alignment the per-symbol stats come from the prefix statistics table when it
+    # covers every return in the window, as the table holds unaligned returns.
+    with span("statistics"):
+        aligned = align_returns(
+            data.pivot(index="trade_date", columns="symbol", values="change_percent"), settings.alignment
+        )
+        cov_matrix = aligned.covariance()
+        covered = False
+        if settings.alignment == "union":
+            if window_stats is None:
+                window_stats = read_symbol_statistics(settings)
+            window_stats = window_stats.reindex(aligned.symbols)
+            covered = covers_returns(window_stats, data)
+        if covered:
+            std = get_window_standard_deviation(
+                window_stats, input_period=settings.time_period, output_period="yearly"
+            )
+            ret = get_window_averages(
+                window_stats, input_period=settings.time_period, output_period="yearly"
+            )
+            geo_ret = get_window_geometric_mean(
+                window_stats, len(aligned), input_period=settings.time_period, output_period="yearly"
+            )
+        else:
+            std = get_covariance_standard_deviation(
+                cov_matrix, input_period=settings.time_period, output_period="yearly"
+            )
+            ret = adjust_averages_for_period(aligned.mean(), settings.time_period, "yearly")
+            geo_ret = adjust_averages_for_period(aligned.geometric_mean(), settings.time_period, "yearly")
+        corr_matrix = get_covariance_correlation_matrix(cov_matrix)
+    return {
+        "std_dev": std,
+        "arithmetic_mean": ret,
+        "geometric_mean": geo_ret,
+        "corr_matrix": corr_matrix,
+    }
+
+
+def get_cached_covariance(
+    settings: OptimisationSettings, data: pd.DataFrame
+) -> Optional[pd.DataFrame]:
+    """
+    Covariance matrix of the symbols in data over the settings' window, from the
+    cross-product cache. None unless the union alignment is used, as the cached
+    covariance is pairwise complete, or if the symbol set is too large to cache.
+    """
+    if settings.alignment != "union":
+        return None
+    with span("covariance"):
+        symbols = list(data["symbol"].unique())
+        cov_cache = get_cross_product_cache(
+            CACHE_DIR,
+            symbols,
+            settings.time_period,
+            lambda: read_returns_history_from_db(symbols, settings.time_period),
+        )
+        if cov_cache is None:
+            return None
+        return cov_cache.covariance(settings.start_time, settings.end_time)
+
+
+def build_optimisation_response(
+    settings: OptimisationSettings,
+    data: pd.DataFrame,
+    optimisation_results: List[Dict[str, Any]],
+    stock_stats: Dict[str, Any],
+) -> Dict[str, Any]:
+    if settings.max_points is not None:
+        with span("downsample"):
+            data = downsample_history(data, settings.max_points)
     return camelize({
         "optimisation_results": optimisation_results,
         "time_period": settings.time_period,
         "historical_data": data.groupby("symbol")[
             ["trade_date", "close_price", "change_percent"]
         ].apply(lambda x: camelize(x.to_dict(orient="records"))),
-        "stock_stats": {
-            "std_dev": std,
-            "arithmetic_mean": ret,
-            "geometric_mean": geo_ret,
-            "corr_matrix": corr_matrix,
-        },
+        "stock_stats": stock_stats,
     })
 
 
+def group_portfolios(portfolios: List[OptimisationSettings]) -> Dict[tuple, List[int]]:
+    """Indices of the portfolios grouped by the time period and window they share."""
+    groups = {}
+    for i, settings in enumerate(portfolios):
+        key = (settings.time_period, settings.start_time, settings.end_time)
+        groups.setdefault(key, []).append(i)
+    return groups
+
+
+def merge_portfolios(portfolios: List[OptimisationSettings]) -> OptimisationSettings:
+    """Settings covering the union of the symbols of portfolios sharing a period and window."""
+    items = {}
+    for settings in portfolios:
+        for item in settings.portfolio:
+            items.setdefault(item["symbol"], item)
+    return portfolios[0].model_copy(
+        update={"portfolio": list(items.values()), "alignment": "union", "rebalance": None}
+    )
+
+
+def to_ndjson_line(content: Dict[str, Any]) -> bytes:
+    return orjson.dumps(jsonable_encoder(content), option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+
+async def stream_batch_optimisation(portfolios: List[OptimisationSettings]):
+    loop = asyncio.get_running_loop()
+    executor = get_optimisation_executor()
+    pending = {}
+
+    def finished(futures):
+        for future in futures:
+            i, settings, data, stock_stats = pending.pop(future)
+            try:
+                optimisation_results = future.result()
+            except Exception as e:
+                log.error(f"Batch optimisation of portfolio {i} failed: {e}")
+                yield to_ndjson_line({"index": i, "error": str(e)})
+                continue
+            if settings.rebalance is not None:
+                add_trades(optimisation_results, get_portfolio_holdings(settings))
+            response = build_optimisation_response(settings, data, optimisation_results, stock_stats)
+            yield to_ndjson_line({"index": i, "result": response})
+
+    for indices in group_portfolios(portfolios).values():
+        group_settings = merge_portfolios([portfolios[i] for i in indices])
+        try:
+            data = await load_optimisation_data(group_settings)
+            window_stats = read_symbol_statistics(group_settings)
+            # One pairwise complete covariance of the window, sliced for each portfolio
+            with span("covariance"):
+                cov_matrix = align_returns(
+                    data.pivot(index="trade_date", columns="symbol", values="change_percent")
+                ).covariance()
+        except Exception as e:
+            log.error(f"Loading batch optimisation data failed: {e}")
+            for i in indices:
+                yield to_ndjson_line({"index": i, "error": str(e)})
+            continue
+
+        for i in indices:
+            settings = portfolios[i]
+            # As when optimising alone, symbols without data in the window are left out
+            symbols = [item["symbol"] for item in settings.portfolio if item["symbol"] in cov_matrix.index]
+            if not symbols:
+                yield to_ndjson_line({"index": i, "error": "No data for any symbol in the window"})
+                continue
+            portfolio_data = data[data["symbol"].isin(symbols)]
+            portfolio_cov = None
+            if settings.alignment == "union":
+                portfolio_cov = cov_matrix.loc[symbols, symbols]
+            future = loop.run_in_executor(
+                executor,
+                get_optimiser(settings),
+                portfolio_data,
+                settings.time_period,
+                portfolio_cov,
+            )
+            # Stats of the portfolio's own data, so its geometric means are taken over its own dates
+            stock_stats = get_stock_stats(settings, portfolio_data, window_stats)
+            pending[future] = (i, settings, portfolio_data, stock_stats)
+
+        # Stream the portfolios already optimised while the next group loads
+        for line in finished([future for future in pending if future.done()]):
+            yield line
+
+    while pending:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for line in finished(done):
+            yield line
+
+
 @app.post("/currencies", response_model=Dict[str, Any])
 async def get_usd_conversion_rates(currencies: List[str]):
     """
@@ -402,94 +958,267 @@ def process_historical_data(data: pd.DataFrame) -> pd.DataFrame:
     )
 
 
-def insert_data_into_db(data: pd.DataFrame, time_period: str):
-    data.to_sql(
-        f"{time_period}_historical_tick_data",
-        con=engine,
-        if_exists="append",
-        index=False,
-        method=insert_on_conflict_nothing_indices(["symbol", "trade_date"]),
+def insert_data_into_db(
+    data: pd.DataFrame,
+    time_period: str,
+    symbols: Optional[List[str]] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+):
+    """
+    Insert tick data and update the statistics and coverage metadata in one transaction.
+    :param data: Tick data in the layout of the historical tick data tables.
+    :param time_period: The period of the historical tick data table.
+    :param symbols: Optional symbols fetched from start_time to end_time, recorded as
+        covered over that window even where it has no bars.
+    """
+    window = None
+    if symbols is not None:
+        window = covered_window(time_period, start_time, end_time, pd.Timestamp.now(tz="UTC"))
+    with get_engine().begin() as connection:
+        if not data.empty:
+            data.to_sql(
+                f"{time_period}_historical_tick_data",
+                con=connection,
+                if_exists="append",
+                index=False,
+                method=insert_on_conflict_nothing_indices(["symbol", "trade_date"]),
+            )
+        update_symbol_statistics(connection, data, time_period)
+        update_symbol_coverage(connection, get_coverage_updates(data, symbols, window), time_period)
+    invalidate_tick_data(CACHE_DIR, data["symbol"].unique(), time_period)
+    invalidate_cross_product_caches(CACHE_DIR, data["symbol"].unique(), time_period)
+    invalidate_corner_portfolios(CACHE_DIR, data["symbol"].unique(), time_period)
+
+
+def update_symbol_coverage(connection, updates: List[Dict[str, Any]], time_period: str):
+    """
+    Extend the coverage metadata rows of the inserted symbols.
+    :param connection: Open connection within the insert transaction.
+    :param updates: Rows from get_coverage_updates.
+    :param time_period: The period of the historical tick data table.
+    """
+    if not updates:
+        return
+    sql_query = text(
+        f"""
+        INSERT INTO {time_period}_symbol_coverage AS c
+            (symbol, first_trade_date, last_trade_date, covered)
+        VALUES (:symbol, :first_trade_date, :last_trade_date, CAST(:covered AS DATEMULTIRANGE))
+        ON CONFLICT (symbol) DO UPDATE SET
+            first_trade_date = LEAST(c.first_trade_date, EXCLUDED.first_trade_date),
+            last_trade_date = GREATEST(c.last_trade_date, EXCLUDED.last_trade_date),
+            covered = c.covered + EXCLUDED.covered
+        """
     )
+    connection.execute(sql_query, updates)
 
 
-def read_data_from_db(settings: OptimisationSettings) -> pd.DataFrame:
-    symbols = [s["symbol"] for s in settings.portfolio]
+def update_symbol_statistics(connection, data: pd.DataFrame, time_period: str):
+    """
+    Recompute the cumulative statistics rows for the inserted symbols from the
+    earliest inserted trade_date onwards, continuing from the prefix row before it.
+    :param connection: Open connection within the insert transaction.
+    :param data: The rows that were inserted.
+    :param time_period: The period of the historical tick data table.
+    """
+    if data.empty:
+        return
     sql_query = text(
-        f"SELECT * FROM {settings.time_period}_historical_tick_data WHERE symbol IN :symbols AND trade_date BETWEEN :start_time AND :end_time"
+        f"""
+        WITH baseline AS (
+            SELECT DISTINCT ON (symbol)
+                symbol, row_count, sum_return, sum_sq_return, sum_log_return
+            FROM {time_period}_symbol_statistics
+            WHERE symbol IN :symbols AND trade_date < :from_date
+            ORDER BY symbol, trade_date DESC
+        ),
+        increments AS (
+            SELECT
+                symbol,
+                trade_date,
+                COUNT(change_percent) OVER w AS row_count,
+                COALESCE(SUM(change_percent) OVER w, 0) AS sum_return,
+                COALESCE(SUM(change_percent ^ 2) OVER w, 0) AS sum_sq_return,
+                COALESCE(SUM(LN(1 + change_percent / 100)) OVER w, 0) AS sum_log_return
+            FROM {time_period}_historical_tick_data
+            WHERE symbol IN :symbols AND trade_date >= :from_date
+            WINDOW w AS (PARTITION BY symbol ORDER BY trade_date)
+        )
+        INSERT INTO {time_period}_symbol_statistics
+            (symbol, trade_date, row_count, sum_return, sum_sq_return, sum_log_return)
+        SELECT
+            i.symbol,
+            i.trade_date,
+            i.row_count + COALESCE(b.row_count, 0),
+            i.sum_return + COALESCE(b.sum_return, 0),
+            i.sum_sq_return + COALESCE(b.sum_sq_return, 0),
+            i.sum_log_return + COALESCE(b.sum_log_return, 0)
+        FROM increments i
+        LEFT JOIN baseline b ON b.symbol = i.symbol
+        ON CONFLICT (symbol, trade_date) DO UPDATE SET
+            row_count = EXCLUDED.row_count,
+            sum_return = EXCLUDED.sum_return,
+            sum_sq_return = EXCLUDED.sum_sq_return,
+            sum_log_return = EXCLUDED.sum_log_return
+    """
     )
-    data = pd.read_sql_query(
+    connection.execute(
         sql_query,
-        con=engine,
-        params={
-            "symbols": tuple(symbols),
-            "start_time": settings.start_time,
-            "end_time": settings.end_time,
+        {
+            "symbols": tuple(data["symbol"].unique()),
+            "from_date": pd.to_datetime(data["trade_date"]).min(),
         },
     )
+
+
+def read_symbol_statistics(settings: OptimisationSettings) -> pd.DataFrame:
+    """
+    Read the window totals for each symbol from the prefix statistics table.
+    Only two prefix rows per symbol are read, regardless of the window length.
+    :param settings: OptimisationSettings containing the symbols, period and window.
+    :return: DataFrame indexed by symbol with the window totals.
+    """
+    symbols = [s["symbol"] for s in settings.portfolio]
+    prefix_query = """
+        SELECT s.symbol, p.row_count, p.sum_return, p.sum_sq_return, p.sum_log_return
+        FROM unnest(CAST(:symbols AS TEXT[])) AS s(symbol)
+        JOIN LATERAL (
+            SELECT row_count, sum_return, sum_sq_return, sum_log_return
+            FROM {table}
+            WHERE symbol = s.symbol AND trade_date {operator} :bound
+            ORDER BY trade_date DESC
+            LIMIT 1
+        ) p ON TRUE
+    """
+    table = f"{settings.time_period}_symbol_statistics"
+    end_prefix = pd.read_sql_query(
+        text(prefix_query.format(table=table, operator="<=")),
+        con=get_engine(),
+        params={"symbols": symbols, "bound": settings.end_time},
+        index_col="symbol",
+    )
+    start_prefix = pd.read_sql_query(
+        text(prefix_query.format(table=table, operator="<")),
+        con=get_engine(),
+        params={"symbols": symbols, "bound": settings.start_time},
+        index_col="symbol",
+    )
+    return get_window_statistics(end_prefix, start_prefix)
+
+
+def read_data_from_db(settings: OptimisationSettings) -> pd.DataFrame:
+    symbols = [s["symbol"] for s in settings.portfolio]
+    return read_tick_data(
+        CACHE_DIR,
+        symbols,
+        settings.time_period,
+        lambda missing: read_history_from_db(missing, settings.time_period),
+        settings.start_time,
+        settings.end_time,
+    )
+
+
+def read_history_from_db(symbols: List[str], time_period: str) -> pd.DataFrame:
+    """Read the full history of the symbols, used to fill the local tick data cache."""
+    sql_query = text(
+        f"SELECT * FROM {time_period}_historical_tick_data WHERE symbol IN :symbols"
+    )
+    data = pd.read_sql_query(sql_query, con=get_engine(), params={"symbols": tuple(symbols)})
     data["trade_date"] = pd.to_datetime(data["trade_date"])
     return data
 
 
-def get_missing_dates(
-    data: pd.DataFrame,
-    exchange: str,
+def read_returns_history_from_db(
+    symbols: List[str],
     time_period: str,
-    start_time: str,
-    end_time: str,
-) -> List[str]:
-    """Checks for missing dates in the database"""
-    data_dates = pd.to_datetime(data["trade_date"]).dt.date.to_list()
-    if time_period == "daily":
-        holidays = get_exchange_holidays(exchange, start_time, end_time)
-        all_dates = (
-            pd.date_range(start=start_time, end=end_time, freq="B")
-            .to_pydatetime()
-            .tolist()
-        )
-        all_dates = [d.date() for d in all_dates if d.date() not in holidays]
-    elif time_period == "monthly":
-        # Ignore holidays for monthly data
-        all_dates = (
-            pd.date_range(start=start_time, end=end_time, freq="ME")
-            .to_pydatetime()
-            .tolist()
-        )
-        all_dates = [d.date() for d in all_dates if d.date()]
-    missing_dates = [date for date in all_dates if date not in data_dates]
-    return missing_dates
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+) -> pd.DataFrame:
+    """Read the return history of the symbols, pivoted with a column per symbol, all of it if no window is given."""
+    data = read_tick_data(
+        CACHE_DIR,
+        symbols,
+        time_period,
+        lambda missing: read_history_from_db(missing, time_period),
+        start_time,
+        end_time,
+    )
+    return data.pivot(index="trade_date", columns="symbol", values="change_percent")
 
 
-def get_exchange_holidays(exchange: str, start_time: str, end_time: str) -> List[str]:
+def watch_symbols(settings: OptimisationSettings):
+    """Record the request so the prefetch scheduler keeps the symbols up to date."""
+    rows = [
+        {
+            "symbol": item["symbol"],
+            "exchange": item["exchange"],
+            "time_period": settings.time_period,
+        }
+        for item in settings.portfolio
+    ]
     sql_query = text(
         """
-        SELECT holiday_date FROM exchange_holidays
-        WHERE exchange = :exchange AND holiday_date BETWEEN :start_time AND :end_time
-    """
+        INSERT INTO watched_symbols (symbol, exchange, time_period, last_requested)
+        VALUES (:symbol, :exchange, :time_period, now())
+        ON CONFLICT (symbol, time_period) DO UPDATE
+        SET exchange = EXCLUDED.exchange, last_requested = EXCLUDED.last_requested
+        """
     )
-    holidays = pd.read_sql_query(
-        sql_query,
-        con=engine,
-        params={"exchange": exchange, "start_time": start_time, "end_time": end_time},
+    # Watching is best effort and must not fail the request
+    try:
+        with get_engine().begin() as connection:
+            connection.execute(sql_query, rows)
+    except Exception as e:
+        log.warning(f"Could not record watched symbols: {e}")
+
+
+def read_watched_symbols(max_age_days: int = PREFETCH_WATCH_DAYS) -> Dict[str, List[str]]:
+    """Symbols requested within the last max_age_days, grouped by time period."""
+    sql_query = text(
+        """
+        SELECT time_period, symbol FROM watched_symbols
+        WHERE last_requested >= now() - make_interval(days => :max_age_days)
+        """
+    )
+    watched = pd.read_sql_query(
+        sql_query, con=get_engine(), params={"max_age_days": max_age_days}
     )
-    holidays["holiday_date"] = pd.to_datetime(holidays["holiday_date"])
-    return holidays["holiday_date"].dt.date.to_list()
+    return watched.groupby("time_period")["symbol"].apply(list).to_dict()
 
 
-def set_exchange_holidays(exchange: str, holidays: List[str]):
-    """
-    Set exchange holidays in the database.
-    :param exchange: The exchange for which to set holidays.
-    :param start_time: Start date for the holidays.
-    :param end_time: End date for the holidays.
-    :param holidays: List of holiday dates in 'YYYY-MM-DD' format.
-    """
-    df = pd.DataFrame({"exchange": exchange, "holiday_date": pd.to_datetime(holidays)})
-    df.to_sql(
-        "exchange_holidays",
-        con=engine,
-        if_exists="append",
-        index=False,
-        method=insert_on_conflict_nothing_indices(["exchange", "holiday_date"]),
+def read_stored_symbols(time_period: str) -> List[str]:
+    """Symbols with any stored history for the period, from the coverage metadata."""
+    sql_query = text(
+        f"""
+        SELECT symbol
+        FROM {time_period}_symbol_coverage
+        WHERE first_trade_date IS NOT NULL
+        """
+    )
+    return pd.read_sql_query(sql_query, con=get_engine())["symbol"].tolist()
+
+
+def read_latest_trade_dates(symbols: List[str], time_period: str) -> Dict[str, pd.Timestamp]:
+    """Date of the last stored bar of each symbol which has any history, from the coverage metadata."""
+    sql_query = text(
+        f"""
+        SELECT symbol, last_trade_date AS trade_date
+        FROM {time_period}_symbol_coverage
+        WHERE symbol IN :symbols AND last_trade_date IS NOT NULL
+        """
+    )
+    latest = pd.read_sql_query(
+        sql_query, con=get_engine(), params={"symbols": tuple(symbols)}
+    )
+    return dict(zip(latest["symbol"], pd.to_datetime(latest["trade_date"], utc=True)))
+
+
+def create_prefetch_scheduler() -> PrefetchScheduler:
+    return PrefetchScheduler(
+        read_watched_symbols,
+        read_latest_trade_dates,
+        upstream.fetch,
     )
 
 
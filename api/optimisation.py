@@ -1,31 +1,83 @@
 import json
-import cvxpy as cp
 import pandas as pd
 import numpy as np
 
+from alignment import align_returns
 from analysis import (
     adjust_averages_for_period,
     adjust_std_dev_for_period,
-    get_averages,
-    get_covariance_matrix,
-    get_porfolio_geometric_mean,
-    get_portfolio_drawdown_percentage
+    calculate_drawdown_matrix,
+    get_aligned_portfolio_geometric_mean,
 )
+from downsampling import select_min_max
+from tracing import span
 
 
-def optimise_portfolio(data, time_period):
+def solve(prob, solve_options):
+    """
+    Solve with the given options, falling back to the interior point Clarabel solver if
+    they fail, as OSQP can fail to converge with tight turnover constraints.
+    """
+    import cvxpy as cp
+
+    if not solve_options:
+        prob.solve()
+        return
+    try:
+        prob.solve(**solve_options)
+        if prob.status == cp.OPTIMAL:
+            return
+    except cp.error.SolverError:
+        pass
+    prob.solve(solver=cp.CLARABEL)
+
+
+def optimise_portfolio(
+    data,
+    time_period,
+    cov_matrix=None,
+    alignment="union",
+    current_weights=None,
+    turnover_penalty=0.0,
+    max_turnover=None,
+    min_weights=None,
+    max_weights=None,
+    max_points=None,
+):
     """Runs through a range of gamma values to compute the efficiency frontier of the portfolio.
     https://www.investopedia.com/terms/e/efficientfrontier.asp
     :param data: DataFrame containing historical data with columns 'trade_date', 'symbol', and 'change_percent'.
     :param time_period: The time period for which to calculate the averages and standard deviations.
-    :return: List of optimal portfolios with their weights, standard deviation, arithmetic mean, and geometric mean.
+    :param cov_matrix: Optional precomputed pairwise complete covariance matrix of the returns in data,
+        computed from the aligned returns if not given. Only used with the union alignment.
+    :param alignment: Calendar alignment policy for symbols trading on different dates, see alignment.py.
+    :param current_weights: Optional Series of the current weights by symbol, to rebalance from.
+    :param turnover_penalty: Percentage points of period return deducted per unit of turnover,
+        the sum of absolute weight changes from current_weights.
+    :param max_turnover: Optional upper bound on the turnover from current_weights.
+    :param min_weights: Optional Series of the lowest weight of each symbol, 0 if missing.
+    :param max_weights: Optional Series of the highest weight of each symbol, 1 if missing.
+    :param max_points: Optional most points of each portfolio's drawdown series to return,
+        keeping the bucket minima and maxima and the max drawdown's peak, bottom and recovery.
+    :return: List of optimal portfolios with their weights, standard deviation, arithmetic mean, and geometric mean,
+        and their turnover when rebalancing.
+    :raises ValueError: If no weights satisfy the constraints, e.g. an unreachable max_turnover.
     """
+    import cvxpy as cp
+
     n = len(data["symbol"].unique())
 
     SAMPLES = 200
 
-    avg = get_averages(data)
-    cov_matrix = get_covariance_matrix(data)
+    # Align once so the frontier loop works on a dense array rather than re-pivoting
+    aligned = align_returns(
+        data.pivot(index="trade_date", columns="symbol", values="change_percent"), alignment
+    )
+    avg = aligned.mean()
+    if cov_matrix is None or alignment != "union":
+        cov_matrix = aligned.covariance()
+    else:
+        cov_matrix = cov_matrix.loc[avg.index, avg.index]
 
     avg_return = avg.values.reshape(-1, 1)  # Average returns as a column vector
     Cov = cov_matrix.values  # Covariance matrix
@@ -37,31 +89,43 @@ def optimise_portfolio(data, time_period):
     gamma_vals = np.logspace(3, -3, num=SAMPLES)
     ret = avg_return.T @ w
     risk = cp.quad_form(w, Cov)
+    objective = ret - gamma * risk
     constraints = [cp.sum(w) == 1, w >= 0]
-    prob = cp.Problem(cp.Maximize(ret - gamma * risk), constraints)
+    if min_weights is not None:
+        constraints.append(w >= min_weights.reindex(avg.index).fillna(0.0).to_numpy())
+    if max_weights is not None:
+        constraints.append(w <= max_weights.reindex(avg.index).fillna(1.0).to_numpy())
+
+    solve_options = {}
+    turnover = None
+    if current_weights is not None:
+        turnover = cp.norm1(w - current_weights.reindex(avg.index).fillna(0.0).to_numpy())
+        if turnover_penalty:
+            objective = objective - turnover_penalty * turnover
+        if max_turnover is not None:
+            constraints.append(turnover <= max_turnover)
+        # OSQP keeps its factorisation and warm starts each point of the sweep from the
+        # solution at the previous gamma, as gamma falls from 1e3 to 1e-3
+        solve_options = {"solver": cp.OSQP, "warm_start": True}
+
+    prob = cp.Problem(cp.Maximize(objective), constraints)
     for i in range(SAMPLES):
         gamma.value = gamma_vals[i]
-        prob.solve()
-        weights = pd.Series(w.value, index=avg.index)
-        geometric_mean = get_porfolio_geometric_mean(data, weights, time_period, "yearly")
-        arithmentic_mean = adjust_averages_for_period(ret.value[0], time_period, "yearly") #arithmetic mean
-        std_annualised = adjust_std_dev_for_period(np.sqrt(risk.value), time_period, "yearly")
-        drawdown = get_portfolio_drawdown_percentage(data, weights)
+        with span("solve"):
+            solve(prob, solve_options)
+        # Only gamma changes between solves, so if one has no solution none do
+        if w.value is None or prob.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+            raise ValueError(f"Infeasible constraints: no weights satisfy them ({prob.status})")
         optimal_portfolios.append(
             {
                 "name": f"Optimised {gamma_vals[i]}",
-                "std_dev": std_annualised,
-                "arithmetic_mean": arithmentic_mean,
-                "geometric_mean": geometric_mean,
-                "weights": json.loads(
-                    pd.DataFrame(
-                        {"symbol": avg.index, "value_proportion": w.value}
-                    ).to_json(orient="records")
-                ),
-                "drawdown": json.loads(drawdown["drawdown"].reset_index(name="value").to_json(orient="records")),
-                "max_drawdown": drawdown["max_drawdown"]
+                "std_dev": adjust_std_dev_for_period(np.sqrt(risk.value), time_period, "yearly"),
+                "arithmetic_mean": adjust_averages_for_period(ret.value[0], time_period, "yearly"),
+                "weights": w.value.copy(),
             }
         )
+        if turnover is not None:
+            optimal_portfolios[-1]["turnover"] = float(turnover.value)
 
     # Remove portfolios with duplicate std_dev and return
     seen = set()
@@ -77,4 +141,41 @@ def optimise_portfolio(data, time_period):
 
     optimal_portfolios = filtered_portfolios
 
+    # The statistics of every frontier point at once, from a (symbols x portfolios) weights matrix
+    weights = np.column_stack([p["weights"] for p in optimal_portfolios])
+    with span("portfolio_stats"):
+        geometric_means = get_aligned_portfolio_geometric_mean(aligned, weights, time_period, "yearly")
+    with span("drawdown"):
+        drawdowns = calculate_drawdown_matrix(aligned.portfolio_returns(weights))
+        points = np.ones_like(drawdowns["drawdown"], dtype=bool)
+        if max_points is not None:
+            # Keep the max drawdown's peak, bottom and recovery exactly
+            points = select_min_max(
+                drawdowns["drawdown"],
+                max_points,
+                keep=np.stack([drawdowns["peak"], drawdowns["bottom"], drawdowns["recovery"]]),
+            )
+
+    dates = aligned.dates
+    date_name = dates.name or "index"
+    dates_json = json.loads(pd.Series(dates).to_json(orient="values"))
+    for j, p in enumerate(optimal_portfolios):
+        recovery = drawdowns["recovery"][j]
+        p["geometric_mean"] = geometric_means[j]
+        p["weights"] = json.loads(
+            pd.DataFrame(
+                {"symbol": avg.index, "value_proportion": p["weights"]}
+            ).to_json(orient="records")
+        )
+        p["drawdown"] = [
+            {date_name: dates_json[i], "value": float(drawdowns["drawdown"][i, j])}
+            for i in np.flatnonzero(points[:, j])
+        ]
+        p["max_drawdown"] = {
+            "percent": drawdowns["max_drawdown"][j],
+            "start_date": dates[drawdowns["peak"][j]],
+            "end_date": dates[recovery] if recovery >= 0 else None,
+            "bottom_date": dates[drawdowns["bottom"][j]],
+        }
+
     return optimal_portfolios
@@ -0,0 +1,121 @@
+import asyncio
+from logging import getLogger
+
+import pandas as pd
+
+from utils import PREFETCH_BATCH_SIZE, PREFETCH_INTERVAL
+
+log = getLogger(__name__)
+
+
+def last_period_close(time_period, now):
+    """
+    Date of the most recent completed bar of the period.
+    :param time_period: "daily" or "monthly".
+    :param now: Current time as a pandas Timestamp.
+    :return: Normalised Timestamp of the last closed day or month end.
+    """
+    today = pd.Timestamp(now).tz_localize(None).normalize()
+    if time_period == "monthly":
+        return (today.to_period("M") - 1).end_time.normalize()
+    if time_period == "daily":
+        return today - pd.offsets.BDay(1)
+    raise ValueError(f"Unsupported time period: {time_period}")
+
+
+def is_stale(latest, close, time_period):
+    """Whether a symbol whose last stored bar is at latest is missing the bar closing at close."""
+    latest = pd.Timestamp(latest).tz_localize(None)
+    if time_period == "monthly":
+        return latest.to_period("M") < close.to_period("M")
+    return latest.normalize() < close
+
+
+class PrefetchScheduler:
+    """
+    Refreshes the history of recently requested symbols after each period close,
+    so the first request after a month end does not wait on the upstream API.
+
+    The database and upstream access are passed in so the scheduler can run inside
+    the API process or as a separate worker, and be tested with a fake upstream.
+    :param read_watched: Returns a dict of time period to recently requested symbols.
+    :param read_latest: Returns a dict of symbol to the date of its last stored bar, given symbols and period.
+    :param fetch: Coroutine fetching and storing tick data given symbols, period, start and
+        end dates, normally UpstreamCoordinator.fetch so calls are shared with requests and rate limited.
+    """
+
+    def __init__(
+        self,
+        read_watched,
+        read_latest,
+        fetch,
+        batch_size=PREFETCH_BATCH_SIZE,
+        now=lambda: pd.Timestamp.now(tz="UTC"),
+        sleep=asyncio.sleep,
+    ):
+        self.read_watched = read_watched
+        self.read_latest = read_latest
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.now = now
+        self.sleep = sleep
+        # Period close last attempted per (symbol, period), so symbols with no new
+        # bar upstream (e.g. delisted or on holiday) are not fetched every interval
+        self._attempted = {}
+
+    def plan(self, symbols, latest, time_period, close):
+        """
+        Group the stale symbols into batches sharing the same date range.
+        Symbols without any stored history are left to the request path.
+        :return: List of (symbols, start date, end date) tuples.
+        """
+        by_start = {}
+        for symbol in symbols:
+            if symbol not in latest or self._attempted.get((symbol, time_period)) == close:
+                continue
+            if is_stale(latest[symbol], close, time_period):
+                start = pd.Timestamp(latest[symbol]).tz_localize(None).normalize() + pd.Timedelta(days=1)
+                by_start.setdefault(start, []).append(symbol)
+
+        batches = []
+        for start, stale in sorted(by_start.items()):
+            for i in range(0, len(stale), self.batch_size):
+                batches.append(
+                    (stale[i:i + self.batch_size], start.strftime("%Y-%m-%d"), close.strftime("%Y-%m-%d"))
+                )
+        return batches
+
+    async def run_once(self):
+        """
+        Fetch and store the new bars of every watched symbol.
+        :return: Number of rows fetched.
+        """
+        watched = await asyncio.to_thread(self.read_watched)
+        fetched = 0
+        for time_period, symbols in watched.items():
+            close = last_period_close(time_period, self.now())
+            latest = await asyncio.to_thread(self.read_latest, symbols, time_period)
+            for batch, start, end in self.plan(symbols, latest, time_period, close):
+                for symbol in batch:
+                    self._attempted[(symbol, time_period)] = close
+                try:
+                    fetched += len(await self.fetch(batch, time_period, start, end))
+                except Exception as e:
+                    log.error(f"Prefetch of {len(batch)} {time_period} symbols from {start} failed: {e}")
+        if fetched:
+            log.info(f"Prefetched {fetched} rows of historical data")
+        return fetched
+
+    async def run_forever(self, interval=PREFETCH_INTERVAL):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                log.error(f"Prefetch run failed: {e}")
+            await self.sleep(interval)
+
+
+if __name__ == "__main__":
+    from main import create_prefetch_scheduler
+
+    asyncio.run(create_prefetch_scheduler().run_forever())
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+
+def get_holdings(portfolio, currency_rates=None, lot_sizes=None):
+    """
+    Current holdings of the portfolio items sent by the frontend.
+    Values are converted to a common currency with currency_rates, and the current
+    weights come from those values, or from the items' yourAllocation if no prices are known.
+    :param portfolio: List of portfolio items with 'symbol', 'currentShares', 'sharePrice' and 'currency'.
+    :param currency_rates: Dict of currency to the value of one unit in the common currency, 1 if missing.
+    :param lot_sizes: Dict of symbol to the number of shares traded at once, 1 if missing.
+    :return: DataFrame indexed by symbol with columns 'shares', 'price', 'value', 'weight' and 'lot_size'.
+    """
+    currency_rates = currency_rates or {}
+    lot_sizes = lot_sizes or {}
+    holdings = pd.DataFrame(
+        {
+            "shares": [float(item.get("currentShares") or 0) for item in portfolio],
+            "price": [
+                float(item["sharePrice"]) * currency_rates.get(item.get("currency"), 1.0)
+                if item.get("sharePrice") else np.nan
+                for item in portfolio
+            ],
+            "allocation": [float(item.get("yourAllocation") or 0) for item in portfolio],
+            "lot_size": [float(lot_sizes.get(item["symbol"], 1)) for item in portfolio],
+        },
+        index=pd.Index([item["symbol"] for item in portfolio], name="symbol"),
+    )
+    holdings["value"] = (holdings["shares"] * holdings["price"]).fillna(0.0)
+    total = holdings["value"].sum()
+    if total > 0:
+        holdings["weight"] = holdings["value"] / total
+    else:
+        holdings["weight"] = holdings["allocation"] / 100
+    return holdings.drop(columns="allocation")
+
+
+def round_to_lots(target_weights, holdings):
+    """
+    Round target weights to whole lots of shares, without spending more than the
+    portfolio's current value. Each position is rounded to the nearest lot, then lots
+    are removed from the positions rounded up the most until the total fits.
+    Symbols without a price are left unrounded.
+    :param target_weights: Series of target weights indexed by symbol.
+    :param holdings: DataFrame from get_holdings.
+    :return: DataFrame indexed by symbol of the trades, and the cash left over.
+    """
+    holdings = holdings.reindex(target_weights.index)
+    total = holdings["value"].sum()
+    lot_value = (holdings["price"] * holdings["lot_size"]).to_numpy()
+    ideal_lots = target_weights.to_numpy() * total / lot_value
+    lots = np.floor(ideal_lots + 0.5)
+
+    priced = ~np.isnan(lot_value)
+    spent = np.nansum(lots * lot_value)
+    while spent > total + 1e-9 and np.any(lots[priced] > 0):
+        overshoot = np.where(priced & (lots > 0), lots - ideal_lots, -np.inf)
+        i = np.argmax(overshoot)
+        lots[i] -= 1
+        spent -= lot_value[i]
+
+    target_shares = lots * holdings["lot_size"].to_numpy()
+    target_values = target_shares * holdings["price"].to_numpy()
+    trades = pd.DataFrame(
+        {
+            "current_weight": holdings["weight"].fillna(0.0).to_numpy(),
+            "target_weight": np.where(priced, target_values / total if total > 0 else np.nan, target_weights),
+            "current_shares": holdings["shares"].fillna(0.0).to_numpy(),
+            "target_shares": target_shares,
+        },
+        index=target_weights.index,
+    )
+    trades["trade_shares"] = trades["target_shares"] - trades["current_shares"]
+    trades["trade_value"] = trades["trade_shares"] * holdings["price"]
+    return trades, total - spent
+
+
+def add_trades(optimisation_results, holdings):
+    """
+    Add the lot rounded trades from the current holdings to each optimised portfolio.
+    :param optimisation_results: List of optimised portfolios from optimise_portfolio.
+    :param holdings: DataFrame from get_holdings.
+    :return: The optimised portfolios, each with 'trades' and 'cash'.
+    """
+    for portfolio in optimisation_results:
+        target_weights = pd.Series(
+            {w["symbol"]: w["value_proportion"] for w in portfolio["weights"]}
+        )
+        trades, cash = round_to_lots(target_weights, holdings)
+        portfolio["trades"] = trades.rename_axis("symbol").reset_index().to_dict(orient="records")
+        portfolio["cash"] = cash
+    return optimisation_results
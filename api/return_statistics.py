@@ -0,0 +1,67 @@
+import numpy as np
+
+from analysis import adjust_averages_for_period, adjust_std_dev_for_period
+
+PREFIX_COLUMNS = ["row_count", "sum_return", "sum_sq_return", "sum_log_return"]
+
+
+def get_window_statistics(end_prefix, start_prefix=None):
+    """
+    Calculate the totals over a window as the difference of two prefix rows per symbol.
+    :param end_prefix: DataFrame indexed by symbol with the last prefix row on or before the window end.
+    :param start_prefix: DataFrame indexed by symbol with the last prefix row before the window start.
+    :return: DataFrame indexed by symbol with the window totals.
+    """
+    window = end_prefix[PREFIX_COLUMNS].astype(float)
+    if start_prefix is not None:
+        window = window.sub(
+            start_prefix[PREFIX_COLUMNS].astype(float).reindex(window.index).fillna(0.0)
+        )
+    return window
+
+
+def covers_returns(stats, df):
+    """
+    Check the window totals account for every return of the time series, which they
+    do not when prefix rows are missing for part of a symbol's history.
+    :param stats: DataFrame of window totals from get_window_statistics.
+    :param df: DataFrame of the window's historical data with columns 'symbol' and 'change_percent'.
+    :return: True if the totals of every symbol count the same returns as df.
+    """
+    counts = df.groupby("symbol")["change_percent"].count()
+    return bool(stats["row_count"].reindex(counts.index).eq(counts).all())
+
+
+def get_window_averages(stats, input_period=None, output_period=None):
+    """
+    Calculate the average returns for each symbol from window totals.
+    :param stats: DataFrame of window totals from get_window_statistics.
+    :return: Series with average returns for each symbol in percentage values e.g. (5.7%).
+    """
+    avg = stats["sum_return"] / stats["row_count"]
+    return adjust_averages_for_period(avg, input_period, output_period)
+
+
+def get_window_standard_deviation(stats, input_period=None, output_period=None):
+    """
+    Calculate the sample standard deviation of returns for each symbol from window totals.
+    :param stats: DataFrame of window totals from get_window_statistics.
+    :return: Series with standard deviations for each symbol in percentage values.
+    """
+    n = stats["row_count"]
+    variance = (stats["sum_sq_return"] - stats["sum_return"] ** 2 / n) / (n - 1)
+    std = np.sqrt(variance.clip(lower=0))
+    return adjust_std_dev_for_period(std, input_period, output_period)
+
+
+def get_window_geometric_mean(stats, date_count, input_period=None, output_period=None):
+    """
+    Calculate the geometric average returns for each symbol from window totals.
+    As in get_geometric_mean the root is taken over all dates of the portfolio,
+    with the dates a symbol has no return on counted as flat.
+    :param stats: DataFrame of window totals from get_window_statistics.
+    :param date_count: Number of dates with a return for any symbol in the window.
+    :return: Series with geometric average returns for each symbol in percentage values e.g. (5.7%).
+    """
+    geo_mean = np.expm1(stats["sum_log_return"] / date_count) * 100
+    return adjust_averages_for_period(geo_mean, input_period, output_period)
@@ -0,0 +1,114 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from alignment import align_returns
+from analysis import (
+    adjust_averages_for_period,
+    adjust_std_dev_for_period,
+    calculate_drawdown_matrix,
+    calculate_semivariances,
+)
+from utils import SCREEN_CHUNK_SIZE, SCREEN_WORKERS
+
+SCREEN_METRICS = ("arithmetic_mean", "geometric_mean", "std_dev", "semivariance", "max_drawdown")
+
+
+def get_block_statistics(returns, time_period, dtype="float64"):
+    """
+    Per-symbol statistics of a block of returns, vectorised over the symbols.
+    :param returns: DataFrame indexed by trade_date with a column of percentage returns per symbol.
+    :param time_period: The period of the returns e.g. 'monthly'.
+    :param dtype: Precision to hold the returns in, see alignment.RETURN_DTYPES.
+    :return: DataFrame indexed by symbol with the annualised means and standard deviation,
+        the period semivariance, the max drawdown percentage and the number of observations.
+    """
+    aligned = align_returns(returns.sort_index().dropna(axis=1, how="all"), "union", dtype)
+    values = np.where(aligned.mask, aligned.values, np.nan)
+    counts = aligned.mask.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.nanstd(values, axis=0, ddof=1, dtype=np.float64)
+    return pd.DataFrame(
+        {
+            "arithmetic_mean": adjust_averages_for_period(aligned.mean(), time_period, "yearly"),
+            "geometric_mean": adjust_averages_for_period(aligned.geometric_mean(), time_period, "yearly"),
+            "std_dev": adjust_std_dev_for_period(np.where(counts > 1, std, np.nan), time_period, "yearly"),
+            "semivariance": calculate_semivariances(values),
+            "max_drawdown": calculate_drawdown_matrix(values)["max_drawdown"],
+            "observations": counts,
+        },
+        index=aligned.symbols,
+    )
+
+
+def screen_chunks(
+    symbols,
+    load_returns,
+    time_period,
+    chunk_size=SCREEN_CHUNK_SIZE,
+    max_workers=SCREEN_WORKERS,
+    dtype="float64",
+):
+    """
+    Compute get_block_statistics over blocks of chunk_size symbols in a thread pool,
+    yielding each block's statistics as it completes. Each block's returns are loaded in
+    its worker and at most max_workers blocks are in flight, so memory is bounded by the
+    block size rather than the size of the universe. Threads suffice as the loads read
+    memory-mapped caches and the statistics are numpy reductions, which release the GIL.
+    :param symbols: List of symbols to screen.
+    :param load_returns: Callable taking a list of symbols and returning their pivoted returns.
+    :param time_period: The period of the returns e.g. 'monthly'.
+    :return: Generator of DataFrames from get_block_statistics.
+    """
+    chunks = iter([symbols[i : i + chunk_size] for i in range(0, len(symbols), chunk_size)])
+
+    def run(chunk):
+        returns = load_returns(chunk)
+        if returns.empty:
+            return pd.DataFrame(columns=[*SCREEN_METRICS, "observations"], dtype=float)
+        return get_block_statistics(returns, time_period, dtype)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(run, chunk) for _, chunk in zip(range(max_workers), chunks)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.add(executor.submit(run, chunk))
+                yield future.result()
+
+
+def screen(chunks, metric_filters=None, sort_by="geometric_mean", ascending=False, limit=100):
+    """
+    Filter streamed per-symbol statistics and keep the top limit symbols by sort_by,
+    holding no more than limit rows plus one block at a time.
+    :param chunks: Iterable of DataFrames of statistics indexed by symbol, from screen_chunks.
+    :param metric_filters: Dict of metric to a (min, max) pair of inclusive bounds, None for unbounded.
+    :param sort_by: Metric to rank the symbols by, ties broken by symbol.
+    :param ascending: Rank the lowest values first rather than the highest.
+    :param limit: Most symbols to return.
+    :return: Tuple of the DataFrame of the top symbols in rank order, the number of symbols
+        screened and the number passing the filters.
+    """
+    metric_filters = metric_filters or {}
+    top = None
+    screened = matched = 0
+    for stats in chunks:
+        screened += len(stats)
+        for metric, (low, high) in metric_filters.items():
+            if low is not None:
+                stats = stats[stats[metric] >= low]
+            if high is not None:
+                stats = stats[stats[metric] <= high]
+        matched += len(stats)
+        top = stats if top is None else pd.concat([top, stats])
+        top = (
+            top.rename_axis("symbol")
+            .sort_values([sort_by, "symbol"], ascending=[ascending, True], na_position="last")
+            .head(limit)
+        )
+    if top is None:
+        top = pd.DataFrame(columns=[*SCREEN_METRICS, "observations"], dtype=float).rename_axis("symbol")
+    return top, screened, matched
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from alignment import align_returns
+from analysis import get_porfolio_geometric_mean, get_portfolio_drawdown_percentage
+
+
+@pytest.fixture
+def returns_with_holidays():
+    """Optimisation test data with some dates missing for single symbols, as on exchange holidays"""
+    data = pd.read_csv("tests/data/optimisation_test_data.csv")
+    pivot = data.pivot(index="trade_date", columns="symbol", values="change_percent")
+    pivot.iloc[[3, 10, 11], 0] = np.nan
+    pivot.iloc[[10, 20], 1] = np.nan
+    return pivot
+
+
+class TestAlignment:
+    def test_union_matches_pandas(self, returns_with_holidays):
+        aligned = align_returns(returns_with_holidays, "union")
+
+        assert len(aligned) == len(returns_with_holidays)
+        assert aligned.mask.sum() == returns_with_holidays.notna().sum().sum()
+        pd.testing.assert_series_equal(aligned.mean(), returns_with_holidays.mean(), check_names=False)
+        pd.testing.assert_frame_equal(aligned.covariance(), returns_with_holidays.cov(), check_names=False)
+        pd.testing.assert_frame_equal(aligned.to_frame(), returns_with_holidays)
+
+    def test_union_portfolio_stats_treat_missing_as_flat(self, returns_with_holidays):
+        weights = pd.Series([0.5, 0.3, 0.2], index=returns_with_holidays.columns)
+        growth = (1 + returns_with_holidays / 100).fillna(1.0)
+        expected = ((growth * weights).sum(axis=1).prod() ** (1 / len(growth)) - 1) * 100
+
+        data = returns_with_holidays.stack().rename("change_percent").reset_index()
+        assert get_porfolio_geometric_mean(data, weights) == pytest.approx(expected)
+
+        drawdown = get_portfolio_drawdown_percentage(data, weights)["drawdown"]
+        assert len(drawdown) == len(returns_with_holidays)
+
+    def test_intersection_keeps_common_dates(self, returns_with_holidays):
+        aligned = align_returns(returns_with_holidays, "intersection")
+
+        expected = returns_with_holidays.dropna()
+        assert list(aligned.dates) == list(expected.index)
+        assert aligned.mask.all()
+        pd.testing.assert_frame_equal(aligned.covariance(), expected.cov(), check_names=False)
+
+    def test_compound_carries_returns_to_next_common_date(self):
+        pivot = pd.DataFrame(
+            {"A": [1.0, 10.0, 10.0, 5.0], "B": [2.0, np.nan, 4.0, np.nan]},
+            index=pd.Index(["d1", "d2", "d3", "d4"], name="trade_date"),
+        )
+        aligned = align_returns(pivot, "compound")
+
+        assert list(aligned.dates) == ["d1", "d3"]
+        np.testing.assert_allclose(aligned.values, [[1.0, 2.0], [21.0, 4.0]])
+
+    def test_compound_preserves_growth_between_common_dates(self, returns_with_holidays):
+        aligned = align_returns(returns_with_holidays, "compound")
+
+        growth = np.prod(1 + aligned.values / 100, axis=0)
+        expected = (1 + returns_with_holidays.loc[aligned.dates[0]:aligned.dates[-1]] / 100).prod()
+        np.testing.assert_allclose(growth, expected.to_numpy())
+
+    def test_unknown_policy(self, returns_with_holidays):
+        with pytest.raises(ValueError):
+            align_returns(returns_with_holidays, "forward_fill")
+
+
+class TestFloat32:
+    @pytest.fixture(scope="class")
+    def daily_panel(self):
+        """Ten years of synthetic daily returns with gaps, in percent"""
+        rng = np.random.default_rng(0)
+        returns = rng.normal(0.05, 2.0, (2520, 100))
+        returns[rng.random(returns.shape) < 0.05] = np.nan
+        return pd.DataFrame(returns, index=pd.bdate_range("2010-01-01", periods=2520))
+
+    @pytest.mark.parametrize("policy", ["union", "compound"])
+    def test_within_documented_bounds(self, daily_panel, policy):
+        exact = align_returns(daily_panel, policy)
+        single = align_returns(daily_panel, policy, dtype="float32")
+
+        assert single.values.dtype == np.float32
+        assert single.values.nbytes == exact.values.nbytes // 2
+        np.testing.assert_allclose(single.mean(), exact.mean(), rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(single.geometric_mean(), exact.geometric_mean(), rtol=1e-6, atol=1e-6)
+        max_variance = np.diag(exact.covariance()).max()
+        np.testing.assert_allclose(single.covariance(), exact.covariance(), rtol=0, atol=1e-5 * max_variance)
+
+    def test_geometric_mean_does_not_underflow(self):
+        # The product of 1 + r over 20,000 daily losses of 10% underflows
+        pivot = pd.DataFrame({"A": np.full(20000, -10.0)})
+        product_mean = (np.prod(1 + pivot["A"].to_numpy() / 100) ** (1 / 20000) - 1) * 100
+        assert product_mean != pytest.approx(-10.0)
+        assert align_returns(pivot).geometric_mean()["A"] == pytest.approx(-10.0)
+
+    def test_unsupported_dtype(self, daily_panel):
+        with pytest.raises(ValueError):
+            align_returns(daily_panel, dtype="float16")
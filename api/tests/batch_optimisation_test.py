@@ -0,0 +1,168 @@
+import orjson
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from optimisation import optimise_portfolio
+
+
+@pytest.fixture
+def history():
+    data = pd.read_csv("tests/data/optimisation_test_data.csv")
+    data["trade_date"] = pd.to_datetime(data["trade_date"])
+    data["close_price"] = 100.0
+    return data
+
+
+@pytest.fixture
+def late_listing_history(history):
+    """The optimisation test data with DELL listed from 2019"""
+    return history[(history["symbol"] != "DELL") | (history["trade_date"] >= "2019-01-01")]
+
+
+@pytest.fixture
+def client(history, monkeypatch, tmp_path):
+    """TestClient with the database reads served from the optimisation test data"""
+    loads = []
+
+    async def load_optimisation_data(settings):
+        symbols = [item["symbol"] for item in settings.portfolio]
+        loads.append(sorted(symbols))
+        return history[history["symbol"].isin(symbols)]
+
+    monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "load_optimisation_data", load_optimisation_data)
+    # No statistics materialised, so they are computed from the loaded history
+    monkeypatch.setattr(
+        main,
+        "read_symbol_statistics",
+        lambda settings: pd.DataFrame(columns=["row_count", "sum_return", "sum_sq_return", "sum_log_return"]),
+    )
+    return TestClient(main.app), loads
+
+
+def make_settings(symbols, start_time="2016-01-01", end_time="2025-12-31", **kwargs):
+    return {
+        "portfolio": [{"symbol": symbol, "exchange": "NMS"} for symbol in symbols],
+        "timePeriod": "monthly",
+        "startTime": start_time,
+        "endTime": end_time,
+        **kwargs,
+    }
+
+
+class TestBatchOptimisation:
+    def test_groups_share_one_load(self, client, history):
+        test_client, loads = client
+        portfolios = [
+            make_settings(["AAPL", "MSFT"]),
+            make_settings(["MSFT", "DELL", "AAPL"]),
+            make_settings(["AAPL", "DELL"], start_time="2020-01-01"),
+            make_settings(["DELL", "MSFT"], alignment="intersection"),
+        ]
+
+        response = test_client.post("/portfolio/optimise/batch", json={"portfolios": portfolios})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [orjson.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+        assert sorted(loads) == [["AAPL", "DELL"], ["AAPL", "DELL", "MSFT"]]
+
+        results = {line["index"]: line["result"] for line in lines}
+        assert set(results[0]["historicalData"]) == {"AAPL", "MSFT"}
+        assert set(results[0]["stockStats"]["corrMatrix"]) == {"AAPL", "MSFT"}
+
+        # The shared covariance slice gives the same frontier as optimising alone
+        alone = optimise_portfolio(history[history["symbol"].isin(["AAPL", "MSFT"])], "monthly")
+        batched = results[0]["optimisationResults"]
+        assert len(batched) == len(alone)
+        assert batched[0]["stdDev"] == pytest.approx(alone[0]["std_dev"])
+        assert batched[0]["weights"] == [
+            {"symbol": w["symbol"], "valueProportion": pytest.approx(w["value_proportion"], abs=1e-6)}
+            for w in alone[0]["weights"]
+        ]
+
+    def test_failures_are_reported_per_portfolio(self, client):
+        test_client, _ = client
+        portfolios = [make_settings(["AAPL", "MSFT"]), make_settings([])]
+
+        response = test_client.post("/portfolio/optimise/batch", json={"portfolios": portfolios})
+
+        lines = {line["index"]: line for line in map(orjson.loads, response.text.splitlines())}
+        assert "result" in lines[0]
+        assert "error" in lines[1]
+
+    def test_symbols_without_data_are_left_out(self, client):
+        test_client, _ = client
+        portfolios = [make_settings(["AAPL", "MSFT", "NODATA"]), make_settings(["NODATA"])]
+
+        response = test_client.post("/portfolio/optimise/batch", json={"portfolios": portfolios})
+
+        lines = {line["index"]: line for line in map(orjson.loads, response.text.splitlines())}
+        weights = lines[0]["result"]["optimisationResults"][0]["weights"]
+        assert [w["symbol"] for w in weights] == ["AAPL", "MSFT"]
+        assert lines[1]["error"] == "No data for any symbol in the window"
+
+
+class TestPortfolioGrouping:
+    def test_merge_keeps_first_item_per_symbol(self):
+        portfolios = [
+            main.OptimisationSettings(**make_settings(["AAPL", "MSFT"])),
+            main.OptimisationSettings(**make_settings(["MSFT", "DELL"], alignment="compound")),
+        ]
+        assert main.group_portfolios(portfolios) == {("monthly", "2016-01-01", "2025-12-31"): [0, 1]}
+
+        merged = main.merge_portfolios(portfolios)
+        assert [item["symbol"] for item in merged.portfolio] == ["AAPL", "MSFT", "DELL"]
+        assert merged.alignment == "union"
+
+
+class TestBatchMatchesSingle:
+    @pytest.fixture
+    def history(self, late_listing_history):
+        return late_listing_history
+
+    def test_batch_results_equal_single_results(self, client, monkeypatch):
+        test_client, _ = client
+        monkeypatch.setattr(main, "get_cached_covariance", lambda settings, data: None)
+        portfolios = [make_settings(["AAPL", "MSFT"]), make_settings(["DELL"])]
+
+        response = test_client.post("/portfolio/optimise/batch", json={"portfolios": portfolios})
+
+        lines = {line["index"]: line for line in map(orjson.loads, response.text.splitlines())}
+        for i, settings in enumerate(portfolios):
+            single = test_client.post("/portfolio/optimise", json=settings).json()
+            batched = lines[i]["result"]
+            for stat in ["stdDev", "arithmeticMean", "geometricMean"]:
+                assert batched["stockStats"][stat] == pytest.approx(single["stockStats"][stat])
+            for symbol, row in single["stockStats"]["corrMatrix"].items():
+                assert batched["stockStats"]["corrMatrix"][symbol] == pytest.approx(row)
+            assert len(batched["optimisationResults"]) == len(single["optimisationResults"])
+            for batched_point, single_point in zip(
+                batched["optimisationResults"], single["optimisationResults"]
+            ):
+                assert batched_point["stdDev"] == pytest.approx(single_point["stdDev"])
+                assert batched_point["geometricMean"] == pytest.approx(single_point["geometricMean"])
+
+
+class TestStockStats:
+    @pytest.fixture
+    def history(self, history):
+        """The optimisation test data with MSFT listed from 2019"""
+        return history[(history["symbol"] != "MSFT") | (history["trade_date"] >= "2019-01-01")]
+
+    @pytest.mark.parametrize("alignment", ["intersection", "compound"])
+    def test_stats_match_the_frontier_alignment(self, client, alignment):
+        test_client, _ = client
+        settings = make_settings(["AAPL", "MSFT", "DELL"], alignment=alignment)
+
+        stats = test_client.post("/portfolio/optimise", json=settings).json()["stockStats"]
+        frontier = test_client.post("/portfolio/frontier", json=settings).json()
+
+        # The highest return corner holds only the highest mean symbol
+        top = max(stats["arithmeticMean"], key=stats["arithmeticMean"].get)
+        corner = frontier["cornerPortfolios"][0]
+        assert corner["arithmeticMean"] == pytest.approx(stats["arithmeticMean"][top])
+        assert corner["stdDev"] == pytest.approx(stats["stdDev"][top])
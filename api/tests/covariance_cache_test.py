@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+import pandas as pd
+
+from pandas.testing import assert_frame_equal
+
+from covariance_cache import (
+    CrossProductCache,
+    cache_path,
+    get_cross_product_cache,
+    prefix_nbytes,
+    invalidate_cross_product_caches,
+)
+
+
+@pytest.fixture
+def returns():
+    """Fixture providing pivoted returns with dates missing for some symbols e.g. exchange holidays"""
+    data = pd.read_csv("tests/data/optimisation_test_data.csv")
+    data["trade_date"] = pd.to_datetime(data["trade_date"])
+    returns = data.pivot(index="trade_date", columns="symbol", values="change_percent")
+    returns.iloc[::7, 0] = np.nan
+    returns.iloc[::5, 1] = np.nan
+    return returns
+
+
+class TestCovarianceCache:
+    @pytest.mark.parametrize(
+        "start_time,end_time",
+        [
+            ("2016-01-01", "2025-06-01"),
+            ("2019-02-01", "2022-11-01"),
+            ("2024-03-15", "2024-12-31"),
+        ],
+    )
+    def test_window_covariance_matches_pandas(self, returns, start_time, end_time):
+        cache = CrossProductCache.from_returns(returns)
+        expected = returns.loc[start_time:end_time].cov()
+        assert_frame_equal(
+            cache.covariance(start_time, end_time), expected, check_names=False
+        )
+
+    def test_saved_cache_is_memory_mapped(self, returns, tmp_path):
+        path = str(tmp_path / "cache")
+        CrossProductCache.from_returns(returns).save(path)
+        cache = CrossProductCache.load(path)
+        assert isinstance(cache.prefix, np.memmap)
+        assert_frame_equal(
+            cache.covariance("2020-01-01", "2023-01-01"),
+            returns.loc["2020-01-01":"2023-01-01"].cov(),
+            check_names=False,
+        )
+
+    def test_cache_is_built_once_and_invalidated(self, returns, tmp_path):
+        loads = []
+
+        def load_returns():
+            loads.append(1)
+            return returns
+
+        symbols = list(returns.columns)
+        get_cross_product_cache(str(tmp_path), symbols, "monthly", load_returns)
+        get_cross_product_cache(str(tmp_path), symbols, "monthly", load_returns)
+        assert len(loads) == 1
+
+        invalidate_cross_product_caches(str(tmp_path), ["AAPL"], "daily")
+        assert (tmp_path / cache_path("", symbols, "monthly")).is_dir()
+
+        invalidate_cross_product_caches(str(tmp_path), ["AAPL"], "monthly")
+        get_cross_product_cache(str(tmp_path), symbols, "monthly", load_returns)
+        assert len(loads) == 2
+
+    def test_large_symbol_sets_are_not_cached(self, returns, tmp_path):
+        max_entry_bytes = prefix_nbytes(returns.shape[1], len(returns)) - 1
+
+        cache = get_cross_product_cache(
+            str(tmp_path), list(returns.columns), "monthly", lambda: returns, max_entry_bytes
+        )
+
+        assert cache is None
+        assert not (tmp_path / "covariance").exists()
+
+    def test_least_recently_used_caches_are_evicted(self, returns, tmp_path):
+        # Room for two caches, with their .npy headers
+        entry_bytes = prefix_nbytes(2, len(returns)) + 1024
+        pairs = [["AAPL", "DELL"], ["AAPL", "MSFT"], ["DELL", "MSFT"]]
+
+        for pair in pairs[:2]:
+            get_cross_product_cache(str(tmp_path), pair, "monthly", lambda: returns[pair])
+        os.utime(tmp_path / cache_path("", pairs[0], "monthly"), (0, 0))
+        os.utime(tmp_path / cache_path("", pairs[1], "monthly"), (1, 1))
+        # Reading the older cache makes it the most recently used
+        get_cross_product_cache(str(tmp_path), pairs[0], "monthly", None)
+        get_cross_product_cache(
+            str(tmp_path), pairs[2], "monthly", lambda: returns[pairs[2]], max_total_bytes=2 * entry_bytes
+        )
+
+        assert (tmp_path / cache_path("", pairs[0], "monthly")).is_dir()
+        assert not (tmp_path / cache_path("", pairs[1], "monthly")).exists()
+        assert (tmp_path / cache_path("", pairs[2], "monthly")).is_dir()
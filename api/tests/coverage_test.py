@@ -0,0 +1,143 @@
+import asyncio
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import main
+import utils
+from coverage import covered_window, get_coverage_updates, group_uncovered, to_multirange
+from tests.database import run_scripts, scratch_database
+
+
+NOW = pd.Timestamp("2025-06-18 12:00", tz="UTC")
+
+
+class TestCoveredWindow:
+    def test_ends_at_the_last_period_close(self):
+        assert covered_window("monthly", "2020-01-01", "2025-12-31", NOW) == (
+            date(2020, 1, 1),
+            date(2025, 5, 31),
+        )
+        assert covered_window("daily", "2025-06-01", "2025-06-30", NOW) == (
+            date(2025, 6, 1),
+            date(2025, 6, 17),
+        )
+
+    def test_empty_after_the_last_close(self):
+        assert covered_window("monthly", "2025-06-01", "2025-06-30", NOW) is None
+
+
+class TestCoverageUpdates:
+    def test_fetched_window_covers_symbols_without_bars(self):
+        data = pd.DataFrame(
+            {
+                "symbol": ["AAPL", "AAPL", "MSFT"],
+                "trade_date": ["2020-02-01", "2020-03-01", "2020-02-01"],
+            }
+        )
+
+        updates = get_coverage_updates(
+            data, ["AAPL", "MSFT", "NEW"], (date(2020, 1, 1), date(2020, 3, 31))
+        )
+
+        by_symbol = {update["symbol"]: update for update in updates}
+        assert by_symbol["AAPL"]["first_trade_date"] == pd.Timestamp("2020-02-01", tz="UTC")
+        assert by_symbol["AAPL"]["last_trade_date"] == pd.Timestamp("2020-03-01", tz="UTC")
+        assert by_symbol["AAPL"]["covered"] == "{[2020-01-01,2020-03-31],[2020-02-01,2020-03-01]}"
+        assert by_symbol["NEW"]["first_trade_date"] is None
+        assert by_symbol["NEW"]["covered"] == "{[2020-01-01,2020-03-31]}"
+
+    def test_inserts_without_a_window_cover_their_own_span(self):
+        data = pd.DataFrame({"symbol": ["AAPL", "AAPL"], "trade_date": ["2020-02-01", "2020-05-01"]})
+
+        (update,) = get_coverage_updates(data)
+
+        assert update["covered"] == "{[2020-02-01,2020-05-01]}"
+
+    def test_empty_multirange(self):
+        assert to_multirange([None]) == "{}"
+
+
+class TestIncrementalLoad:
+    def test_only_uncovered_windows_are_fetched(self, monkeypatch):
+        fetches, reads = [], []
+        uncovered = {
+            "AAPL": (date(2025, 1, 1), date(2025, 5, 31)),
+            "MSFT": (date(2025, 1, 1), date(2025, 5, 31)),
+            "DELL": (date(2016, 1, 1), date(2025, 5, 31)),
+        }
+
+        async def get_data_from_toolkit(settings):
+            fetches.append(
+                (sorted(item["symbol"] for item in settings.portfolio), settings.start_time, settings.end_time)
+            )
+
+        monkeypatch.setattr(main, "read_uncovered_windows", lambda settings: uncovered)
+        monkeypatch.setattr(main, "get_data_from_toolkit", get_data_from_toolkit)
+        monkeypatch.setattr(main, "read_data_from_db", lambda settings: reads.append(settings) or pd.DataFrame())
+        monkeypatch.setattr(main, "watch_symbols", lambda settings: None)
+        settings = main.OptimisationSettings(
+            portfolio=[{"symbol": symbol, "exchange": "NMS"} for symbol in ["AAPL", "MSFT", "DELL", "GE"]],
+            start_time="2016-01-01",
+            end_time="2025-12-31",
+        )
+
+        asyncio.run(main.load_optimisation_data(settings))
+
+        assert sorted(fetches) == [
+            (["AAPL", "MSFT"], "2025-01-01", "2025-05-31"),
+            (["DELL"], "2016-01-01", "2025-05-31"),
+        ]
+        assert len(reads) == 1
+
+    def test_group_uncovered(self):
+        window = (date(2025, 1, 1), date(2025, 5, 31))
+        assert group_uncovered({"AAPL": window, "MSFT": window}) == {window: ["AAPL", "MSFT"]}
+
+
+class TestCoverageTable:
+    """The coverage SQL, against a local Postgres"""
+
+    @pytest.fixture
+    def database(self, monkeypatch, tmp_path):
+        with scratch_database() as engine:
+            monkeypatch.setattr(utils, "_engine", engine)
+            monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path))
+            yield engine
+
+    @pytest.fixture
+    def ticks(self):
+        data = pd.read_csv("tests/data/optimisation_test_data.csv")
+        data["trade_date"] = pd.to_datetime(data["trade_date"])
+        return data[["symbol", "trade_date", "change_percent"]]
+
+    @staticmethod
+    def uncovered(symbols, start_time="2016-01-01"):
+        settings = main.OptimisationSettings(
+            portfolio=[{"symbol": symbol} for symbol in symbols],
+            start_time=start_time,
+            end_time="2025-12-31",
+        )
+        return main.read_uncovered_windows(settings)
+
+    def test_uncovered_windows_of_fetched_symbols(self, database, ticks):
+        fetched = ticks[(ticks["symbol"] == "AAPL") & (ticks["trade_date"] < "2025-01-01")]
+        main.insert_data_into_db(fetched, "monthly", ["AAPL", "NEW"], "2016-01-01", "2024-12-31")
+
+        assert self.uncovered(["AAPL", "NEW", "GE"]) == {
+            "AAPL": (date(2025, 1, 1), date(2025, 12, 31)),
+            "NEW": (date(2025, 1, 1), date(2025, 12, 31)),
+            "GE": (date(2016, 1, 1), date(2025, 12, 31)),
+        }
+
+    def test_migration_backfills_existing_history(self, database, ticks):
+        old = ticks[(ticks["symbol"] == "MSFT") & ticks["trade_date"].between("2016-01-01", "2020-12-31")]
+        with database.begin() as connection:
+            old.to_sql("monthly_historical_tick_data", con=connection, if_exists="append", index=False)
+        assert self.uncovered(["MSFT"], "2017-01-01") == {"MSFT": (date(2017, 1, 1), date(2025, 12, 31))}
+
+        run_scripts(database, "04_migrations")
+
+        # Covered up to the last stored bar, on 2020-12-01
+        assert self.uncovered(["MSFT"], "2017-01-01") == {"MSFT": (date(2020, 12, 2), date(2025, 12, 31))}
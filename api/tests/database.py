@@ -0,0 +1,43 @@
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+import utils
+
+DB_SCRIPTS_DIR = Path(__file__).resolve().parents[2] / "infra" / "db"
+
+
+def run_scripts(engine, directory):
+    """Run the .sql files of an infra/db directory in the order init.sh runs them."""
+    for script in sorted((DB_SCRIPTS_DIR / directory).glob("*.sql")):
+        with engine.begin() as connection:
+            connection.exec_driver_sql(script.read_text())
+
+
+@contextmanager
+def scratch_database():
+    """
+    Engine on a throwaway schema of a local Postgres (configured with the usual DB_*
+    variables) holding the tables created by init.sh, dropped on exit.
+    Skips the test if there is no local Postgres.
+    """
+    try:
+        admin = utils.initialize_engine(retries=1, delay=0)
+    except RuntimeError:
+        pytest.skip("No local Postgres available")
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with admin.begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = utils.initialize_engine(retries=1, delay=0, schema=schema)
+    try:
+        for directory in ["02_tables", "04_migrations"]:
+            run_scripts(engine, directory)
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import calculate_drawdown_matrix, calculate_drawdown_statistics
+from downsampling import downsample_history, select_min_max
+from optimisation import optimise_portfolio
+
+
+@pytest.fixture
+def optimisation_data():
+    return pd.read_csv("tests/data/optimisation_test_data.csv")
+
+
+@pytest.fixture
+def daily_returns():
+    """Five years of synthetic daily returns for 50 series, in percent"""
+    rng = np.random.default_rng(1)
+    return rng.normal(0.03, 1.5, (1260, 50))
+
+
+class TestSelectMinMax:
+    def test_keeps_at_most_max_points(self, daily_returns):
+        drawdown = calculate_drawdown_matrix(daily_returns)["drawdown"]
+
+        mask = select_min_max(drawdown, 100)
+
+        assert mask.shape == drawdown.shape
+        assert mask.sum(axis=0).max() <= 100
+        assert mask[0].all() and mask[-1].all()
+
+    def test_keeps_extremes_and_requested_points(self, daily_returns):
+        stats = calculate_drawdown_matrix(daily_returns)
+        keep = np.stack([stats["peak"], stats["bottom"], stats["recovery"]])
+
+        mask = select_min_max(stats["drawdown"], 50, keep=keep)
+
+        columns = np.arange(daily_returns.shape[1])
+        assert mask[stats["peak"], columns].all()
+        assert mask[stats["bottom"], columns].all()
+        recovered = stats["recovery"] >= 0
+        assert mask[stats["recovery"][recovered], columns[recovered]].all()
+        assert mask.sum(axis=0).max() <= 50
+
+    def test_short_series_are_unchanged(self):
+        values = np.array([[1.0, np.nan], [2.0, 3.0]])
+        np.testing.assert_array_equal(select_min_max(values, 10), [[True, False], [True, True]])
+
+
+class TestDrawdownMatrix:
+    def test_matches_per_series_statistics(self, daily_returns):
+        dates = pd.bdate_range("2015-01-01", periods=len(daily_returns))
+        stats = calculate_drawdown_matrix(daily_returns)
+
+        for j in range(0, daily_returns.shape[1], 7):
+            single = calculate_drawdown_statistics(pd.Series(daily_returns[:, j], index=dates))
+            np.testing.assert_allclose(stats["drawdown"][:, j], single["drawdown"].to_numpy())
+            assert stats["max_drawdown"][j] == pytest.approx(single["max_drawdown"]["percent"])
+            assert dates[stats["peak"][j]] == single["max_drawdown"]["start_date"]
+            assert dates[stats["bottom"][j]] == single["max_drawdown"]["bottom_date"]
+
+
+class TestDownsampleHistory:
+    def test_compounds_returns_over_dropped_bars(self, optimisation_data):
+        data = optimisation_data.copy()
+        growth = 1 + data.pivot(index="trade_date", columns="symbol", values="change_percent") / 100
+        prices = (100 * growth.cumprod()).stack().rename("close_price")
+        data = data.join(prices, on=["trade_date", "symbol"])
+
+        downsampled = downsample_history(data, 20)
+
+        for symbol, bars in downsampled.groupby("symbol"):
+            assert len(bars) <= 20
+            kept = (1 + bars["change_percent"] / 100).prod()
+            assert kept == pytest.approx(growth[symbol].prod())
+        assert list(downsampled.columns) == list(data.columns)
+
+
+class TestOptimisationMaxPoints:
+    def test_drawdowns_are_downsampled(self, optimisation_data):
+        full = optimise_portfolio(optimisation_data, "monthly")
+        downsampled = optimise_portfolio(optimisation_data, "monthly", max_points=20)
+
+        assert len(downsampled) == len(full)
+        for a, b in zip(full, downsampled):
+            assert len(b["drawdown"]) <= 20
+            assert b["max_drawdown"] == a["max_drawdown"]
+            assert b["geometric_mean"] == pytest.approx(a["geometric_mean"])
+            values = {point["trade_date"]: point["value"] for point in a["drawdown"]}
+            for point in b["drawdown"]:
+                assert point["value"] == values[point["trade_date"]]
+            dates = {point["trade_date"] for point in b["drawdown"]}
+            assert {b["max_drawdown"]["start_date"], b["max_drawdown"]["bottom_date"]} <= dates
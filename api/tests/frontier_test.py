@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from frontier import (
+    CornerPortfolios,
+    critical_line,
+    invalidate_corner_portfolios,
+    read_corner_portfolios,
+    write_corner_portfolios,
+)
+
+
+@pytest.fixture
+def returns():
+    """Synthetic monthly returns of 12 symbols, in percent"""
+    rng = np.random.default_rng(0)
+    values = rng.normal(0.5, 3.0, (200, 12))
+    values[:, 3] += 1.0
+    return pd.DataFrame(values, columns=[f"S{i}" for i in range(12)])
+
+
+def minimum_variance_weights(mean, cov, target_return, upper):
+    import cvxpy as cp
+
+    w = cp.Variable(len(mean))
+    constraints = [cp.sum(w) == 1, w >= 0, w <= upper, mean @ w >= target_return]
+    cp.Problem(cp.Minimize(cp.quad_form(w, cov)), constraints).solve(solver=cp.CLARABEL)
+    return w.value
+
+
+class TestCriticalLine:
+    def test_corners_are_on_the_frontier(self, returns):
+        mean, cov = returns.mean().to_numpy(), returns.cov().to_numpy()
+
+        corners = critical_line(mean, cov, upper=np.full(12, 0.3))
+
+        np.testing.assert_allclose(corners.sum(axis=1), 1.0)
+        assert (corners >= 0).all() and (corners <= 0.3 + 1e-12).all()
+        assert (np.diff(corners @ mean) < 0).all()
+        for weights in corners:
+            expected = minimum_variance_weights(mean, cov, weights @ mean, 0.3)
+            np.testing.assert_allclose(weights, expected, atol=1e-4)
+
+    def test_single_symbol(self):
+        np.testing.assert_allclose(critical_line([1.0], [[4.0]]), [[1.0]])
+
+    def test_equal_means_give_the_minimum_variance_portfolio(self, returns):
+        cov = returns.cov().to_numpy()
+
+        corners = critical_line(np.full(12, 0.5), cov)
+
+        assert len(corners) == 1
+        np.testing.assert_allclose(corners[0], minimum_variance_weights(np.zeros(12), cov, 0.0, 1.0), atol=1e-4)
+
+    def test_singular_covariance(self, returns):
+        duplicated = returns.assign(S12=returns["S3"])
+        with pytest.raises(ValueError):
+            critical_line(duplicated.mean(), duplicated.cov())
+        with pytest.raises(ValueError):
+            critical_line(returns.iloc[:8].mean(), returns.iloc[:8].cov())
+
+
+class TestCornerPortfolios:
+    @pytest.fixture
+    def corners(self, returns):
+        return CornerPortfolios.from_returns(returns.mean(), returns.cov(), "monthly")
+
+    def test_interpolated_weights_are_optimal(self, corners, returns):
+        mean, cov = returns.mean().to_numpy(), returns.cov().to_numpy()
+        for target in np.linspace(corners.returns[-1], corners.returns[0], 5):
+            annualised = ((1 + target / 100) ** 12 - 1) * 100
+
+            weights = corners.at_return(annualised)
+
+            assert weights @ mean == pytest.approx(target)
+            np.testing.assert_allclose(weights, minimum_variance_weights(mean, cov, target, 1.0), atol=1e-4)
+            _, std = corners.portfolio_stats(weights)
+            np.testing.assert_allclose(corners.at_risk(std * np.sqrt(12)), weights, atol=1e-9)
+
+    def test_targets_outside_the_frontier(self, corners):
+        with pytest.raises(ValueError):
+            corners.at_return(1e6)
+        with pytest.raises(ValueError):
+            corners.at_risk(0.0)
+
+    def test_cache_round_trip_and_invalidation(self, corners, tmp_path):
+        key = (str(tmp_path), ["S0", "S1"], "monthly", "2020-01-01", "2024-12-31")
+        write_corner_portfolios(*key, corners, options={"alignment": "union"})
+
+        loaded = read_corner_portfolios(*key, options={"alignment": "union"})
+        np.testing.assert_array_equal(loaded.weights, corners.weights)
+        np.testing.assert_allclose(loaded.gram, corners.gram)
+        assert read_corner_portfolios(*key, options={"alignment": "compound"}) is None
+
+        invalidate_corner_portfolios(str(tmp_path), ["S3"], "monthly")
+        assert read_corner_portfolios(*key, options={"alignment": "union"}) is None
+
+    def test_requested_symbols_without_data_invalidate(self, corners, tmp_path):
+        # NEW was requested but had no data, so the corners only hold S0 to S11
+        key = (str(tmp_path), [*corners.symbols, "NEW"], "monthly", "2020-01-01", "2024-12-31")
+        write_corner_portfolios(*key, corners)
+
+        invalidate_corner_portfolios(str(tmp_path), ["NEW"], "monthly")
+
+        assert read_corner_portfolios(*key) is None
+
+
+class TestFrontierRoutes:
+    @pytest.fixture
+    def client(self, monkeypatch, tmp_path):
+        """TestClient with the portfolio data served from the optimisation test data"""
+        data = pd.read_csv("tests/data/optimisation_test_data.csv")
+        loads = []
+
+        async def load_optimisation_data(settings):
+            loads.append(settings)
+            return data
+
+        monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path))
+        monkeypatch.setattr(main, "load_optimisation_data", load_optimisation_data)
+        monkeypatch.setattr(main, "get_cached_covariance", lambda settings, data: None)
+        return TestClient(main.app), loads
+
+    @pytest.fixture
+    def settings(self):
+        return {
+            "portfolio": [{"symbol": symbol} for symbol in ["AAPL", "MSFT", "DELL"]],
+            "timePeriod": "monthly",
+            "startTime": "2016-01-01",
+            "endTime": "2025-12-31",
+        }
+
+    def test_queries_reuse_cached_corners(self, client, settings):
+        test_client, loads = client
+
+        frontier = test_client.post("/portfolio/frontier", json=settings).json()
+        corners = frontier["cornerPortfolios"]
+        middle = (corners[0]["arithmeticMean"] + corners[-1]["arithmeticMean"]) / 2
+        by_return = test_client.post("/portfolio/frontier/query", json={**settings, "targetReturn": middle})
+        by_risk = test_client.post(
+            "/portfolio/frontier/query", json={**settings, "targetStdDev": by_return.json()["stdDev"]}
+        )
+
+        assert len(loads) == 1
+        assert by_return.status_code == 200
+        assert by_return.json()["arithmeticMean"] == pytest.approx(middle)
+        assert sum(w["valueProportion"] for w in by_return.json()["weights"]) == pytest.approx(1.0)
+        for a, b in zip(by_return.json()["weights"], by_risk.json()["weights"]):
+            assert a["valueProportion"] == pytest.approx(b["valueProportion"], abs=1e-9)
+
+    def test_invalid_queries(self, client, settings):
+        test_client, _ = client
+
+        assert test_client.post("/portfolio/frontier/query", json=settings).status_code == 422
+        response = test_client.post("/portfolio/frontier/query", json={**settings, "targetReturn": 1e6})
+        assert response.status_code == 422
+
+    def test_singular_covariance(self, client, settings, monkeypatch):
+        test_client, _ = client
+        data = pd.read_csv("tests/data/optimisation_test_data.csv")
+
+        async def load_optimisation_data(settings):
+            # Two dates of three symbols
+            return data[data["trade_date"].isin(sorted(data["trade_date"].unique())[-2:])]
+
+        monkeypatch.setattr(main, "load_optimisation_data", load_optimisation_data)
+
+        response = test_client.post("/portfolio/frontier", json=settings)
+        assert response.status_code == 422
+        assert "singular" in response.json()["detail"]
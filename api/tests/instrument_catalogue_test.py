@@ -0,0 +1,134 @@
+import json
+
+import numpy as np
+import pytest
+import pandas as pd
+import financedatabase as fd
+
+from instrument_catalogue import InstrumentCatalogue, write_catalogue
+from utils import INSTRUMENT_NAME_MAPPING
+
+
+def make_dataset(cls, data):
+    """Create a financedatabase dataset from a frame without downloading it"""
+    dataset = cls.__new__(cls)
+    dataset.data = data
+    return dataset
+
+
+@pytest.fixture
+def datasets():
+    """Fixture providing small Equities and ETFs datasets"""
+    equities = pd.DataFrame(
+        {
+            "name": ["Apple Inc.", "Applied Materials", "Microsoft Corp", "Dell Technologies", np.nan, "Apple Inc."],
+            "summary": ["Phones", "Chips", np.nan, "PCs", "Unknown", "Phones (Frankfurt)"],
+            "currency": ["USD", "USD", "USD", "USD", "EUR", "EUR"],
+            "sector": ["Information Technology", "Information Technology", "Information Technology",
+                       "Information Technology", np.nan, "Information Technology"],
+            "industry_group": ["Hardware", "Semiconductors", "Software", "Hardware", np.nan, "Hardware"],
+            "industry": ["Hardware", "Semiconductors", "Software", "Hardware", np.nan, "Hardware"],
+            "exchange": ["NMS", "NMS", "NMS", "NYQ", "GER", "GER"],
+            "market": ["NASDAQ", "NASDAQ", "NASDAQ", "NYSE", "XETRA", "XETRA"],
+            "country": ["United States", "United States", "United States", "United States", np.nan, "Germany"],
+            "market_cap": ["Mega Cap", "Large Cap", "Mega Cap", "Large Cap", np.nan, "Mega Cap"],
+            "isin": ["US0378331005", "US0382221051", "US5949181045", "US24703L2025", np.nan, "US0378331005"],
+        },
+        index=pd.Index(["AAPL", "AMAT", "MSFT", "DELL", "XYZ.DE", "APC.DE"], name="symbol"),
+    )
+    etfs = pd.DataFrame(
+        {
+            "name": ["SPDR S&P 500 ETF", "Vanguard Total World", "iShares Core MSCI World"],
+            "currency": ["USD", "USD", "EUR"],
+            "summary": ["Tracks the S&P 500", "Global equities", np.nan],
+            "category_group": ["Equities", "Equities", "Equities"],
+            "category": ["Large Cap", "Global", "Global"],
+            "family": ["SPDR", "Vanguard", "iShares"],
+            "exchange": ["PCX", "PCX", "GER"],
+        },
+        index=pd.Index(["SPY", "VT", "EUNL.DE"], name="symbol"),
+    )
+    return [make_dataset(fd.Equities, equities), make_dataset(fd.ETFs, etfs)]
+
+
+@pytest.fixture
+def catalogue(datasets, tmp_path):
+    path = str(tmp_path / "instruments.catalogue")
+    write_catalogue(path, datasets, INSTRUMENT_NAME_MAPPING)
+    return InstrumentCatalogue(path)
+
+
+def reference_search(datasets, symbol, name, filters):
+    """The search previously run against the financedatabase frames in every worker"""
+    all_options = {}
+    all_exact = pd.DataFrame()
+    all_startswith = pd.DataFrame()
+    all_name_contains = pd.DataFrame()
+    for DB in datasets:
+        options = {k: v.astype(str).tolist() for k, v in DB.show_options().items()}
+        for k, v in options.items():
+            all_options[k] = all_options.get(k, []) + v
+        results = DB.select(**{k: v for k, v in filters.items() if k in options})
+        results.index = results.index.astype(str)
+        results["name"] = results["name"].astype(str)
+        results["instrumentType"] = INSTRUMENT_NAME_MAPPING[DB.__class__.__name__]
+
+        exact_match = results[results.index == symbol]
+        startswith_match = results[(results.index.str.startswith(symbol)) & (results.index != symbol)]
+        already_matched = set(exact_match.index).union(startswith_match.index)
+        name_contains_match = results[
+            (~results.index.isin(already_matched)) & (results["name"].str.lower().str.contains(name))
+        ]
+        all_exact = pd.concat([all_exact, exact_match])
+        all_startswith = pd.concat([all_startswith, startswith_match])
+        all_name_contains = pd.concat([all_name_contains, name_contains_match])
+
+    all_results = pd.concat(
+        [all_exact.sort_index(), all_startswith.sort_index(), all_name_contains.sort_index()]
+    )
+    return json.loads(all_results.reset_index().to_json(orient="records")), all_options
+
+
+class TestInstrumentCatalogue:
+    @pytest.mark.parametrize(
+        "symbol,name,filters",
+        [
+            ("", "", {}),
+            ("AAPL", "", {}),
+            ("A", "", {}),
+            ("", "apple", {}),
+            ("MSFT", "world", {}),
+            ("", "", {"currency": "usd"}),
+            ("", "", {"exchange": "ger", "sector": ["Information Technology"]}),
+            ("", "s&p", {"category": "Large Cap"}),
+            ("", "nan", {}),
+            ("ZZZ", "nothing", {}),
+        ],
+    )
+    def test_search_matches_financedatabase(self, datasets, catalogue, symbol, name, filters):
+        expected, expected_options = reference_search(datasets, symbol, name, filters)
+        results, total, options = catalogue.search(["Equities", "ETFs"], symbol, name, filters)
+
+        assert results == expected
+        assert total == len(expected)
+        assert options == expected_options
+
+    def test_search_single_table_paged(self, datasets, catalogue):
+        expected, _ = reference_search(datasets[:1], "", "", {})
+        results, total, _ = catalogue.search(["Equities"], page=2, page_size=2)
+
+        assert total == len(expected) == 6
+        assert results == expected[2:4]
+
+    def test_unknown_option_raises(self, catalogue):
+        with pytest.raises(ValueError):
+            catalogue.search(["Equities"], filters={"sector": "Not A Sector"})
+
+    def test_search_restricted_to_symbols(self, datasets, catalogue):
+        expected, _ = reference_search(datasets, "", "", {})
+        symbols = [expected[0]["symbol"], expected[-1]["symbol"], "NOT A SYMBOL"]
+
+        results, total, _ = catalogue.search(["Equities", "ETFs"], symbols=symbols)
+
+        assert results == [expected[0], expected[-1]]
+        assert total == 2
@@ -0,0 +1,98 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from prefetch import PrefetchScheduler, is_stale, last_period_close
+
+
+class FakeUpstream:
+    """Records the upstream fetches made by the scheduler"""
+
+    def __init__(self, watched, latest, fail=()):
+        self.watched = watched
+        self.latest = latest
+        self.fail = set(fail)
+        self.calls = []
+
+    def read_watched(self):
+        return self.watched
+
+    def read_latest(self, symbols, time_period):
+        return {s: self.latest[s] for s in symbols if s in self.latest}
+
+    async def fetch(self, symbols, time_period, start, end):
+        self.calls.append((tuple(symbols), time_period, start, end))
+        if self.fail & set(symbols):
+            raise RuntimeError("upstream unavailable")
+        dates = pd.date_range(start, end, freq="MS" if time_period == "monthly" else "B")
+        return pd.DataFrame(
+            [{"symbol": s, "trade_date": d.strftime("%Y-%m-%d"), "change_percent": 1.0}
+             for s in symbols for d in dates]
+        )
+
+
+def make_scheduler(upstream, now="2024-03-15", **kwargs):
+    return PrefetchScheduler(
+        upstream.read_watched,
+        upstream.read_latest,
+        upstream.fetch,
+        now=lambda: pd.Timestamp(now, tz="UTC"),
+        **kwargs,
+    )
+
+
+class TestPeriodClose:
+    @pytest.mark.parametrize(
+        "time_period, now, expected",
+        [
+            ("monthly", "2024-03-15", "2024-02-29"),
+            ("monthly", "2024-03-01", "2024-02-29"),
+            ("daily", "2024-03-15", "2024-03-14"),
+            ("daily", "2024-03-18", "2024-03-15"),
+        ],
+    )
+    def test_last_period_close(self, time_period, now, expected):
+        assert last_period_close(time_period, pd.Timestamp(now, tz="UTC")) == pd.Timestamp(expected)
+
+    def test_monthly_bars_are_labelled_by_month(self):
+        close = pd.Timestamp("2024-02-29")
+        assert not is_stale(pd.Timestamp("2024-02-01", tz="UTC"), close, "monthly")
+        assert is_stale(pd.Timestamp("2024-01-01", tz="UTC"), close, "monthly")
+
+
+class TestPrefetchScheduler:
+    def test_batches_stale_symbols_by_start_date(self):
+        upstream = FakeUpstream(
+            {"monthly": ["A", "B", "C", "D", "NEW", "FRESH"]},
+            {
+                "A": pd.Timestamp("2023-12-01", tz="UTC"),
+                "B": pd.Timestamp("2023-12-01", tz="UTC"),
+                "C": pd.Timestamp("2023-12-01", tz="UTC"),
+                "D": pd.Timestamp("2023-11-01", tz="UTC"),
+                "FRESH": pd.Timestamp("2024-02-01", tz="UTC"),
+            },
+        )
+        scheduler = make_scheduler(upstream, batch_size=2)
+
+        fetched = asyncio.run(scheduler.run_once())
+
+        assert upstream.calls == [
+            (("D",), "monthly", "2023-11-02", "2024-02-29"),
+            (("A", "B"), "monthly", "2023-12-02", "2024-02-29"),
+            (("C",), "monthly", "2023-12-02", "2024-02-29"),
+        ]
+        assert fetched == 3 + 2 * 2 + 2
+
+    def test_symbols_are_attempted_once_per_close(self):
+        upstream = FakeUpstream(
+            {"daily": ["A", "B"]},
+            {"A": pd.Timestamp("2024-03-12", tz="UTC"), "B": pd.Timestamp("2024-03-12", tz="UTC")},
+            fail=["B"],
+        )
+        scheduler = make_scheduler(upstream, batch_size=1)
+
+        assert asyncio.run(scheduler.run_once()) == 2
+        assert asyncio.run(scheduler.run_once()) == 0
+
+        assert [symbols for symbols, *_ in upstream.calls] == [("A",), ("B",)]
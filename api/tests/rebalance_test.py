@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import main
+from main import OptimisationSettings
+from optimisation import optimise_portfolio
+from rebalance import add_trades, get_holdings, round_to_lots
+
+
+@pytest.fixture
+def optimisation_data():
+    return pd.read_csv("tests/data/optimisation_test_data.csv")
+
+
+@pytest.fixture
+def portfolio():
+    """Portfolio items as sent by the frontend, with DELL quoted in EUR"""
+    return [
+        {"symbol": "AAPL", "currentShares": 10, "sharePrice": 200.0, "currency": "USD"},
+        {"symbol": "MSFT", "currentShares": 5, "sharePrice": 400.0, "currency": "USD"},
+        {"symbol": "DELL", "currentShares": 0, "sharePrice": 100.0, "currency": "EUR"},
+    ]
+
+
+class TestHoldings:
+    def test_weights_from_converted_values(self, portfolio):
+        holdings = get_holdings(portfolio, currency_rates={"EUR": 1.1}, lot_sizes={"MSFT": 5})
+
+        assert holdings.loc["DELL", "price"] == pytest.approx(110.0)
+        assert holdings["weight"].to_dict() == {"AAPL": 0.5, "MSFT": 0.5, "DELL": 0.0}
+        assert holdings["lot_size"].to_dict() == {"AAPL": 1, "MSFT": 5, "DELL": 1}
+
+    def test_weights_from_allocation_without_prices(self):
+        holdings = get_holdings([
+            {"symbol": "AAPL", "yourAllocation": 25.0},
+            {"symbol": "MSFT", "yourAllocation": 75.0},
+        ])
+        assert holdings["weight"].to_dict() == {"AAPL": 0.25, "MSFT": 0.75}
+
+    def test_round_to_lots_stays_within_value(self, portfolio):
+        holdings = get_holdings(portfolio, lot_sizes={"MSFT": 5})
+        target = pd.Series({"AAPL": 0.27, "MSFT": 0.46, "DELL": 0.27})
+
+        trades, cash = round_to_lots(target, holdings)
+
+        # 4000 of value: AAPL 5.4 -> 5 shares, MSFT 4.6 -> 1 lot of 5, DELL 10.8 -> 11 -> 10 to fit
+        assert trades["target_shares"].to_dict() == {"AAPL": 5, "MSFT": 5, "DELL": 10}
+        assert trades["trade_shares"].to_dict() == {"AAPL": -5, "MSFT": 0, "DELL": 10}
+        assert cash == pytest.approx(4000 - 1000 - 2000 - 1000)
+        assert trades["target_weight"].sum() + cash / 4000 == pytest.approx(1.0)
+
+
+class TestRebalanceOptimisation:
+    def test_turnover_constraint_and_trades(self, optimisation_data, portfolio):
+        holdings = get_holdings(portfolio)
+        results = optimise_portfolio(
+            optimisation_data, "monthly", current_weights=holdings["weight"], max_turnover=0.2
+        )
+
+        for result in results:
+            weights = pd.Series({w["symbol"]: w["value_proportion"] for w in result["weights"]})
+            turnover = (weights - holdings["weight"]).abs().sum()
+            assert result["turnover"] == pytest.approx(turnover, abs=1e-3)
+            assert turnover <= 0.2 + 1e-3
+
+        add_trades(results, holdings)
+        assert {trade["symbol"] for trade in results[0]["trades"]} == {"AAPL", "MSFT", "DELL"}
+        assert all(trade["target_shares"] == int(trade["target_shares"]) for trade in results[0]["trades"])
+        assert results[0]["cash"] >= 0
+
+    def test_high_turnover_penalty_keeps_current_weights(self, optimisation_data, portfolio):
+        holdings = get_holdings(portfolio)
+        results = optimise_portfolio(
+            optimisation_data, "monthly", current_weights=holdings["weight"], turnover_penalty=1e3
+        )
+
+        weights = {w["symbol"]: w["value_proportion"] for w in results[-1]["weights"]}
+        np.testing.assert_allclose(
+            [weights[s] for s in holdings.index], holdings["weight"].to_numpy(), atol=1e-3
+        )
+
+    def test_weight_bounds(self, optimisation_data):
+        results = optimise_portfolio(
+            optimisation_data,
+            "monthly",
+            min_weights=pd.Series({"DELL": 0.2}),
+            max_weights=pd.Series({"MSFT": 0.5}),
+        )
+
+        for result in results:
+            weights = {w["symbol"]: w["value_proportion"] for w in result["weights"]}
+            assert weights["DELL"] >= 0.2 - 1e-4
+            assert weights["MSFT"] <= 0.5 + 1e-4
+
+    def test_infeasible_bounds_are_rejected(self, portfolio):
+        with pytest.raises(ValidationError):
+            OptimisationSettings(
+                portfolio=portfolio,
+                start_time="2020-01-01",
+                end_time="2024-12-31",
+                rebalance={"max_weights": {"AAPL": 0.2, "MSFT": 0.2, "DELL": 0.2}},
+            )
+
+    def test_symbol_min_above_max_is_rejected(self, portfolio):
+        with pytest.raises(ValidationError):
+            OptimisationSettings(
+                portfolio=portfolio,
+                start_time="2020-01-01",
+                end_time="2024-12-31",
+                rebalance={"min_weights": {"AAPL": 0.6}, "max_weights": {"AAPL": 0.5}},
+            )
+
+    def test_unreachable_turnover_is_infeasible(self, optimisation_data, portfolio):
+        # Raising MSFT from its current 0.5 to 0.8 takes at least 0.6 of turnover
+        with pytest.raises(ValueError, match="Infeasible constraints"):
+            optimise_portfolio(
+                optimisation_data,
+                "monthly",
+                current_weights=get_holdings(portfolio)["weight"],
+                max_turnover=0.1,
+                min_weights=pd.Series({"MSFT": 0.8}),
+            )
+
+    def test_infeasible_route_is_unprocessable(self, optimisation_data, portfolio, monkeypatch):
+        async def load_optimisation_data(settings):
+            return optimisation_data
+
+        monkeypatch.setattr(main, "load_optimisation_data", load_optimisation_data)
+        monkeypatch.setattr(main, "get_stock_stats", lambda settings, data: {})
+        monkeypatch.setattr(main, "get_cached_covariance", lambda settings, data: None)
+        body = {
+            "portfolio": portfolio,
+            "startTime": "2016-01-01",
+            "endTime": "2025-12-31",
+            "rebalance": {"maxTurnover": 0.1, "minWeights": {"MSFT": 0.8}},
+        }
+
+        response = TestClient(main.app).post("/portfolio/optimise", json=body)
+
+        assert response.status_code == 422
+        assert "Infeasible constraints" in response.json()["detail"]
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+import pandas as pd
+
+from pandas.testing import assert_series_equal
+
+import main
+import utils
+from analysis import get_averages, get_geometric_mean, get_standard_deviation
+from return_statistics import (
+    covers_returns,
+    get_window_averages,
+    get_window_geometric_mean,
+    get_window_standard_deviation,
+    get_window_statistics,
+)
+from tests.database import run_scripts, scratch_database
+
+PREFIX_COLUMNS = ["row_count", "sum_return", "sum_sq_return", "sum_log_return"]
+WINDOWS = [
+    ("2016-01-01", "2025-06-01"),
+    ("2020-03-01", "2023-12-01"),
+    ("2024-01-01", "2024-12-31"),
+]
+
+
+@pytest.fixture
+def optimisation_test_data():
+    """Fixture providing optimisation test data, with DELL listed from 2019"""
+    data = pd.read_csv("tests/data/optimisation_test_data.csv")
+    data["trade_date"] = pd.to_datetime(data["trade_date"])
+    return data[(data["symbol"] != "DELL") | (data["trade_date"] >= "2019-01-01")]
+
+
+def prefix_statistics(df):
+    """The running totals update_symbol_statistics stores, one row per tick row"""
+    data = df.sort_values(["symbol", "trade_date"])
+    returns = data["change_percent"]
+    increments = pd.DataFrame(
+        {
+            "row_count": returns.notna().astype("int64"),
+            "sum_return": returns.fillna(0.0),
+            "sum_sq_return": (returns**2).fillna(0.0),
+            "sum_log_return": np.log1p(returns / 100).fillna(0.0),
+        }
+    )
+    prefix = increments.groupby(data["symbol"]).cumsum()
+    return prefix.assign(symbol=data["symbol"], trade_date=data["trade_date"])
+
+
+def window_statistics(prefix, start_time, end_time):
+    """Select the prefix rows bounding the window the same way read_symbol_statistics does"""
+    end_prefix = prefix[prefix["trade_date"] <= end_time].groupby("symbol")[PREFIX_COLUMNS].last()
+    start_prefix = prefix[prefix["trade_date"] < start_time].groupby("symbol")[PREFIX_COLUMNS].last()
+    return get_window_statistics(end_prefix, start_prefix)
+
+
+def assert_matches_time_series(stats, window):
+    assert covers_returns(stats, window)
+    assert_series_equal(
+        get_window_averages(stats, "monthly", "yearly"),
+        get_averages(window, "monthly", "yearly"),
+        check_names=False,
+    )
+    assert_series_equal(
+        get_window_standard_deviation(stats, "monthly", "yearly"),
+        get_standard_deviation(window, "monthly", "yearly"),
+        check_names=False,
+    )
+    assert_series_equal(
+        get_window_geometric_mean(stats, window["trade_date"].nunique(), "monthly", "yearly"),
+        get_geometric_mean(window, "monthly", "yearly"),
+        check_names=False,
+    )
+
+
+class TestReturnStatistics:
+    @pytest.mark.parametrize("start_time,end_time", WINDOWS)
+    def test_window_statistics_match_time_series(
+        self, optimisation_test_data, start_time, end_time
+    ):
+        stats = window_statistics(prefix_statistics(optimisation_test_data), start_time, end_time)
+        window = optimisation_test_data[
+            optimisation_test_data["trade_date"].between(start_time, end_time)
+        ]
+
+        assert_matches_time_series(stats, window)
+
+    def test_partial_prefix_does_not_cover_returns(self, optimisation_test_data):
+        later = optimisation_test_data[optimisation_test_data["trade_date"] >= "2020-01-01"]
+        stats = window_statistics(prefix_statistics(later), "2016-01-01", "2025-06-01")
+
+        assert not covers_returns(stats, optimisation_test_data)
+
+
+class TestSymbolStatisticsTable:
+    """The prefix statistics SQL, against a local Postgres"""
+
+    @pytest.fixture
+    def database(self, monkeypatch, tmp_path):
+        with scratch_database() as engine:
+            monkeypatch.setattr(utils, "_engine", engine)
+            monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path))
+            yield engine
+
+    @staticmethod
+    def read_window(data, start_time, end_time):
+        settings = main.OptimisationSettings(
+            portfolio=[{"symbol": symbol} for symbol in sorted(data["symbol"].unique())],
+            start_time=start_time,
+            end_time=end_time,
+        )
+        stats = main.read_symbol_statistics(settings)
+        return stats, data[data["trade_date"].between(start_time, end_time)]
+
+    def test_inserts_out_of_order_match_time_series(self, database, optimisation_test_data):
+        data = optimisation_test_data[["symbol", "trade_date", "change_percent"]]
+        main.insert_data_into_db(data[data["trade_date"] >= "2020-01-01"], "monthly")
+        main.insert_data_into_db(data[data["trade_date"] < "2020-01-01"], "monthly")
+
+        for start_time, end_time in WINDOWS:
+            assert_matches_time_series(*self.read_window(data, start_time, end_time))
+
+    def test_migration_backfills_existing_history(self, database, optimisation_test_data):
+        data = optimisation_test_data[["symbol", "trade_date", "change_percent"]]
+        with database.begin() as connection:
+            data[data["trade_date"] < "2020-01-01"].to_sql(
+                "monthly_historical_tick_data", con=connection, if_exists="append", index=False
+            )
+        main.insert_data_into_db(data[data["trade_date"] >= "2020-01-01"], "monthly")
+
+        stats, window = self.read_window(data, *WINDOWS[0])
+        assert not covers_returns(stats, window)
+
+        run_scripts(database, "04_migrations")
+        assert_matches_time_series(*self.read_window(data, *WINDOWS[0]))
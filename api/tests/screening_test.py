@@ -0,0 +1,176 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from analysis import (
+    get_averages,
+    get_geometric_mean,
+    get_semivariances,
+    get_standard_deviation,
+    get_symbols_drawdown_percentage,
+)
+from screening import get_block_statistics, screen, screen_chunks
+
+
+@pytest.fixture
+def optimisation_test_data():
+    return pd.read_csv("tests/data/optimisation_test_data.csv")
+
+
+@pytest.fixture
+def universe_returns():
+    """Ten years of synthetic monthly returns for 1000 symbols listed at different dates"""
+    rng = np.random.default_rng(2)
+    returns = rng.normal(0.8, 5.0, (120, 1000))
+    listed = rng.integers(0, 60, 1000)
+    returns[np.arange(120)[:, None] < listed] = np.nan
+    return pd.DataFrame(
+        returns,
+        index=pd.date_range("2015-01-01", periods=120, freq="MS", name="trade_date"),
+        columns=pd.Index([f"SYM{i:04d}" for i in range(1000)], name="symbol"),
+    )
+
+
+class TestBlockStatistics:
+    def test_matches_per_symbol_analysis(self, optimisation_test_data):
+        returns = optimisation_test_data.pivot(index="trade_date", columns="symbol", values="change_percent")
+
+        stats = get_block_statistics(returns, "monthly")
+
+        data = optimisation_test_data
+        pd.testing.assert_series_equal(
+            stats["arithmetic_mean"], get_averages(data, "monthly", "yearly"), check_names=False
+        )
+        pd.testing.assert_series_equal(
+            stats["geometric_mean"], get_geometric_mean(data, "monthly", "yearly"), check_names=False
+        )
+        pd.testing.assert_series_equal(
+            stats["std_dev"], get_standard_deviation(data, "monthly", "yearly"), check_names=False
+        )
+        pd.testing.assert_series_equal(stats["semivariance"], get_semivariances(data), check_names=False)
+        drawdowns = get_symbols_drawdown_percentage(data)
+        for symbol in stats.index:
+            assert stats.loc[symbol, "max_drawdown"] == pytest.approx(
+                drawdowns[symbol]["max_drawdown"]["percent"]
+            )
+
+    def test_float32_is_close(self, universe_returns):
+        exact = get_block_statistics(universe_returns, "monthly")
+        single = get_block_statistics(universe_returns, "monthly", dtype="float32")
+
+        np.testing.assert_allclose(single.to_numpy(), exact.to_numpy(), rtol=1e-4)
+
+
+class TestChunkedScreen:
+    def test_chunks_cover_the_universe_with_bounded_loads(self, universe_returns):
+        in_flight, most_in_flight = [], []
+        lock = threading.Lock()
+
+        def load_returns(symbols):
+            with lock:
+                in_flight.append(symbols)
+                most_in_flight.append(len(in_flight))
+            try:
+                return universe_returns[symbols]
+            finally:
+                with lock:
+                    in_flight.remove(symbols)
+
+        symbols = list(universe_returns.columns) + ["MISSING"]
+        chunks = list(
+            screen_chunks(
+                symbols,
+                lambda chunk: load_returns([s for s in chunk if s in universe_returns]),
+                "monthly",
+                chunk_size=64,
+                max_workers=3,
+            )
+        )
+
+        assert len(chunks) == -(-len(symbols) // 64)
+        assert max(most_in_flight) <= 3
+        combined = pd.concat(chunks).sort_index()
+        pd.testing.assert_frame_equal(combined, get_block_statistics(universe_returns, "monthly"))
+
+    def test_top_k_matches_a_full_sort(self, universe_returns):
+        full = get_block_statistics(universe_returns, "monthly")
+        chunks = screen_chunks(
+            list(universe_returns.columns), lambda s: universe_returns[s], "monthly", chunk_size=100
+        )
+
+        top, screened, matched = screen(
+            chunks, {"std_dev": (None, 17.5), "max_drawdown": (-40, None)}, "geometric_mean", limit=25
+        )
+
+        expected = full[(full["std_dev"] <= 17.5) & (full["max_drawdown"] >= -40)]
+        assert screened == 1000
+        assert matched == len(expected)
+        assert list(top.index) == list(expected["geometric_mean"].sort_values(ascending=False).index[:25])
+
+    def test_empty_universe(self):
+        top, screened, matched = screen(screen_chunks([], lambda s: pd.DataFrame(), "monthly"))
+        assert top.empty and screened == matched == 0
+
+
+class TestScreenRoute:
+    @pytest.fixture
+    def route(self, universe_returns, monkeypatch):
+        """The searched universe is the first 400 symbols, of which the first 300 have stored history"""
+        loads = []
+
+        class Catalogue:
+            def search(
+                self, table_names, symbol="", name="", filters=None, page=None, page_size=None, symbols=None
+            ):
+                assert table_names == ["Equities"] and filters == {"sector": "Technology"}
+                matches = [s for s in universe_returns.columns[:400] if s in set(symbols)]
+                records = [{"symbol": s, "name": f"{s} Inc."} for s in matches]
+                return records, len(records), {}
+
+        class FinancialData:
+            def wait(self):
+                return Catalogue()
+
+        def read_returns_history_from_db(symbols, time_period, start_time, end_time):
+            loads.extend(symbols)
+            return universe_returns.loc[start_time:end_time, symbols]
+
+        monkeypatch.setattr(main, "financial_data", FinancialData())
+        monkeypatch.setattr(main, "read_stored_symbols", lambda time_period: list(universe_returns.columns[:300]))
+        monkeypatch.setattr(main, "read_returns_history_from_db", read_returns_history_from_db)
+        return loads
+
+    def test_screens_the_stored_symbols_of_the_universe(self, route, universe_returns):
+        body = {
+            "universe": {"instrumentType": "Equities", "sector": "Technology"},
+            "startTime": "2018-01-01",
+            "metricFilters": {"maxDrawdown": {"min": -30}},
+            "sortBy": "stdDev",
+            "ascending": True,
+            "limit": 10,
+        }
+
+        response = TestClient(main.app).post("/instruments/screen", json=body)
+
+        assert response.status_code == 200
+        result = response.json()
+        assert result["screened"] == 300
+        assert len(result["data"]) == 10
+        assert result["data"][0]["name"] == f"{result['data'][0]['symbol']} Inc."
+        assert all(row["maxDrawdown"] >= -30 for row in result["data"])
+        std_devs = [row["stdDev"] for row in result["data"]]
+        assert std_devs == sorted(std_devs)
+        assert sorted(route) == sorted(universe_returns.columns[:300])
+
+    def test_universes_above_the_maximum_are_rejected(self, route, monkeypatch):
+        monkeypatch.setattr(main, "SCREEN_MAX_UNIVERSE", 299)
+        body = {"universe": {"instrumentType": "Equities", "sector": "Technology"}}
+
+        response = TestClient(main.app).post("/instruments/screen", json=body)
+
+        assert response.status_code == 422
+        assert route == []
@@ -0,0 +1,71 @@
+import pytest
+import pandas as pd
+
+from tick_cache import invalidate_tick_data, read_tick_data
+
+
+@pytest.fixture
+def stock_price_data():
+    """Fixture providing mock stock price data"""
+    data = pd.read_csv("tests/data/test_data.csv")
+    data["trade_date"] = pd.to_datetime(data["trade_date"], utc=True)
+    return data
+
+
+class TestTickCache:
+    def test_read_through(self, stock_price_data, tmp_path):
+        loads = []
+
+        def load_history(symbols):
+            loads.append(symbols)
+            return stock_price_data[stock_price_data["symbol"].isin(symbols)]
+
+        window = ("2025-03-01", "2025-08-01")
+        first = read_tick_data(str(tmp_path), ["MSFT", "GE"], "monthly", load_history, *window)
+        second = read_tick_data(str(tmp_path), ["MSFT", "GE", "DELL"], "monthly", load_history, *window)
+        assert loads == [["MSFT", "GE"], ["DELL"]]
+
+        expected = stock_price_data[
+            stock_price_data["trade_date"].between(*window)
+            & stock_price_data["symbol"].isin(["MSFT", "GE"])
+        ]
+        assert len(first) == len(expected) == 12
+        assert first.groupby("symbol")["change_percent"].sum().to_dict() == pytest.approx(
+            expected.groupby("symbol")["change_percent"].sum().to_dict()
+        )
+        assert set(second["symbol"]) == {"MSFT", "GE", "DELL"}
+        assert second["trade_date"].min() == pd.Timestamp("2025-03-01", tz="UTC")
+        assert second["trade_date"].max() == pd.Timestamp("2025-08-01", tz="UTC")
+
+    def test_unknown_symbol_cached_empty_until_invalidated(self, stock_price_data, tmp_path):
+        loads = []
+
+        def load_history(symbols):
+            loads.append(symbols)
+            return stock_price_data[stock_price_data["symbol"].isin(symbols)]
+
+        assert read_tick_data(str(tmp_path), ["AAPL"], "monthly", load_history).empty
+        assert read_tick_data(str(tmp_path), ["AAPL"], "monthly", load_history).empty
+        assert loads == [["AAPL"]]
+
+        invalidate_tick_data(str(tmp_path), ["AAPL"], "monthly")
+        read_tick_data(str(tmp_path), ["AAPL"], "monthly", load_history)
+        assert loads == [["AAPL"], ["AAPL"]]
+
+    def test_history_invalidated_while_loading_is_not_published(self, stock_price_data, tmp_path):
+        loads = []
+
+        def load_history(symbols):
+            loads.append(symbols)
+            history = stock_price_data[stock_price_data["symbol"].isin(symbols)]
+            if len(loads) == 1:
+                # An insert commits and invalidates after this read of the database
+                invalidate_tick_data(str(tmp_path), symbols, "monthly")
+            return history
+
+        first = read_tick_data(str(tmp_path), ["MSFT"], "monthly", load_history)
+        second = read_tick_data(str(tmp_path), ["MSFT"], "monthly", load_history)
+        third = read_tick_data(str(tmp_path), ["MSFT"], "monthly", load_history)
+
+        assert loads == [["MSFT"], ["MSFT"]]
+        assert len(first) == len(second) == len(third) == (stock_price_data["symbol"] == "MSFT").sum()
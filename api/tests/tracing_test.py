@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import main
+from tracing import Histogram, detach_trace, record_trace, render_metrics, span, start_trace, traced
+
+
+@pytest.fixture
+def client():
+    """TestClient without the lifespan, so nothing is loaded in the background"""
+    return TestClient(main.app)
+
+
+class TestTracing:
+    def test_spans_accumulate_within_trace(self):
+        @traced()
+        def stage():
+            pass
+
+        trace, token = start_trace()
+        with span("db_read"):
+            pass
+        for _ in range(3):
+            stage()
+        detach_trace(token)
+        record_trace(trace, "POST", "/test", 200)
+
+        assert set(trace.spans) == {"db_read", "stage"}
+        assert trace.spans["stage"][1] == 3
+        assert trace.server_timing().startswith("db_read;dur=")
+        assert "total;dur=" in trace.server_timing()
+        assert 'portfolio_api_span_duration_seconds_count{route="/test",span="stage"} 1' in render_metrics()
+
+    def test_span_outside_request_is_noop(self):
+        with span("db_read"):
+            pass
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(("/a",), value)
+
+        lines = histogram.render().splitlines()
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+
+    def test_server_timing_header_and_metrics(self, client):
+        response = client.get("/health")
+        assert "total;dur=" in response.headers["Server-Timing"]
+
+        metrics = client.get("/metrics").text
+        assert 'portfolio_api_request_duration_seconds_count{method="GET",route="/health",status="200"}' in metrics
+
+    def test_profile_requires_opt_in(self, client, monkeypatch):
+        assert client.get("/health?profile=1").json() == {"status": "ok"}
+
+        monkeypatch.setattr(main, "PROFILING_ENABLED", True)
+        response = client.get("/health?profile=1")
+        assert "function calls" in response.text
+
+    def test_streamed_body_is_within_the_trace(self, caplog):
+        app = FastAPI()
+        app.middleware("http")(main.trace_requests)
+
+        async def body():
+            with span("stream"):
+                await asyncio.sleep(0.05)
+                yield b"line\n"
+
+        @app.get("/stream")
+        async def stream():
+            return StreamingResponse(body())
+
+        with caplog.at_level(logging.INFO, logger=main.log.name):
+            assert TestClient(app).get("/stream").text == "line\n"
+
+        (fields,) = [record.trace for record in caplog.records if hasattr(record, "trace")]
+        assert fields["route"] == "/stream"
+        assert fields["stream_ms"] >= 50
+        assert fields["total_ms"] >= fields["stream_ms"]
+
+    def test_encoding_is_within_the_trace(self):
+        trace, token = start_trace()
+        response = main.encode_response({"values": [1.5, 2.5]})
+        detach_trace(token)
+
+        assert response.body == b'{"values":[1.5,2.5]}'
+        assert set(trace.spans) == {"serialize"}
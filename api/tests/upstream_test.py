@@ -0,0 +1,212 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from upstream import TokenBucket, UpstreamCoordinator
+
+TOOLKIT_FIELDS = [
+    "Open",
+    "High",
+    "Low",
+    "Close",
+    "Adj Close",
+    "Volume",
+    "Dividends",
+    "Return",
+    "Volatility",
+    "Excess Return",
+    "Excess Volatility",
+    "Cumulative Return",
+]
+
+
+class FakeToolkit:
+    """Stands in for financetoolkit.Toolkit, counting the calls made to it"""
+
+    calls = []
+    fail = False
+    # Symbols the upstream has no data for, failing any call including them
+    unknown = set()
+
+    def __init__(self, symbols, start_date=None, end_date=None, api_key=None):
+        self.symbols = symbols
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def get_historical_data(self, period="monthly"):
+        FakeToolkit.calls.append((tuple(self.symbols), period, self.start_date, self.end_date))
+        if FakeToolkit.fail:
+            raise RuntimeError("FMP unavailable")
+        if FakeToolkit.unknown.intersection(self.symbols):
+            raise KeyError(sorted(FakeToolkit.unknown.intersection(self.symbols)))
+        dates = pd.date_range(self.start_date, self.end_date, freq="MS")
+        values = pd.DataFrame(
+            np.arange(len(dates) * len(self.symbols), dtype=float).reshape(len(dates), -1) + 1,
+            index=pd.Index(dates, name="date"),
+            columns=self.symbols,
+        )
+        return pd.concat({field: values for field in TOOLKIT_FIELDS}, axis=1)
+
+
+@pytest.fixture
+def toolkit(monkeypatch):
+    import financetoolkit
+
+    FakeToolkit.calls = []
+    FakeToolkit.fail = False
+    FakeToolkit.unknown = set()
+    monkeypatch.setattr(financetoolkit, "Toolkit", FakeToolkit)
+    return FakeToolkit
+
+
+@pytest.fixture
+def coordinator():
+    async def no_wait(seconds):
+        pass
+
+    return UpstreamCoordinator(
+        main.fetch_historical_data,
+        batch_window=0.01,
+        max_batch_size=3,
+        rate_limiter=TokenBucket(sleep=no_wait),
+    )
+
+
+def fetch_concurrently(coordinator, *requests):
+    async def fetch_all():
+        return await asyncio.gather(*(coordinator.fetch(*request) for request in requests))
+
+    return asyncio.run(fetch_all())
+
+
+class TestUpstreamCoordinator:
+    def test_same_symbols_share_a_single_fetch(self, toolkit, coordinator):
+        request = (["AAPL", "MSFT"], "monthly", "2020-01-01", "2020-12-31")
+        first, second = fetch_concurrently(coordinator, request, request)
+
+        assert len(toolkit.calls) == 1
+        pd.testing.assert_frame_equal(first, second)
+        assert sorted(first["symbol"].unique()) == ["AAPL", "MSFT"]
+        assert len(first) == 24
+
+    def test_concurrent_requests_are_batched(self, toolkit, coordinator):
+        narrow, wide = fetch_concurrently(
+            coordinator,
+            (["AAPL"], "monthly", "2020-06-01", "2020-08-31"),
+            (["MSFT"], "monthly", "2020-01-01", "2020-12-31"),
+        )
+
+        assert toolkit.calls == [(("AAPL", "MSFT"), "monthly", "2020-01-01", "2020-12-31")]
+        assert list(narrow["symbol"].unique()) == ["AAPL"]
+        assert list(narrow["trade_date"]) == ["2020-06-01", "2020-07-01", "2020-08-01"]
+        assert list(wide["symbol"].unique()) == ["MSFT"]
+        assert len(wide) == 12
+
+    def test_batches_are_capped_and_split_by_period(self, toolkit, coordinator):
+        fetch_concurrently(
+            coordinator,
+            (["A", "B"], "monthly", "2020-01-01", "2020-03-31"),
+            (["C", "D"], "monthly", "2020-01-01", "2020-03-31"),
+            (["E"], "daily", "2020-01-01", "2020-03-31"),
+        )
+
+        assert sorted(symbols for symbols, *_ in toolkit.calls) == [("A", "B", "C"), ("D",), ("E",)]
+
+    def test_failures_reach_every_caller_and_are_not_cached(self, toolkit, coordinator):
+        toolkit.fail = True
+        request = (["AAPL"], "monthly", "2020-01-01", "2020-03-31")
+
+        async def fetch_twice():
+            return await asyncio.gather(
+                coordinator.fetch(*request), coordinator.fetch(*request), return_exceptions=True
+            )
+
+        results = asyncio.run(fetch_twice())
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(toolkit.calls) == 1
+
+        toolkit.fail = False
+        (data,) = fetch_concurrently(coordinator, request)
+        assert len(toolkit.calls) == 2
+        assert len(data) == 3
+
+    def test_failing_symbols_only_fail_their_callers(self, toolkit, coordinator):
+        toolkit.unknown = {"BAD"}
+
+        async def fetch_all():
+            return await asyncio.gather(
+                coordinator.fetch(["AAPL"], "monthly", "2020-01-01", "2020-03-31"),
+                coordinator.fetch(["BAD"], "monthly", "2020-01-01", "2020-03-31"),
+                coordinator.fetch(["MSFT"], "monthly", "2020-01-01", "2020-03-31"),
+                return_exceptions=True,
+            )
+
+        good, bad, other = asyncio.run(fetch_all())
+
+        assert isinstance(bad, KeyError)
+        assert list(good["symbol"].unique()) == ["AAPL"] and len(good) == 3
+        assert list(other["symbol"].unique()) == ["MSFT"] and len(other) == 3
+        # The batch is halved until the failing symbol is fetched alone
+        assert sorted(symbols for symbols, *_ in toolkit.calls) == [
+            ("AAPL",),
+            ("AAPL", "BAD", "MSFT"),
+            ("BAD",),
+            ("BAD", "MSFT"),
+            ("MSFT",),
+        ]
+
+    def test_cancelled_caller_does_not_cancel_the_others(self, toolkit, coordinator):
+        request = (["AAPL"], "monthly", "2020-01-01", "2020-03-31")
+
+        async def cancel_first():
+            first = asyncio.create_task(coordinator.fetch(*request))
+            second = asyncio.create_task(coordinator.fetch(*request))
+            await asyncio.sleep(0)
+            first.cancel()
+            later = await coordinator.fetch(*request)
+            return first, await second, later
+
+        first, second, later = asyncio.run(cancel_first())
+
+        assert first.cancelled()
+        assert len(second) == len(later) == 3
+        assert len(toolkit.calls) == 1
+
+    def test_cancelled_fetch_is_not_reused(self, toolkit, coordinator):
+        request = (["AAPL"], "monthly", "2020-01-01", "2020-03-31")
+
+        async def cancel_shared():
+            first = asyncio.create_task(coordinator.fetch(*request))
+            await asyncio.sleep(0)
+            (shared,) = coordinator._inflight.values()
+            shared.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await coordinator.fetch(*request)
+
+        assert len(asyncio.run(cancel_shared())) == 3
+
+
+class TestTokenBucket:
+    def test_bursts_then_waits_for_refill(self):
+        now = [0.0]
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+
+        bucket = TokenBucket(calls_per_minute=60, capacity=2, clock=lambda: now[0], sleep=sleep)
+
+        async def calls():
+            for _ in range(4):
+                await bucket.acquire()
+            now[0] = 10.0
+            await bucket.acquire()
+
+        asyncio.run(calls())
+        # The first two calls use the burst, the next two queue one second apart and
+        # after ten seconds the bucket has refilled to capacity
+        assert sleeps == [pytest.approx(1.0), pytest.approx(2.0)]
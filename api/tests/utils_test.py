@@ -0,0 +1,84 @@
+import threading
+
+import pandas as pd
+import financedatabase as fd
+
+import utils
+from utils import FinancialData
+
+from .instrument_catalogue_test import make_dataset
+
+
+OPTION_COLUMNS = {
+    fd.Equities: ["currency", "sector", "industry_group", "industry", "exchange", "market", "country", "market_cap"],
+    fd.ETFs: ["currency", "category_group", "category", "family", "exchange"],
+    fd.Cryptos: ["cryptocurrency", "currency"],
+    fd.Funds: ["currency", "category_group", "category", "family", "exchange"],
+}
+
+
+def load_datasets(loads):
+    def load():
+        loads.append(1)
+        return tuple(
+            make_dataset(
+                cls,
+                pd.DataFrame({"name": [f"{cls.__name__} Inc."], **{c: ["X"] for c in columns}}, index=["A"]),
+            )
+            for cls, columns in OPTION_COLUMNS.items()
+        )
+
+    return load
+
+
+class TestFinancialData:
+    def test_catalogue_shared_between_workers(self, tmp_path):
+        loads = []
+        first_worker = FinancialData(load=load_datasets(loads), cache_dir=str(tmp_path))
+        second_worker = FinancialData(load=load_datasets(loads), cache_dir=str(tmp_path))
+
+        first = first_worker.wait(timeout=10)
+        second = second_worker.wait(timeout=10)
+
+        assert len(loads) == 1
+        assert second.search(["ETFs"])[0] == first.search(["ETFs"])[0]
+        assert second_worker.startup_metrics["max_rss_mb"] > 0
+
+    def test_stale_catalogue_is_rebuilt(self, tmp_path):
+        loads = []
+        FinancialData(load=load_datasets(loads), cache_dir=str(tmp_path)).wait(timeout=10)
+        FinancialData(load=load_datasets(loads), cache_dir=str(tmp_path), max_age=-1).wait(timeout=10)
+
+        assert len(loads) == 2
+
+
+class TestGetEngine:
+    def test_lock_is_free_while_connecting(self, monkeypatch):
+        connecting, connected = threading.Event(), threading.Event()
+        engines = []
+
+        class FakeEngine:
+            def __init__(self):
+                self.disposed = False
+
+            def dispose(self):
+                self.disposed = True
+
+        def initialize_engine():
+            engines.append(FakeEngine())
+            connecting.set()
+            connected.wait(5)
+            return engines[-1]
+
+        monkeypatch.setattr(utils, "_engine", None)
+        monkeypatch.setattr(utils, "initialize_engine", initialize_engine)
+        warm_up = threading.Thread(target=utils.get_engine)
+        warm_up.start()
+        connecting.wait(5)
+
+        assert utils._engine_lock.acquire(blocking=False)
+        utils._engine_lock.release()
+        connected.set()
+        warm_up.join(5)
+        assert utils.get_engine() is engines[0]
+        assert not engines[0].disposed
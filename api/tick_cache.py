@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import uuid
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from logging import getLogger
+
+log = getLogger(__name__)
+
+VALUE_COLUMNS = [
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "volume",
+    "change",
+    "change_percent",
+]
+
+
+def symbol_path(cache_dir, symbol, time_period):
+    """Directory of the cached history of a symbol for a period."""
+    return os.path.join(cache_dir, "ticks", time_period, quote(symbol, safe=""))
+
+
+def generation_path(cache_dir, symbol, time_period):
+    """File of the token replaced each time the cached history of a symbol is invalidated."""
+    return os.path.join(cache_dir, "ticks", time_period, ".generations", quote(symbol, safe=""))
+
+
+def read_generation(cache_dir, symbol, time_period):
+    """Current generation token of a symbol, empty if it has never been invalidated."""
+    try:
+        with open(generation_path(cache_dir, symbol, time_period)) as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def bump_generation(cache_dir, symbol, time_period):
+    """Replace the generation token of a symbol, so histories loaded before now are not published."""
+    path = generation_path(cache_dir, symbol, time_period)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+
+def write_symbol_history(cache_dir, symbol, time_period, data, generation=None):
+    """
+    Write the full history of one symbol as columnar arrays, replacing the
+    directory atomically so readers in other workers never see a partial write.
+    :param data: DataFrame of the symbol's rows with a 'trade_date' column and VALUE_COLUMNS.
+    :param generation: Optional generation token read before data was loaded. If the symbol
+        has been invalidated since, data may predate the insert and is not published.
+    :return: True if the history was published, False if it was stale.
+    """
+    data = data.sort_values("trade_date")
+    dates = pd.DatetimeIndex(pd.to_datetime(data["trade_date"], utc=True)).asi8
+    values = np.empty((len(VALUE_COLUMNS), len(data)))
+    for i, column in enumerate(VALUE_COLUMNS):
+        values[i] = pd.to_numeric(data[column], errors="coerce") if column in data else np.nan
+
+    def is_stale():
+        return generation is not None and read_generation(cache_dir, symbol, time_period) != generation
+
+    path = symbol_path(cache_dir, symbol, time_period)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    np.save(os.path.join(tmp_path, "dates.npy"), dates)
+    np.save(os.path.join(tmp_path, "values.npy"), values)
+    if is_stale():
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return False
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Another worker cached the symbol first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    # An invalidation between the check and the replace removes the directory after
+    # bumping the generation, so either it or this check removes the stale history
+    if is_stale():
+        shutil.rmtree(path, ignore_errors=True)
+        return False
+    return True
+
+
+def read_symbol_history(cache_dir, symbol, time_period, start_time=None, end_time=None):
+    """
+    Read a symbol's cached rows between start_time and end_time inclusive.
+    The arrays are memory-mapped, so only the pages of the window are read.
+    :return: DataFrame of the window, or None if the symbol is not cached.
+    """
+    path = symbol_path(cache_dir, symbol, time_period)
+    try:
+        dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    start, end = 0, len(dates)
+    if start_time is not None:
+        start = np.searchsorted(dates, _to_utc_nanoseconds(start_time), side="left")
+    if end_time is not None:
+        end = np.searchsorted(dates, _to_utc_nanoseconds(end_time), side="right")
+    data = pd.DataFrame(np.asarray(values[:, start:end]).T, columns=VALUE_COLUMNS)
+    data.insert(0, "trade_date", pd.to_datetime(np.asarray(dates[start:end]), utc=True))
+    data.insert(0, "symbol", symbol)
+    return data
+
+
+def read_tick_data(cache_dir, symbols, time_period, load_history, start_time=None, end_time=None):
+    """
+    Read-through cache in front of the historical tick data tables.
+    :param cache_dir: Root directory of the cache files.
+    :param symbols: List of symbols to read.
+    :param time_period: Period of the data e.g. 'monthly'.
+    :param load_history: Callable taking a list of symbols and returning their full history from the database.
+    :return: DataFrame with columns 'symbol', 'trade_date' and VALUE_COLUMNS for the window.
+    """
+    frames = {
+        symbol: read_symbol_history(cache_dir, symbol, time_period, start_time, end_time)
+        for symbol in symbols
+    }
+    missing = [symbol for symbol, frame in frames.items() if frame is None]
+    if missing:
+        generations = {symbol: read_generation(cache_dir, symbol, time_period) for symbol in missing}
+        history = load_history(missing)
+        for symbol in missing:
+            rows = history[history["symbol"] == symbol]
+            # Symbols without any rows are cached empty until an insert invalidates them
+            if write_symbol_history(cache_dir, symbol, time_period, rows, generations[symbol]):
+                frames[symbol] = read_symbol_history(cache_dir, symbol, time_period, start_time, end_time)
+                if frames[symbol] is None:
+                    log.warning(f"Failed to cache {time_period} history of {symbol}, reading it uncached")
+            if frames[symbol] is None:
+                frames[symbol] = _window(rows, start_time, end_time)
+    frames = [frame for frame in frames.values() if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["symbol", "trade_date"] + VALUE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def invalidate_tick_data(cache_dir, symbols, time_period):
+    """Remove the cached history of symbols so the next read refreshes it from the database."""
+    for symbol in symbols:
+        bump_generation(cache_dir, symbol, time_period)
+        shutil.rmtree(symbol_path(cache_dir, symbol, time_period), ignore_errors=True)
+
+
+def _window(data, start_time, end_time):
+    data = data.assign(trade_date=pd.to_datetime(data["trade_date"], utc=True))
+    if start_time is not None:
+        data = data[data["trade_date"] >= pd.Timestamp(_to_utc_nanoseconds(start_time), tz="UTC")]
+    if end_time is not None:
+        data = data[data["trade_date"] <= pd.Timestamp(_to_utc_nanoseconds(end_time), tz="UTC")]
+    return data
+
+
+def _to_utc_nanoseconds(date):
+    date = pd.Timestamp(date)
+    if date.tz is None:
+        date = date.tz_localize("UTC")
+    return date.value
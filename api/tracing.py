@@ -0,0 +1,160 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Upper bounds in seconds of the histogram buckets, as in the Prometheus client defaults
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+_current_trace = ContextVar("current_trace", default=None)
+
+
+class RequestTrace:
+    """Total time and number of calls of each named span within a request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = {}
+
+    def record(self, name, duration):
+        total, count = self.spans.get(name, (0.0, 0))
+        self.spans[name] = (total + duration, count + 1)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """Server-Timing header value, with durations in milliseconds."""
+        timings = [f"{name};dur={total * 1000:.1f}" for name, (total, _) in self.spans.items()]
+        timings.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(timings)
+
+    def log_fields(self):
+        fields = {f"{name}_ms": round(total * 1000, 1) for name, (total, _) in self.spans.items()}
+        fields["total_ms"] = round(self.elapsed() * 1000, 1)
+        return fields
+
+
+class Histogram:
+    """Cumulative Prometheus style histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, description, label_names, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            counts, total, count = self._series.get(labels, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[labels] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                label_text = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+                lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return "\n".join(lines)
+
+
+REQUEST_DURATION = Histogram(
+    "portfolio_api_request_duration_seconds",
+    "Duration of HTTP requests.",
+    ("method", "route", "status"),
+)
+SPAN_DURATION = Histogram(
+    "portfolio_api_span_duration_seconds",
+    "Total duration of each named stage within a request.",
+    ("route", "span"),
+)
+
+
+def start_trace():
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def detach_trace(token):
+    """Stop new spans being recorded into the trace. Code already running with it still can."""
+    _current_trace.reset(token)
+
+
+def record_trace(trace, method, route, status):
+    """Record the durations of a finished request in the histograms."""
+    REQUEST_DURATION.observe((method, route, str(status)), trace.elapsed())
+    for name, (total, _) in trace.spans.items():
+        SPAN_DURATION.observe((route, name), total)
+
+
+async def finish_after(body_iterator, finish):
+    """Iterate over a response body, calling finish once it has been sent or the client disconnects."""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        finish()
+
+
+@contextmanager
+def span(name):
+    """Time a named stage of the current request. Does nothing outside a request."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, time.perf_counter() - start)
+
+
+def traced(name=None):
+    """Decorator timing every call of a function as a span, named after the function by default."""
+
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render_metrics():
+    """Prometheus text exposition of the request and span histograms."""
+    return "\n".join([REQUEST_DURATION.render(), SPAN_DURATION.render()]) + "\n"
+
+
+@contextmanager
+def profiled():
+    """
+    Profile the enclosed code with cProfile.
+    :return: A callable returning the report sorted by cumulative time once the block exits.
+    """
+    profiler = cProfile.Profile()
+    report = io.StringIO()
+    profiler.enable()
+    try:
+        yield report.getvalue
+    finally:
+        profiler.disable()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(50)
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from functools import partial
+from logging import getLogger
+
+import pandas as pd
+
+from utils import (
+    UPSTREAM_BATCH_SIZE,
+    UPSTREAM_BATCH_WINDOW,
+    UPSTREAM_BURST,
+    UPSTREAM_CALLS_PER_MINUTE,
+)
+
+log = getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter allowing bursts of up to capacity calls, refilled at
+    calls_per_minute. Tokens are reserved before waiting so concurrent callers queue
+    in order without needing a lock.
+    """
+
+    def __init__(
+        self,
+        calls_per_minute=UPSTREAM_CALLS_PER_MINUTE,
+        capacity=UPSTREAM_BURST,
+        clock=time.monotonic,
+        sleep=asyncio.sleep,
+    ):
+        self.rate = calls_per_minute / 60
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+
+    async def acquire(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await self.sleep(-self.tokens / self.rate)
+
+
+class UpstreamCoordinator:
+    """
+    Coalesces concurrent upstream fetches of historical data.
+
+    Requests for the same (symbol, period, start, end) share a single in-flight future.
+    New symbols requested within batch_window seconds of each other for the same period
+    are fetched together in one multi-symbol call covering the union of their date
+    ranges, and each caller gets back the rows within its own range. A failed batch is
+    split and retried, so only the callers of the symbols failing on their own get the error.
+    :param load: Fetches (and stores) tick data given symbols, period, start and end dates.
+    """
+
+    def __init__(
+        self,
+        load,
+        batch_window=UPSTREAM_BATCH_WINDOW,
+        max_batch_size=UPSTREAM_BATCH_SIZE,
+        rate_limiter=None,
+    ):
+        self.load = load
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self._inflight = {}
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+
+    async def fetch(self, symbols, time_period, start_time, end_time):
+        """
+        Fetch the historical data of the symbols, joining any in-flight or pending fetches.
+        :return: Tick data of the symbols between start_time and end_time.
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        for symbol in dict.fromkeys(symbols):
+            key = (symbol, time_period, start_time, end_time)
+            future = self._inflight.get(key)
+            if future is None or future.cancelled():
+                future = loop.create_future()
+                future.add_done_callback(partial(self._forget_cancelled, key))
+                self._inflight[key] = future
+                self._enqueue(loop, time_period, key, future)
+            futures.append(future)
+        # Shielded so a cancelled caller doesn't cancel the fetch for the others joining it
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures))
+        return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+    def _forget_cancelled(self, key, future):
+        """Let the next caller start a new fetch when a shared fetch is cancelled."""
+        if future.cancelled() and self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def _enqueue(self, loop, time_period, key, future):
+        pending = self._pending.setdefault(time_period, [])
+        pending.append((key, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(time_period)
+        elif time_period not in self._timers:
+            self._timers[time_period] = loop.call_later(
+                self.batch_window, self._flush, time_period
+            )
+
+    def _flush(self, time_period):
+        timer = self._timers.pop(time_period, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(time_period, [])
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run_batch(time_period, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, time_period, batch):
+        batch = [(key, future) for key, future in batch if not future.cancelled()]
+        if not batch:
+            return
+        symbols = list(dict.fromkeys(key[0] for key, _ in batch))
+        start_time = min(key[2] for key, _ in batch)
+        end_time = max(key[3] for key, _ in batch)
+        try:
+            await self.rate_limiter.acquire()
+            data = await asyncio.to_thread(self.load, symbols, time_period, start_time, end_time)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            if len(symbols) > 1:
+                # Split the batch in two and retry, so only the callers waiting on the
+                # symbols that fail on their own get the error
+                log.warning(
+                    f"Upstream fetch of {len(symbols)} {time_period} symbols failed, splitting the batch: {e}"
+                )
+                first = set(symbols[: len(symbols) // 2])
+                await asyncio.gather(
+                    self._run_batch(time_period, [item for item in batch if item[0][0] in first]),
+                    self._run_batch(time_period, [item for item in batch if item[0][0] not in first]),
+                )
+                return
+            log.error(f"Upstream fetch of {time_period} {symbols[0]} failed: {e}")
+            for key, future in batch:
+                self._resolve(key, future, exception=e)
+            return
+
+        if data.empty:
+            for key, future in batch:
+                self._resolve(key, future, data)
+            return
+
+        trade_dates = data["trade_date"].astype(str).str[:10]
+        for key, future in batch:
+            symbol, _, start, end = key
+            rows = (data["symbol"] == symbol) & trade_dates.between(start[:10], end[:10])
+            self._resolve(key, future, data[rows])
+
+    def _resolve(self, key, future, result=None, exception=None):
+        self._inflight.pop(key, None)
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
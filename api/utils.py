@@ -1,10 +1,14 @@
 import os
+import fcntl
+import multiprocessing
+import resource
+import threading
 import time
-from functools import wraps
-
-import financedatabase as fd
+from concurrent.futures import ProcessPoolExecutor
 
 from sqlalchemy import create_engine, text
+
+from instrument_catalogue import InstrumentCatalogue, write_catalogue
 from time import sleep
 from logging import basicConfig, INFO, getLogger
 
@@ -18,23 +22,60 @@ DB_NAME = os.getenv("DB_NAME", "postgres")
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
 
-def timeit(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.perf_counter()
-        result = func(*args, **kwargs)
-        end_time = time.perf_counter()
-        total_time = end_time - start_time
-        print(f"Function '{func.__name__}' took {total_time:.4f} seconds to execute.")
-        return result
-    return wrapper
+CACHE_DIR = os.getenv("CACHE_DIR", "/tmp/portfolio-analysis-cache")
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+INSTRUMENT_SNAPSHOT_MAX_AGE = int(os.getenv("INSTRUMENT_SNAPSHOT_MAX_AGE", 24 * 60 * 60))
+
+# Background refresh of recently requested symbols, see prefetch.py
+PREFETCH_IN_APP = os.getenv("PREFETCH_IN_APP", "false").lower() == "true"
+PREFETCH_INTERVAL = int(os.getenv("PREFETCH_INTERVAL", 60 * 60))
+PREFETCH_WATCH_DAYS = int(os.getenv("PREFETCH_WATCH_DAYS", 30))
+PREFETCH_BATCH_SIZE = int(os.getenv("PREFETCH_BATCH_SIZE", 20))
+
+# Coalescing and rate limiting of FMP calls within each process, see upstream.py
+UPSTREAM_CALLS_PER_MINUTE = float(os.getenv("UPSTREAM_CALLS_PER_MINUTE", 30))
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", 5))
+UPSTREAM_BATCH_WINDOW = float(os.getenv("UPSTREAM_BATCH_WINDOW", 0.05))
+UPSTREAM_BATCH_SIZE = int(os.getenv("UPSTREAM_BATCH_SIZE", 20))
+
+# Bounds of the cross-product caches of covariance windows, see covariance_cache.py. Symbol
+# sets whose cache would exceed the entry bound are not cached, and the least recently used
+# caches are removed once all of them exceed the total bound.
+COVARIANCE_CACHE_ENTRY_MAX_BYTES = int(os.getenv("COVARIANCE_CACHE_ENTRY_MAX_BYTES", 256 * 1024**2))
+COVARIANCE_CACHE_MAX_BYTES = int(os.getenv("COVARIANCE_CACHE_MAX_BYTES", 2 * 1024**3))
+
+# Processes running the optimisations of batch requests in parallel
+OPTIMISATION_WORKERS = int(os.getenv("OPTIMISATION_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Column blocks of the universe screen, see screening.py
+SCREEN_CHUNK_SIZE = int(os.getenv("SCREEN_CHUNK_SIZE", 250))
+SCREEN_WORKERS = int(os.getenv("SCREEN_WORKERS", min(4, os.cpu_count() or 1)))
+SCREEN_MAX_LIMIT = int(os.getenv("SCREEN_MAX_LIMIT", 1000))
+# Most symbols with stored history a single screen may cover
+SCREEN_MAX_UNIVERSE = int(os.getenv("SCREEN_MAX_UNIVERSE", 20000))
+
+PROCESS_START_TIME = time.perf_counter()
 
+INSTRUMENT_NAME_MAPPING = {
+    "Equities": "Equity",
+    "ETFs": "ETF",
+    "Cryptos": "Crypto",
+    "Funds": "Fund",
+}
 
-def initialize_engine(retries=10, delay=5):
+_engine = None
+_engine_lock = threading.Lock()
+
+def initialize_engine(retries=10, delay=5, schema=None):
+    connect_args = {}
+    if schema is not None:
+        # Resolve unqualified table names in schema first, e.g. to keep test data apart
+        connect_args["options"] = f"-csearch_path={schema},public"
     for attempt in range(retries):
         try:
             engine = create_engine(
-                f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+                f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+                connect_args=connect_args,
             )
             with engine.connect() as connection:
                 connection.execute(text("SELECT 1;"))
@@ -48,9 +89,54 @@ def initialize_engine(retries=10, delay=5):
     )
 
 
+def get_engine():
+    """Return the shared database engine, connecting on first use."""
+    global _engine
+    if _engine is None:
+        # Connect outside the lock so callers aren't blocked on it through every retry
+        engine = initialize_engine()
+        with _engine_lock:
+            if _engine is None:
+                _engine = engine
+            else:
+                engine.dispose()
+    return _engine
+
+
+def engine_ready():
+    return _engine is not None
+
+
+_optimisation_executor = None
+_optimisation_executor_lock = threading.Lock()
+
+
+def get_optimisation_executor():
+    """Return the shared process pool for optimisations, starting it on first use."""
+    global _optimisation_executor
+    with _optimisation_executor_lock:
+        if _optimisation_executor is None:
+            # Spawn rather than fork, as the API process runs background threads
+            _optimisation_executor = ProcessPoolExecutor(
+                max_workers=OPTIMISATION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _optimisation_executor
+
+
+def shutdown_optimisation_executor():
+    global _optimisation_executor
+    with _optimisation_executor_lock:
+        if _optimisation_executor is not None:
+            _optimisation_executor.shutdown(cancel_futures=True)
+            _optimisation_executor = None
+
+
 def initialize_financial_data():
     log.info("Initializing financial data...")
     try:
+        import financedatabase as fd
+
         equities = fd.Equities()
         etfs = fd.ETFs()
         cryptos = fd.Cryptos()
@@ -59,4 +145,82 @@ def initialize_financial_data():
         return equities, etfs, cryptos, funds
     except Exception as e:
         log.error(f"Failed to initialize financial data: {e}")
-        return None, None, None, None
\ No newline at end of file
+        return None, None, None, None
+
+
+def get_max_rss_mb():
+    """Peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class FinancialData:
+    """
+    Loads the instrument catalogue in a background thread so the app can serve
+    /health immediately. The first worker to start encodes the financedatabase
+    datasets into a catalogue file under CACHE_DIR, and every worker memory-maps
+    that file read-only instead of holding its own copy of the datasets.
+    """
+
+    def __init__(self, load=initialize_financial_data, cache_dir=CACHE_DIR, max_age=INSTRUMENT_SNAPSHOT_MAX_AGE):
+        self.load = load
+        self.catalogue_path = os.path.join(cache_dir, "instruments.catalogue")
+        self.max_age = max_age
+        self.ready = threading.Event()
+        self.catalogue = None
+        self.startup_metrics = {}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._load, daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until the catalogue is loaded, starting the load if needed."""
+        self.start()
+        self.ready.wait(timeout)
+        return self.catalogue
+
+    def _load(self):
+        catalogue = None
+        while catalogue is None:
+            catalogue = self._open_or_build_catalogue()
+            if catalogue is None:
+                time.sleep(1)
+        self.catalogue = catalogue
+        self.startup_metrics = {
+            "startup_seconds": round(time.perf_counter() - PROCESS_START_TIME, 3),
+            "max_rss_mb": round(get_max_rss_mb(), 1),
+        }
+        log.info(
+            f"Financial data ready after {self.startup_metrics['startup_seconds']}s, "
+            f"max RSS {self.startup_metrics['max_rss_mb']} MB"
+        )
+        self.ready.set()
+
+    def _open_or_build_catalogue(self):
+        os.makedirs(os.path.dirname(self.catalogue_path), exist_ok=True)
+        # Only one worker builds the catalogue, the others wait on the lock and map it
+        with open(self.catalogue_path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not self._catalogue_is_fresh():
+                    datasets = self.load()
+                    if any(x is None for x in datasets):
+                        return None
+                    write_catalogue(self.catalogue_path, datasets, INSTRUMENT_NAME_MAPPING)
+                    del datasets
+                catalogue = InstrumentCatalogue(self.catalogue_path)
+                log.info(f"Mapped instrument catalogue {self.catalogue_path}")
+                return catalogue
+            except Exception as e:
+                log.error(f"Failed to load instrument catalogue: {e}")
+                return None
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _catalogue_is_fresh(self):
+        try:
+            return time.time() - os.path.getmtime(self.catalogue_path) <= self.max_age
+        except OSError:
+            return False
@@ -0,0 +1,36 @@
+CREATE TABLE IF NOT EXISTS daily_symbol_statistics (
+    symbol VARCHAR(12),
+    trade_date TIMESTAMPTZ,
+    row_count BIGINT,
+    sum_return DOUBLE PRECISION,
+    sum_sq_return DOUBLE PRECISION,
+    sum_log_return DOUBLE PRECISION,
+    PRIMARY KEY (symbol, trade_date)
+);
+
+-- Backfill the prefix rows of symbols whose rows do not match their tick history, such as history
+-- stored before this table existed. Each tick row has one prefix row, so complete symbols are skipped.
+WITH stale AS (
+    SELECT t.symbol
+    FROM (SELECT symbol, COUNT(*) AS n FROM daily_historical_tick_data GROUP BY symbol) t
+    LEFT JOIN (SELECT symbol, COUNT(*) AS n FROM daily_symbol_statistics GROUP BY symbol) s
+        ON s.symbol = t.symbol
+    WHERE s.n IS DISTINCT FROM t.n
+)
+INSERT INTO daily_symbol_statistics
+    (symbol, trade_date, row_count, sum_return, sum_sq_return, sum_log_return)
+SELECT
+    symbol,
+    trade_date,
+    COUNT(change_percent) OVER w,
+    COALESCE(SUM(change_percent) OVER w, 0),
+    COALESCE(SUM(change_percent ^ 2) OVER w, 0),
+    COALESCE(SUM(LN(1 + change_percent / 100)) OVER w, 0)
+FROM daily_historical_tick_data
+WHERE symbol IN (SELECT symbol FROM stale)
+WINDOW w AS (PARTITION BY symbol ORDER BY trade_date)
+ON CONFLICT (symbol, trade_date) DO UPDATE SET
+    row_count = EXCLUDED.row_count,
+    sum_return = EXCLUDED.sum_return,
+    sum_sq_return = EXCLUDED.sum_sq_return,
+    sum_log_return = EXCLUDED.sum_log_return;
@@ -0,0 +1,22 @@
+-- Which dates of each symbol's daily history have been fetched, so coverage checks read one
+-- row per symbol rather than the tick data. Dates in covered without a bar are known to have none.
+CREATE TABLE IF NOT EXISTS daily_symbol_coverage (
+    symbol VARCHAR(12) PRIMARY KEY,
+    first_trade_date TIMESTAMPTZ,
+    last_trade_date TIMESTAMPTZ,
+    covered DATEMULTIRANGE NOT NULL DEFAULT '{}',
+    gaps DATEMULTIRANGE GENERATED ALWAYS AS (datemultirange(range_merge(covered)) - covered) STORED
+);
+
+-- Backfill symbols without a row from their existing history, taking the dates between their first
+-- and last bar as covered. Symbols with a row are left as they are, so gaps found since are kept.
+INSERT INTO daily_symbol_coverage (symbol, first_trade_date, last_trade_date, covered)
+SELECT
+    symbol,
+    MIN(trade_date),
+    MAX(trade_date),
+    datemultirange(daterange(CAST(MIN(trade_date) AS DATE), CAST(MAX(trade_date) AS DATE), '[]'))
+FROM daily_historical_tick_data
+WHERE symbol NOT IN (SELECT symbol FROM daily_symbol_coverage)
+GROUP BY symbol
+ON CONFLICT (symbol) DO NOTHING;
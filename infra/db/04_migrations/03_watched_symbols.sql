@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS watched_symbols (
+    symbol VARCHAR(12),
+    exchange VARCHAR(12),
+    time_period VARCHAR(12),
+    last_requested TIMESTAMPTZ,
+    PRIMARY KEY (symbol, time_period)
+);
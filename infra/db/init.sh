@@ -8,9 +8,20 @@ done
 
 echo "Running initialization scripts from subdirectories..."
 
+run_migrations() {
+    # Migrations are idempotent and run on every start, so tables added after a
+    # database was initialised are created and backfilled from its existing data
+    echo "Running migrations..."
+    find /init-scripts/04_migrations -name "*.sql" -type f | sort | while read -r script; do
+        echo "  Executing $(basename "$script")..."
+        psql -v ON_ERROR_STOP=1 --single-transaction -f "$script"
+    done
+}
+
 # Check if initialization has already been done
 if psql -tAc "SELECT 1 FROM information_schema.tables WHERE table_name = 'init_status'" | grep -q 1; then
-    echo "Database already initialized, skipping..."
+    echo "Database already initialized, skipping initialization scripts..."
+    run_migrations
     exit 0
 fi
 
@@ -51,4 +62,6 @@ done
 psql -c "CREATE TABLE init_status (initialized_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);"
 psql -c "INSERT INTO init_status DEFAULT VALUES;"
 
+run_migrations
+
 echo "Initialization completed successfully!"
\ No newline at end of file